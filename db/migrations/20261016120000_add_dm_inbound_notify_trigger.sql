@@ -0,0 +1,30 @@
+-- migrate:up
+
+-- ============================================================
+-- Push delivery for the DM responder
+--
+-- Every inbound DM stored as 'pending' (by the live listener's direct
+-- write or by ingest-dm-jsonl) sends NOTIFY dm_inbound with the row id.
+-- The resident responder LISTENs on the channel and replies as soon as
+-- the inserting transaction commits, instead of waiting for a poll.
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION trg_notify_dm_inbound()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('dm_inbound', NEW.id::text);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_dm_inbound ON dm_messages;
+CREATE TRIGGER notify_dm_inbound
+  AFTER INSERT ON dm_messages
+  FOR EACH ROW
+  WHEN (NEW.direction = 'inbound' AND NEW.response_status = 'pending')
+  EXECUTE FUNCTION trg_notify_dm_inbound();
+
+-- migrate:down
+
+DROP TRIGGER IF EXISTS notify_dm_inbound ON dm_messages;
+DROP FUNCTION IF EXISTS trg_notify_dm_inbound();
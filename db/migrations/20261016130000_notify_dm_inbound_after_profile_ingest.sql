@@ -0,0 +1,27 @@
+-- migrate:up
+
+-- ============================================================
+-- Wake the DM responder when ingest finishes a directly stored row
+--
+-- Rows the live listener writes itself (raw_payload stored_by =
+-- 'listen-dms') skip ingest-dm-jsonl's profile-signal extraction until
+-- ingest replaces their payload, so the responder holds them until then.
+-- This trigger repeats NOTIFY dm_inbound when that replacement commits,
+-- so the held row is answered right after its profile events are stored.
+-- ============================================================
+
+DROP TRIGGER IF EXISTS notify_dm_inbound_ingested ON dm_messages;
+CREATE TRIGGER notify_dm_inbound_ingested
+  AFTER UPDATE OF raw_payload ON dm_messages
+  FOR EACH ROW
+  WHEN (
+    NEW.direction = 'inbound'
+    AND NEW.response_status = 'pending'
+    AND OLD.raw_payload->>'stored_by' = 'listen-dms'
+    AND NEW.raw_payload->>'stored_by' IS DISTINCT FROM 'listen-dms'
+  )
+  EXECUTE FUNCTION trg_notify_dm_inbound();
+
+-- migrate:down
+
+DROP TRIGGER IF EXISTS notify_dm_inbound_ingested ON dm_messages;
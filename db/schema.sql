@@ -263,6 +263,20 @@ END;
 $$;
 
 
+--
+-- Name: trg_notify_dm_inbound(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION public.trg_notify_dm_inbound() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  PERFORM pg_notify('dm_inbound', NEW.id::text);
+  RETURN NEW;
+END;
+$$;
+
+
 SET default_tablespace = '';
 
 SET default_table_access_method = heap;
@@ -349,6 +363,190 @@ CREATE SEQUENCE public.claims_id_seq
 ALTER SEQUENCE public.claims_id_seq OWNED BY public.claims.id;
 
 
+--
+-- Name: dm_conversations; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.dm_conversations (
+    id bigint NOT NULL,
+    platform text DEFAULT 'telegram'::text NOT NULL,
+    external_chat_id text NOT NULL,
+    user_a_id bigint NOT NULL,
+    user_b_id bigint NOT NULL,
+    last_message_at timestamp with time zone,
+    message_count bigint DEFAULT 0 NOT NULL,
+    created_at timestamp with time zone DEFAULT now(),
+    updated_at timestamp with time zone DEFAULT now()
+);
+
+
+--
+-- Name: dm_conversations_id_seq; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE public.dm_conversations_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+--
+-- Name: dm_conversations_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: -
+--
+
+ALTER SEQUENCE public.dm_conversations_id_seq OWNED BY public.dm_conversations.id;
+
+
+--
+-- Name: dm_feedback; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.dm_feedback (
+    id bigint NOT NULL,
+    user_id bigint NOT NULL,
+    conversation_id bigint,
+    source_message_id bigint,
+    source_external_message_id text,
+    kind text NOT NULL,
+    text text NOT NULL,
+    created_at timestamp with time zone DEFAULT now()
+);
+
+
+--
+-- Name: dm_feedback_id_seq; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE public.dm_feedback_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+--
+-- Name: dm_feedback_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: -
+--
+
+ALTER SEQUENCE public.dm_feedback_id_seq OWNED BY public.dm_feedback.id;
+
+
+--
+-- Name: dm_messages; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.dm_messages (
+    id bigint NOT NULL,
+    conversation_id bigint NOT NULL,
+    external_message_id text NOT NULL,
+    sender_id bigint NOT NULL,
+    direction text NOT NULL,
+    text text,
+    text_len integer DEFAULT 0 NOT NULL,
+    sent_at timestamp with time zone NOT NULL,
+    reply_to_external_message_id text,
+    views integer DEFAULT 0,
+    forwards integer DEFAULT 0,
+    has_links boolean DEFAULT false NOT NULL,
+    has_mentions boolean DEFAULT false NOT NULL,
+    created_at timestamp with time zone DEFAULT now(),
+    raw_payload jsonb,
+    response_status text DEFAULT 'pending'::text NOT NULL,
+    response_attempts integer DEFAULT 0 NOT NULL,
+    response_attempted_at timestamp with time zone,
+    response_last_error text,
+    response_message_external_id text,
+    responded_at timestamp with time zone,
+    CONSTRAINT dm_messages_direction_check CHECK ((direction = ANY (ARRAY['inbound'::text, 'outbound'::text]))),
+    CONSTRAINT dm_messages_response_status_check CHECK ((response_status = ANY (ARRAY['pending'::text, 'sending'::text, 'responded'::text, 'failed'::text, 'not_applicable'::text])))
+);
+
+
+--
+-- Name: dm_messages_id_seq; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE public.dm_messages_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+--
+-- Name: dm_messages_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: -
+--
+
+ALTER SEQUENCE public.dm_messages_id_seq OWNED BY public.dm_messages.id;
+
+
+--
+-- Name: dm_profile_state; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.dm_profile_state (
+    user_id bigint NOT NULL,
+    last_profile_event_id bigint,
+    user_psychographics_id bigint,
+    snapshot jsonb DEFAULT '{}'::jsonb NOT NULL,
+    updated_at timestamp with time zone DEFAULT now() NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    onboarding_status text DEFAULT 'not_started'::text NOT NULL,
+    onboarding_required_fields jsonb DEFAULT '["primary_role", "primary_company", "notable_topics", "preferred_contact_style"]'::jsonb NOT NULL,
+    onboarding_missing_fields jsonb DEFAULT '["primary_role", "primary_company", "notable_topics", "preferred_contact_style"]'::jsonb NOT NULL,
+    onboarding_last_prompted_field text,
+    onboarding_started_at timestamp with time zone,
+    onboarding_completed_at timestamp with time zone,
+    onboarding_turns integer DEFAULT 0 NOT NULL,
+    CONSTRAINT dm_profile_state_onboarding_status_check CHECK ((onboarding_status = ANY (ARRAY['not_started'::text, 'collecting'::text, 'completed'::text, 'paused'::text])))
+);
+
+
+--
+-- Name: dm_profile_update_events; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.dm_profile_update_events (
+    id bigint NOT NULL,
+    user_id bigint NOT NULL,
+    conversation_id bigint,
+    source_message_id bigint,
+    source_external_message_id text,
+    event_type text NOT NULL,
+    event_source text DEFAULT 'dm_listener'::text NOT NULL,
+    actor_role text DEFAULT 'user'::text NOT NULL,
+    event_payload jsonb DEFAULT '{}'::jsonb NOT NULL,
+    extracted_facts jsonb DEFAULT '[]'::jsonb NOT NULL,
+    confidence real DEFAULT 0.5 NOT NULL,
+    processed boolean DEFAULT false NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    CONSTRAINT dm_profile_update_events_confidence_check CHECK (((confidence >= (0)::double precision) AND (confidence <= (1)::double precision)))
+);
+
+
+--
+-- Name: dm_profile_update_events_id_seq; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE public.dm_profile_update_events_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+--
+-- Name: dm_profile_update_events_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: -
+--
+
+ALTER SEQUENCE public.dm_profile_update_events_id_seq OWNED BY public.dm_profile_update_events.id;
+
+
 --
 -- Name: groups; Type: TABLE; Schema: public; Owner: -
 --
@@ -796,6 +994,34 @@ ALTER TABLE ONLY public.abstention_log ALTER COLUMN id SET DEFAULT nextval('publ
 ALTER TABLE ONLY public.claims ALTER COLUMN id SET DEFAULT nextval('public.claims_id_seq'::regclass);
 
 
+--
+-- Name: dm_conversations id; Type: DEFAULT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_conversations ALTER COLUMN id SET DEFAULT nextval('public.dm_conversations_id_seq'::regclass);
+
+
+--
+-- Name: dm_feedback id; Type: DEFAULT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_feedback ALTER COLUMN id SET DEFAULT nextval('public.dm_feedback_id_seq'::regclass);
+
+
+--
+-- Name: dm_messages id; Type: DEFAULT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_messages ALTER COLUMN id SET DEFAULT nextval('public.dm_messages_id_seq'::regclass);
+
+
+--
+-- Name: dm_profile_update_events id; Type: DEFAULT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_update_events ALTER COLUMN id SET DEFAULT nextval('public.dm_profile_update_events_id_seq'::regclass);
+
+
 --
 -- Name: groups id; Type: DEFAULT; Schema: public; Owner: -
 --
@@ -862,6 +1088,46 @@ ALTER TABLE ONLY public.claims
     ADD CONSTRAINT claims_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: dm_conversations dm_conversations_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_conversations
+    ADD CONSTRAINT dm_conversations_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: dm_feedback dm_feedback_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_feedback
+    ADD CONSTRAINT dm_feedback_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: dm_messages dm_messages_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_messages
+    ADD CONSTRAINT dm_messages_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: dm_profile_state dm_profile_state_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_state
+    ADD CONSTRAINT dm_profile_state_pkey PRIMARY KEY (user_id);
+
+
+--
+-- Name: dm_profile_update_events dm_profile_update_events_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_update_events
+    ADD CONSTRAINT dm_profile_update_events_pkey PRIMARY KEY (id);
+
+
 --
 -- Name: groups groups_pkey; Type: CONSTRAINT; Schema: public; Owner: -
 --
@@ -1023,6 +1289,111 @@ COMMENT ON INDEX public.idx_claims_unique_per_version IS 'Enables ON CONFLICT up
 CREATE INDEX idx_claims_user ON public.claims USING btree (subject_user_id);
 
 
+--
+-- Name: idx_dm_conversations_chat_unique; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE UNIQUE INDEX idx_dm_conversations_chat_unique ON public.dm_conversations USING btree (platform, external_chat_id);
+
+
+--
+-- Name: idx_dm_conversations_last_message; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_conversations_last_message ON public.dm_conversations USING btree (last_message_at DESC);
+
+
+--
+-- Name: idx_dm_conversations_user_a; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_conversations_user_a ON public.dm_conversations USING btree (user_a_id);
+
+
+--
+-- Name: idx_dm_conversations_user_b; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_conversations_user_b ON public.dm_conversations USING btree (user_b_id);
+
+
+--
+-- Name: idx_dm_feedback_conversation_created; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_feedback_conversation_created ON public.dm_feedback USING btree (conversation_id, created_at DESC);
+
+
+--
+-- Name: idx_dm_feedback_kind_created; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_feedback_kind_created ON public.dm_feedback USING btree (kind, created_at DESC);
+
+
+--
+-- Name: idx_dm_feedback_user_created; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_feedback_user_created ON public.dm_feedback USING btree (user_id, created_at DESC);
+
+
+--
+-- Name: idx_dm_messages_conv_sent_at; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_messages_conv_sent_at ON public.dm_messages USING btree (conversation_id, sent_at DESC);
+
+
+--
+-- Name: idx_dm_messages_response_pending; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_messages_response_pending ON public.dm_messages USING btree (conversation_id, direction, sent_at) WHERE ((response_status = 'pending'::text) OR (response_status = 'failed'::text));
+
+
+--
+-- Name: idx_dm_messages_response_status; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_messages_response_status ON public.dm_messages USING btree (response_status) WHERE (response_status IS NOT NULL);
+
+
+--
+-- Name: idx_dm_messages_sender; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_messages_sender ON public.dm_messages USING btree (sender_id);
+
+
+--
+-- Name: idx_dm_messages_unique; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE UNIQUE INDEX idx_dm_messages_unique ON public.dm_messages USING btree (conversation_id, external_message_id);
+
+
+--
+-- Name: idx_dm_profile_state_onboarding_status; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_profile_state_onboarding_status ON public.dm_profile_state USING btree (onboarding_status);
+
+
+--
+-- Name: idx_dm_profile_update_events_unprocessed; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_profile_update_events_unprocessed ON public.dm_profile_update_events USING btree (id) WHERE (processed = false);
+
+
+--
+-- Name: idx_dm_profile_update_events_user; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_dm_profile_update_events_user ON public.dm_profile_update_events USING btree (user_id, created_at DESC);
+
+
 --
 -- Name: idx_message_insights_extracted_orgs; Type: INDEX; Schema: public; Owner: -
 --
@@ -1135,6 +1506,13 @@ CREATE INDEX idx_raw_imports_sha256 ON public.raw_imports USING btree (sha256);
 CREATE INDEX idx_users_handle ON public.users USING btree (handle);
 
 
+--
+-- Name: ux_dm_profile_update_events_message_type; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE UNIQUE INDEX ux_dm_profile_update_events_message_type ON public.dm_profile_update_events USING btree (source_message_id, event_type) WHERE (source_message_id IS NOT NULL);
+
+
 --
 -- Name: claims claim_must_have_evidence; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -1170,6 +1548,20 @@ CREATE CONSTRAINT TRIGGER evidence_change_revalidate_claim AFTER DELETE OR UPDAT
 CREATE TRIGGER flag_user_dirty AFTER INSERT ON public.messages FOR EACH ROW EXECUTE FUNCTION public.trg_flag_user_for_enrichment();
 
 
+--
+-- Name: dm_messages notify_dm_inbound; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER notify_dm_inbound AFTER INSERT ON public.dm_messages FOR EACH ROW WHEN (((new.direction = 'inbound'::text) AND (new.response_status = 'pending'::text))) EXECUTE FUNCTION public.trg_notify_dm_inbound();
+
+
+--
+-- Name: dm_messages notify_dm_inbound_ingested; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER notify_dm_inbound_ingested AFTER UPDATE OF raw_payload ON public.dm_messages FOR EACH ROW WHEN (((new.direction = 'inbound'::text) AND (new.response_status = 'pending'::text) AND ((old.raw_payload ->> 'stored_by'::text) = 'listen-dms'::text) AND ((new.raw_payload ->> 'stored_by'::text) IS DISTINCT FROM 'listen-dms'::text))) EXECUTE FUNCTION public.trg_notify_dm_inbound();
+
+
 --
 -- Name: abstention_log abstention_log_subject_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
@@ -1194,6 +1586,102 @@ ALTER TABLE ONLY public.claims
     ADD CONSTRAINT claims_subject_user_id_fkey FOREIGN KEY (subject_user_id) REFERENCES public.users(id) ON DELETE CASCADE;
 
 
+--
+-- Name: dm_conversations dm_conversations_user_a_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_conversations
+    ADD CONSTRAINT dm_conversations_user_a_id_fkey FOREIGN KEY (user_a_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: dm_conversations dm_conversations_user_b_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_conversations
+    ADD CONSTRAINT dm_conversations_user_b_id_fkey FOREIGN KEY (user_b_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: dm_feedback dm_feedback_conversation_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_feedback
+    ADD CONSTRAINT dm_feedback_conversation_id_fkey FOREIGN KEY (conversation_id) REFERENCES public.dm_conversations(id) ON DELETE SET NULL;
+
+
+--
+-- Name: dm_feedback dm_feedback_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_feedback
+    ADD CONSTRAINT dm_feedback_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: dm_messages dm_messages_conversation_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_messages
+    ADD CONSTRAINT dm_messages_conversation_id_fkey FOREIGN KEY (conversation_id) REFERENCES public.dm_conversations(id) ON DELETE CASCADE;
+
+
+--
+-- Name: dm_messages dm_messages_sender_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_messages
+    ADD CONSTRAINT dm_messages_sender_id_fkey FOREIGN KEY (sender_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: dm_profile_state dm_profile_state_last_profile_event_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_state
+    ADD CONSTRAINT dm_profile_state_last_profile_event_id_fkey FOREIGN KEY (last_profile_event_id) REFERENCES public.dm_profile_update_events(id) ON DELETE SET NULL;
+
+
+--
+-- Name: dm_profile_state dm_profile_state_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_state
+    ADD CONSTRAINT dm_profile_state_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: dm_profile_state dm_profile_state_user_psychographics_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_state
+    ADD CONSTRAINT dm_profile_state_user_psychographics_id_fkey FOREIGN KEY (user_psychographics_id) REFERENCES public.user_psychographics(id) ON DELETE SET NULL;
+
+
+--
+-- Name: dm_profile_update_events dm_profile_update_events_conversation_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_update_events
+    ADD CONSTRAINT dm_profile_update_events_conversation_id_fkey FOREIGN KEY (conversation_id) REFERENCES public.dm_conversations(id) ON DELETE SET NULL;
+
+
+--
+-- Name: dm_profile_update_events dm_profile_update_events_source_message_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_update_events
+    ADD CONSTRAINT dm_profile_update_events_source_message_id_fkey FOREIGN KEY (source_message_id) REFERENCES public.dm_messages(id) ON DELETE SET NULL;
+
+
+--
+-- Name: dm_profile_update_events dm_profile_update_events_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.dm_profile_update_events
+    ADD CONSTRAINT dm_profile_update_events_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
 --
 -- Name: memberships memberships_group_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
@@ -1319,4 +1807,12 @@ INSERT INTO public.schema_migrations (version) VALUES
     ('20260210110000'),
     ('20260210120000'),
     ('20260210130000'),
-    ('20260214190000');
+    ('20260214190000'),
+    ('20260216100000'),
+    ('20260216180000'),
+    ('20260217000000'),
+    ('20260217100000'),
+    ('20260217113000'),
+    ('20260218120000'),
+    ('20261016120000'),
+    ('20261016130000');
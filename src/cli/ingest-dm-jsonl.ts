@@ -8,6 +8,7 @@ import { db } from '../db/index.js';
 import { parseArgs } from '../utils.js';
 import { createLLMClient } from '../inference/llm-client.js';
 import { extractContactStyleDirectives, normalizeContactStyle } from '../lib/dm-contact-style.js';
+import { commitPosition, compactConsumed, isSegmentedLog, readNewLines } from '../lib/dm-segment-log.js';
 
 
 interface DmEvent {
@@ -1152,7 +1153,9 @@ async function ingestBatch(client: any, events: string[]): Promise<{
          views, forwards, has_links, has_mentions, response_status,
          raw_payload
        ) VALUES ($1, $2, $3, $4::text, $5, $6, $7::timestamptz, $8, $9, $10, $11, $12, $13::text, $14::jsonb)
-       ON CONFLICT (conversation_id, external_message_id) DO NOTHING`,
+       ON CONFLICT (conversation_id, external_message_id) DO UPDATE SET
+         raw_payload = EXCLUDED.raw_payload
+       WHERE dm_messages.raw_payload->>'stored_by' = 'listen-dms'`,
       [
         convId,
         String(row.message_id),
@@ -1171,6 +1174,9 @@ async function ingestBatch(client: any, events: string[]): Promise<{
       ],
     );
 
+    // rowCount is also 1 the first time a row the live listener stored
+    // directly (tools/telethon_collector/dm_pg_sink.py) is seen here: its
+    // payload is replaced and the profile-signal extraction below runs once.
     if (msgRes.rowCount === 1) {
       const msgDbId = await client.query(
         `SELECT id FROM dm_messages WHERE conversation_id=$1 AND external_message_id=$2`,
@@ -1204,18 +1210,61 @@ async function ingestBatch(client: any, events: string[]): Promise<{
   return { inserted, skipped, malformed, users: userCache.size, psychEvents };
 }
 
+function printIngestSummary(
+  processed: number,
+  result: { inserted: number; skipped: number; malformed: number; users: number; psychEvents: number },
+  start: number,
+): void {
+  const elapsedSec = ((Date.now() - start) / 1000).toFixed(1);
+  console.log(`\n✅ DM JSONL ingest finished`);
+  console.log(`   File lines processed: ${processed}`);
+  console.log(`   Inserted messages: ${result.inserted}`);
+  console.log(`   Skipped/Duplicates: ${result.skipped}`);
+  console.log(`   Malformed lines: ${result.malformed}`);
+  console.log(`   Profile signal events: ${result.psychEvents}`);
+  console.log(`   Upserted users: ${result.users}`);
+  console.log(`   Time: ${elapsedSec}s`);
+}
+
+// Segmented log directory (tools/telethon_collector/dm_log.py): read only the
+// bytes after this consumer's manifest position, commit the new position
+// after the transaction, then compress segments every consumer has read.
+async function ingestSegmentedLog(dir: string, consumer: string): Promise<void> {
+  console.log(`📥 Ingesting DM log from: ${dir} (consumer: ${consumer})`);
+  const start = Date.now();
+  const read = await readNewLines(dir, consumer);
+  console.log(`   ${read.bytes} new bytes in ${read.segments} segment(s); now at segment ${read.position.seq} byte ${read.position.offset}.`);
+
+  const result = await db.transaction(async (client) => {
+    return ingestBatch(client, read.lines);
+  });
+  printIngestSummary(read.lines.length, result, start);
+
+  await commitPosition(dir, consumer, read.position);
+  const compressed = await compactConsumed(dir);
+  if (compressed > 0) {
+    console.log(`   Compressed ${compressed} fully consumed segment(s).`);
+  }
+}
+
 async function main() {
   const args = parseArgs();
   const filePath = args['file'];
 
   if (!filePath) {
     console.error(
-      'Usage: npm run ingest-dm-jsonl -- --file <data/exports/telethon_dms_live.jsonl> [--state-file <path>]',
+      'Usage: npm run ingest-dm-jsonl -- --file <data/exports/telethon_dms_live | legacy .jsonl file> '
+        + '[--consumer <name>] [--state-file <path>]',
     );
     process.exit(1);
   }
 
   const abs = path.resolve(process.cwd(), filePath);
+  if (isSegmentedLog(abs)) {
+    await ingestSegmentedLog(abs, args['consumer'] || 'ingest');
+    await db.close();
+    return;
+  }
   const statePath = args['state-file']
     ? path.resolve(process.cwd(), args['state-file'])
     : `${abs}.checkpoint.json`;
@@ -1262,15 +1311,7 @@ async function main() {
     return ingestBatch(client, rows);
   });
 
-  const elapsedSec = ((Date.now() - start) / 1000).toFixed(1);
-  console.log(`\n✅ DM JSONL ingest finished`);
-  console.log(`   File lines processed: ${lineNo - startLine}`);
-  console.log(`   Inserted messages: ${inserted}`);
-  console.log(`   Skipped/Duplicates: ${skipped}`);
-  console.log(`   Malformed lines: ${malformed}`);
-  console.log(`   Profile signal events: ${psychEvents}`);
-  console.log(`   Upserted users: ${users}`);
-  console.log(`   Time: ${elapsedSec}s`);
+  printIngestSummary(lineNo - startLine, { inserted, skipped, malformed, users, psychEvents }, start);
 
   await writeIngestState(statePath, {
     version: 1,
@@ -0,0 +1,249 @@
+// Consumer side of the segmented DM event log written by
+// tools/telethon_collector/dm_log.py (listen-dms.py / snapshot-dms.py).
+//
+// A log directory holds numbered JSONL segments plus manifest.json, which
+// lists the segments and each consumer's read position as (seq, byte offset).
+// Consumers read only the complete lines after their position, commit the
+// new position once the lines are stored, and gzip sealed segments every
+// consumer has read past. Manifest updates take the same O_EXCL lock file as
+// the Python writers.
+import fs from 'node:fs';
+import { promises as fsp } from 'node:fs';
+import path from 'node:path';
+import { pipeline } from 'node:stream/promises';
+import zlib from 'node:zlib';
+
+const MANIFEST = 'manifest.json';
+const LOCK = 'manifest.lock';
+const LOCK_STALE_MS = 30_000; // How long a lock without a pid is trusted
+const LOCK_POLL_MS = 20;
+
+export interface LogSegment {
+  seq: number;
+  file: string;
+  created_at: string;
+  sealed_at: string | null;
+  bytes: number | null;
+  compressed: boolean;
+}
+
+export interface ConsumerPosition {
+  seq: number;
+  offset: number;
+  updated_at?: string;
+}
+
+export interface LogManifest {
+  version: 1;
+  segments: LogSegment[];
+  consumers: Record<string, ConsumerPosition>;
+}
+
+export interface LogRead {
+  lines: string[];
+  bytes: number;
+  segments: number;
+  position: ConsumerPosition;
+}
+
+/** A directory (or a path without a .jsonl suffix) is a segmented log. */
+export function isSegmentedLog(target: string): boolean {
+  try {
+    if (fs.statSync(target).isDirectory()) return true;
+  } catch {
+    // Not created yet: decide by name, as dm_log.is_segmented does
+  }
+  return path.extname(target) !== '.jsonl';
+}
+
+/**
+ * Whether the process named in a lock file still runs (same host). A lock
+ * without a pid yet is trusted for LOCK_STALE_MS: its holder may be between
+ * creating the file and writing its pid.
+ */
+async function lockHolderAlive(lockPath: string): Promise<boolean> {
+  let raw: string;
+  let mtimeMs: number;
+  try {
+    raw = (await fsp.readFile(lockPath, 'utf8')).trim();
+    mtimeMs = (await fsp.stat(lockPath)).mtimeMs;
+  } catch {
+    return false;
+  }
+  if (!/^\d+$/.test(raw)) return Date.now() - mtimeMs <= LOCK_STALE_MS;
+  try {
+    process.kill(Number(raw), 0);
+    return true;
+  } catch (err: any) {
+    return err?.code === 'EPERM'; // alive, owned by another user
+  }
+}
+
+export async function withManifestLock<T>(dir: string, fn: () => Promise<T>): Promise<T> {
+  const lockPath = path.join(dir, LOCK);
+  for (;;) {
+    try {
+      const handle = await fsp.open(lockPath, 'wx');
+      await handle.writeFile(String(process.pid));
+      await handle.close();
+      break;
+    } catch (err: any) {
+      if (err?.code !== 'EEXIST') throw err;
+      // Break a leftover lock only once its holder is gone, never because it is slow
+      if (!(await lockHolderAlive(lockPath))) {
+        await fsp.unlink(lockPath).catch(() => undefined);
+        continue;
+      }
+      await new Promise((resolve) => setTimeout(resolve, LOCK_POLL_MS));
+    }
+  }
+  try {
+    return await fn();
+  } finally {
+    await fsp.unlink(lockPath).catch(() => undefined);
+  }
+}
+
+export async function loadManifest(dir: string): Promise<LogManifest> {
+  try {
+    return JSON.parse(await fsp.readFile(path.join(dir, MANIFEST), 'utf8')) as LogManifest;
+  } catch (err: any) {
+    if (err?.code === 'ENOENT') return { version: 1, segments: [], consumers: {} };
+    throw err;
+  }
+}
+
+async function saveManifest(dir: string, manifest: LogManifest): Promise<void> {
+  const target = path.join(dir, MANIFEST);
+  await fsp.writeFile(`${target}.tmp`, JSON.stringify(manifest, null, 2), 'utf8');
+  await fsp.rename(`${target}.tmp`, target);
+}
+
+async function readSegment(dir: string, segment: LogSegment, offset: number): Promise<Buffer> {
+  if (segment.compressed) {
+    const raw = zlib.gunzipSync(await fsp.readFile(path.join(dir, `${segment.file}.gz`)));
+    return raw.subarray(offset);
+  }
+  const handle = await fsp.open(path.join(dir, segment.file), 'r');
+  try {
+    const { size } = await handle.stat();
+    const length = Math.max(0, size - offset);
+    const buf = Buffer.alloc(length);
+    let read = 0;
+    while (read < length) {
+      const { bytesRead } = await handle.read(buf, read, length - read, offset + read);
+      if (bytesRead === 0) break;
+      read += bytesRead;
+    }
+    return buf.subarray(0, read);
+  } finally {
+    await handle.close();
+  }
+}
+
+/**
+ * Complete lines written after `consumer`'s position. A consumer seen for
+ * the first time starts at the oldest segment. The returned position is
+ * committed with commitPosition() once the lines are stored.
+ */
+export async function readNewLines(dir: string, consumer: string): Promise<LogRead> {
+  const manifest = await loadManifest(dir);
+  const first = manifest.segments[0]?.seq ?? 1;
+  let position: ConsumerPosition = manifest.consumers[consumer] ?? { seq: first, offset: 0 };
+  const lines: string[] = [];
+  let bytes = 0;
+  let segments = 0;
+
+  for (const segment of manifest.segments) {
+    if (segment.seq < position.seq) continue;
+    const start = segment.seq === position.seq ? position.offset : 0;
+    const chunk = await readSegment(dir, segment, start);
+    // A torn final line of the active segment (writer mid-append) is left
+    // for the next run. Sealed segments are complete: writers terminate a
+    // torn line before sealing, so a partial tail there (a crash in an older
+    // writer) is skipped rather than waited for.
+    const sealed = segment.sealed_at !== null;
+    const end = chunk.lastIndexOf(0x0a) + 1;
+    if (end > 0) {
+      for (const line of chunk.subarray(0, end).toString('utf8').split('\n')) {
+        if (line) lines.push(line);
+      }
+    }
+    if (sealed && end < chunk.length) {
+      console.warn(`[dm-log] skipping ${chunk.length - end} byte(s) of torn tail in sealed segment ${segment.file}`);
+    }
+    const consumed = sealed ? chunk.length : end;
+    bytes += consumed;
+    segments += 1;
+    position = { seq: segment.seq, offset: start + consumed };
+    // Only a sealed segment lets the position move on to the next one
+    if (!sealed) break;
+  }
+  return { lines, bytes, segments, position };
+}
+
+export async function commitPosition(dir: string, consumer: string, position: ConsumerPosition): Promise<void> {
+  await withManifestLock(dir, async () => {
+    const manifest = await loadManifest(dir);
+    manifest.consumers[consumer] = { seq: position.seq, offset: position.offset, updated_at: new Date().toISOString() };
+    await saveManifest(dir, manifest);
+  });
+}
+
+async function segmentSize(dir: string, segment: LogSegment): Promise<number> {
+  try {
+    return (await fsp.stat(path.join(dir, segment.file))).size;
+  } catch {
+    return segment.bytes ?? 0;
+  }
+}
+
+function consumedByAll(manifest: LogManifest, segment: LogSegment, size: number): boolean {
+  const consumers = Object.values(manifest.consumers);
+  return consumers.length > 0 && consumers.every(
+    (c) => c.seq > segment.seq || (c.seq === segment.seq && c.offset >= size),
+  );
+}
+
+/**
+ * Gzip sealed segments that every consumer has read past; returns how many.
+ * Compression runs outside the lock, so the segment is checked again under
+ * it (still sealed, uncompressed, consumed and unchanged in size) before the
+ * original is unlinked; otherwise the archive is dropped for a later pass.
+ */
+export async function compactConsumed(dir: string): Promise<number> {
+  const manifest = await loadManifest(dir);
+
+  let done = 0;
+  for (const segment of manifest.segments) {
+    if (segment.compressed || segment.sealed_at === null) continue;
+    const size = await segmentSize(dir, segment);
+    if (!consumedByAll(manifest, segment, size)) continue;
+
+    const src = path.join(dir, segment.file);
+    const tmp = `${src}.gz.tmp`;
+    await pipeline(fs.createReadStream(src), zlib.createGzip(), fs.createWriteStream(tmp));
+    const compacted = await withManifestLock(dir, async () => {
+      const current = await loadManifest(dir);
+      const entry = current.segments.find((s) => s.seq === segment.seq);
+      if (
+        !entry
+        || entry.compressed
+        || entry.sealed_at === null
+        || (await segmentSize(dir, entry)) !== size
+        || !consumedByAll(current, entry, size)
+      ) {
+        await fsp.unlink(tmp);
+        return false;
+      }
+      await fsp.rename(tmp, `${src}.gz`);
+      entry.bytes = size;
+      entry.compressed = true;
+      await saveManifest(dir, current);
+      await fsp.unlink(src);
+      return true;
+    });
+    if (compacted) done += 1;
+  }
+  return done;
+}
@@ -30,6 +30,9 @@ import psycopg
 from telethon import TelegramClient
 from telethon.tl.types import User
 
+from entity_cache import EntityCache
+from rate_limiter import RateLimiter
+
 _SCRIPT_DIR = Path(__file__).resolve().parent
 _ROOT_DIR = _SCRIPT_DIR.parent.parent
 
@@ -211,14 +214,27 @@ def update_user(conn: psycopg.Connection, user_id: int, name: Optional[str], han
     return name_written, handle_written
 
 
-async def resolve_live(client: TelegramClient, telegram_user_id: int) -> tuple[Optional[str], Optional[str]]:
+async def resolve_live(
+    client: TelegramClient,
+    limiter: RateLimiter,
+    telegram_user_id: int,
+    timeout: float = 2.0,
+    entity_cache: Optional[EntityCache] = None,
+) -> tuple[Optional[str], Optional[str]]:
+    # The timeout applies per request; FloodWait pauses happen between
+    # attempts inside the limiter, so they do not count against it
     try:
-        entity = await client.get_entity(telegram_user_id)
+        entity = await limiter.call(
+            "entities",
+            lambda: asyncio.wait_for(client.get_entity(telegram_user_id), timeout=timeout),
+        )
     except Exception:
         return None, None
 
     if not isinstance(entity, User):
         return None, None
+    if entity_cache is not None:
+        entity_cache.put(entity)
 
     return display_name_from_user(entity), normalize_handle(getattr(entity, "username", None))
 
@@ -233,13 +249,14 @@ async def run() -> int:
 
     session_path = resolve_session_path(os.getenv("TG_SESSION_PATH", str(_SCRIPT_DIR / "telethon.session")))
     session_cache = load_session_entities(session_path)
+    entity_cache = EntityCache()
 
     api_id = os.getenv("TG_API_ID")
     api_hash = os.getenv("TG_API_HASH")
     requested_live_lookup = bool(args.live_lookup)
     have_live_lookup = bool(requested_live_lookup and api_id and api_hash and session_path and session_path.exists())
 
-    if not have_live_lookup and not session_cache:
+    if not have_live_lookup and not session_cache and not entity_cache.count():
         msg = "⚠️ Telethon session/cache not available; skipping name backfill."
         if args.strict:
             print(msg, file=sys.stderr)
@@ -258,6 +275,7 @@ async def run() -> int:
 
         print(f"🔎 Candidates: {len(candidates)} (limit={args.limit}, only_no_handle={args.only_no_handle})")
         print(f"📦 Session cache entities: {len(session_cache)}")
+        print(f"📦 Shared entity cache users: {entity_cache.count()} ({entity_cache.path})")
 
         client: Optional[TelegramClient] = None
         if have_live_lookup:
@@ -272,9 +290,11 @@ async def run() -> int:
             print("⚠️ Live Telethon lookup disabled: missing TG_API_ID/TG_API_HASH/session.")
 
         print(f"🌐 Live Telethon lookup: {'enabled' if have_live_lookup else 'disabled'}")
+        limiter = RateLimiter()
 
         looked_up = 0
         from_cache = 0
+        from_entity_cache = 0
         from_live = 0
         updated_names = 0
         updated_handles = 0
@@ -292,14 +312,18 @@ async def run() -> int:
                 if resolved_name or resolved_handle:
                     from_cache += 1
 
+            if not resolved_name:
+                stored = entity_cache.get(c.telegram_user_id)
+                stored_name = display_name_from_user(stored) if stored else None
+                if stored_name:
+                    from_entity_cache += 1
+                    resolved_name = stored_name
+                    resolved_handle = resolved_handle or normalize_handle(stored.username)
+
             if (not resolved_name and client is not None):
-                try:
-                    live_name, live_handle = await asyncio.wait_for(
-                        resolve_live(client, c.telegram_user_id),
-                        timeout=2.0,
-                    )
-                except asyncio.TimeoutError:
-                    live_name, live_handle = None, None
+                live_name, live_handle = await resolve_live(
+                    client, limiter, c.telegram_user_id, entity_cache=entity_cache,
+                )
                 if live_name or live_handle:
                     from_live += 1
                 if live_name:
@@ -340,6 +364,7 @@ async def run() -> int:
         print("\n✅ Telethon name backfill complete:")
         print(f"   looked_up:      {looked_up}")
         print(f"   from_cache:     {from_cache}")
+        print(f"   from_entities:  {from_entity_cache}")
         print(f"   from_live:      {from_live}")
         print(f"   names_updated:  {updated_names}")
         print(f"   handles_updated:{updated_handles}")
@@ -351,6 +376,7 @@ async def run() -> int:
         return 1
     finally:
         conn.close()
+        entity_cache.close()
 
 
 if __name__ == "__main__":
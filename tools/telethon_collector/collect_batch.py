@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Collect many Telegram groups in one process over a single TelegramClient.
+
+Each manifest entry is run through collect_group_export.collect_group()
+with the same options as the single-group CLI, so every group keeps its own
+export, index and checkpoint journal. One client is connected and
+authorized once; a bounded number of groups run concurrently, and all of
+them share one RateLimiter with a global FloodWait budget.
+
+Usage:
+    python tools/telethon_collector/collect_batch.py \
+        --manifest data/exports/groups.manifest.json --concurrency 4
+
+Manifest format (keys mirror collect_group_export.py flags):
+    {
+      "defaults": {"format": "ndjson", "include_participants": false},
+      "groups": [
+        {"group": "BD in Web3", "out": "data/exports/telethon_bd_web3.ndjson"},
+        {"group": "-1001234567890", "out": "data/exports/telethon_other.ndjson", "workers": 2},
+        {"group": "Alpha Chat", "sink": "postgres"}
+      ]
+    }
+
+"out" is required unless the entry's sink (or the defaults') is postgres.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+
+from collect_group_export import (
+    API_HASH,
+    API_ID,
+    SESSION_PATH,
+    _FLOOD_MAX_RETRIES,
+    GroupResolutionError,
+    _write_json_atomic,
+    collect_group,
+    parse_args as parse_group_args,
+    write_metrics,
+)
+from metrics import Metrics
+from rate_limiter import FloodBudgetExceeded, RateLimiter
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Collect several Telegram groups over one shared client.",
+    )
+    p.add_argument(
+        "--manifest",
+        required=True,
+        help="JSON manifest: {\"defaults\": {...}, \"groups\": [{\"group\": ..., \"out\": ...}, ...]}.",
+    )
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=3,
+        help="Max groups collected at the same time (default: 3).",
+    )
+    p.add_argument(
+        "--flood-budget",
+        type=float,
+        default=1800,
+        help="Total FloodWait seconds tolerated across all groups before remaining "
+             "groups are deferred to the next run (default: 1800).",
+    )
+    p.add_argument(
+        "--report",
+        default=None,
+        help="Optional path for a JSON report of per-group results.",
+    )
+    args = p.parse_args()
+    if args.concurrency < 1:
+        p.error("--concurrency must be >= 1")
+    return args
+
+
+# ── Manifest ────────────────────────────────────────────
+
+def _entry_argv(entry: dict) -> list[str]:
+    """Translate a manifest entry into collect_group_export.py arguments."""
+    argv = []
+    for key, value in entry.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        argv += [f"--{key.replace('_', '-')}", str(value)]
+    return argv
+
+
+def load_manifest(path: Path) -> list[argparse.Namespace]:
+    """Parse the manifest into per-group option namespaces (validated up front)."""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, list):
+        data = {"groups": data}
+    defaults = data.get("defaults", {})
+    specs = []
+    for entry in data.get("groups", []):
+        merged = {**defaults, **entry}
+        if "group" not in entry:
+            raise SystemExit(f"❌  Manifest entry needs 'group': {entry}")
+        # Postgres entries default to a per-group path for the journal and metrics
+        if "out" not in entry and merged.get("sink") != "postgres":
+            raise SystemExit(f"❌  Manifest entry needs 'out' unless its sink is postgres: {entry}")
+        specs.append(parse_group_args(_entry_argv(merged)))
+    return specs
+
+
+# ── Scheduler ───────────────────────────────────────────
+
+async def run_batch(
+    client: TelegramClient,
+    specs: list[argparse.Namespace],
+    concurrency: int,
+    limiter: RateLimiter,
+) -> list[dict]:
+    """Run every group with at most ``concurrency`` in flight.
+
+    Every request of every group goes through the shared ``limiter``, so a
+    FloodWait pauses all groups. One that still escapes a group is recorded
+    on the limiter and the group is retried; it resumes from its own
+    index/journal, so a retry only re-fetches what was not yet checkpointed.
+    Once the limiter's budget is spent, remaining groups are deferred.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(args: argparse.Namespace) -> dict:
+        async with sem:
+            # One metrics file per group; retries add to the same stages
+            metrics = Metrics(group=args.group)
+            try:
+                return await attempt(args, metrics)
+            finally:
+                write_metrics(args, metrics)
+
+    async def attempt(args: argparse.Namespace, metrics: Metrics) -> dict:
+        base = {"group": args.group, "out": args.out}
+        attempts = 0
+        while True:
+            if limiter.exhausted:
+                return {**base, "status": "deferred", "error": "flood budget exhausted"}
+            await limiter.wait()
+            try:
+                summary = await collect_group(client, args, limiter, metrics)
+                return {**summary, "status": "ok"}
+            except FloodBudgetExceeded as e:
+                return {**base, "status": "deferred", "error": str(e)}
+            except FloodWaitError as e:
+                limiter.note_flood(None, e.seconds)
+                attempts += 1
+                if attempts > _FLOOD_MAX_RETRIES:
+                    return {**base, "status": "failed", "error": f"FloodWaitError ({e.seconds}s) after {attempts - 1} retries"}
+                print(f"   ⏳ FloodWait {e.seconds}s in {args.group}: pausing all groups, then retrying "
+                      f"({attempts}/{_FLOOD_MAX_RETRIES})")
+            except GroupResolutionError:
+                return {**base, "status": "failed", "error": "group not found"}
+            except Exception as e:
+                print(f"   ⚠️  {args.group}: {type(e).__name__}: {e}")
+                return {**base, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    return await asyncio.gather(*(run_one(a) for a in specs))
+
+
+# ── Main ────────────────────────────────────────────────
+
+async def main() -> int:
+    args = parse_args()
+
+    if not API_ID or not API_HASH:
+        print("❌  TG_API_ID and TG_API_HASH must be set in .env", file=sys.stderr)
+        return 1
+
+    specs = load_manifest(Path(args.manifest))
+    if not specs:
+        print("⚠️  Manifest lists no groups.")
+        return 0
+    print(f"📋 {len(specs)} groups from {args.manifest} (concurrency={args.concurrency}, "
+          f"flood budget={args.flood_budget:.0f}s)")
+
+    # ── Connect once for the whole batch ─────────────
+    client = TelegramClient(SESSION_PATH, int(API_ID), API_HASH)
+    await client.start()
+    print(f"\n✅ Connected as: {(await client.get_me()).first_name}")
+
+    limiter = RateLimiter(budget=args.flood_budget)
+    started = datetime.now(timezone.utc).isoformat()
+    try:
+        results = await run_batch(client, specs, args.concurrency, limiter)
+    finally:
+        await client.disconnect()
+
+    print(f"\n{'━' * 50}")
+    print(f"✅ Batch complete ({limiter.total_wait:.0f}s FloodWait):")
+    for r in results:
+        detail = f"{r['messages_count']:,} messages" if r["status"] == "ok" else r.get("error", "")
+        print(f"   {r['status']:<9} {r['group']:<32} {detail}")
+    print()
+
+    if args.report:
+        _write_json_atomic(Path(args.report), {
+            "started_at": started,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "flood_wait_seconds": round(limiter.total_wait, 1),
+            "results": results,
+        })
+
+    return 1 if any(r["status"] == "failed" for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
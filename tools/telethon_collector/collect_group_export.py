@@ -13,16 +13,33 @@ Usage:
         --group "BD in Web3" \
         --out data/exports/telethon_bd_web3.json
 
+    # Append-only NDJSON export (one message per line + header/index sidecars):
+    python tools/telethon_collector/collect_group_export.py \
+        --group "BD in Web3" \
+        --out data/exports/telethon_bd_web3.ndjson --format ndjson
+
+    # Also download photos up to 10 MB (content-addressed, resumable):
+    python tools/telethon_collector/collect_group_export.py \
+        --group "BD in Web3" \
+        --out data/exports/telethon_bd_web3.json \
+        --media-dir data/media --media-types photo --media-max-mb 10
+
 See tools/telethon_collector/README.md for full documentation.
 """
 
 import argparse
 import asyncio
+import hashlib
+import heapq
+import importlib.util
 import json
+import math
 import os
+import shutil
 import sys
 import time
-from datetime import datetime, timezone
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -31,24 +48,50 @@ from telethon.errors import (
     ChatAdminRequiredError,
     ChannelPrivateError,
     FloodWaitError,
+    RPCError,
 )
-from telethon.tl.types import Channel, Chat, User, MessageService
+from telethon.tl.functions.channels import GetParticipantsRequest
+from telethon.tl.functions.users import GetUsersRequest
+from telethon.tl.types import (
+    Channel,
+    ChannelParticipantsRecent,
+    ChannelParticipantsSearch,
+    Chat,
+    InputUserFromMessage,
+    MessageMediaDocument,
+    MessageMediaPhoto,
+    MessageService,
+    ReactionCustomEmoji,
+    ReactionEmoji,
+    User,
+)
+
+from dialog_index import DialogIndex, default_path as dialog_index_path, entity_type
+from entity_cache import CachedUser, EntityCache
+from media_downloader import MediaDownloader
+from metrics import Metrics
+from reply_graph import ReplyGraph
+from rate_limiter import FloodBudgetExceeded, RateLimiter
 
 # ── Load .env from the collector directory ──────────────
 _SCRIPT_DIR = Path(__file__).resolve().parent
 load_dotenv(_SCRIPT_DIR / ".env")
+# Project .env supplies DATABASE_URL for --sink postgres (collector .env wins)
+load_dotenv(_SCRIPT_DIR.parent.parent / ".env")
 
 API_ID = os.getenv("TG_API_ID")
 API_HASH = os.getenv("TG_API_HASH")
 SESSION_PATH = os.getenv("TG_SESSION_PATH", str(_SCRIPT_DIR / "telethon.session"))
 
-# Max retries for FloodWaitError during participant enumeration
+# Max retries for FloodWaitError before a request gives up
 _FLOOD_MAX_RETRIES = 3
 
+_DEFAULT_OUT = "data/exports/telethon_bd_web3.json"
+
 
 # ── Argument parsing ────────────────────────────────────
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     p = argparse.ArgumentParser(
         description="Collect Telegram group messages + participants to JSON.",
     )
@@ -59,19 +102,24 @@ def parse_args() -> argparse.Namespace:
     )
     p.add_argument(
         "--out",
-        default="data/exports/telethon_bd_web3.json",
-        help="Output JSON path (default: data/exports/telethon_bd_web3.json).",
+        default=None,
+        help=f"Output JSON path (default: {_DEFAULT_OUT}; with --sink postgres, "
+             "data/exports/telethon_<group id>.json, used only for the participant "
+             "journal and metrics).",
     )
     p.add_argument(
         "--limit",
         type=int,
         default=None,
-        help="Max messages to fetch (default: all messages).",
+        help="Fetch only the newest N messages above the resume point, for every "
+             "format and sink; messages in a resumed checkpoint count towards N "
+             "(default: all messages).",
     )
     p.add_argument(
         "--since",
         default=None,
-        help="Only messages after this date (YYYY-MM-DD).",
+        help="Only messages sent on or after this date (YYYY-MM-DD, UTC); earlier "
+             "releases kept the messages sent before it (see CHANGELOG.md).",
     )
     p.add_argument(
         "--include-participants",
@@ -79,54 +127,206 @@ def parse_args() -> argparse.Namespace:
         choices=["true", "false"],
         help="Attempt to collect full participant list (default: true).",
     )
-    return p.parse_args()
+    p.add_argument(
+        "--format",
+        default="json",
+        choices=["json", "ndjson", "parquet"],
+        help="Export format: single JSON document, append-only NDJSON with "
+             "header/index sidecars, or a Parquet dataset directory (needs pyarrow) "
+             "(default: json).",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Fetch history as N concurrent id ranges on one client (default: 1, sequential).",
+    )
+    p.add_argument(
+        "--refresh-window",
+        type=int,
+        default=0,
+        help="On incremental runs, re-fetch the newest N stored message ids and "
+             "patch edits / deletions (default: 0, off).",
+    )
+    p.add_argument(
+        "--refresh-hours",
+        type=float,
+        default=0,
+        help="Like --refresh-window, but for stored messages from the last N hours.",
+    )
+    p.add_argument(
+        "--sink",
+        default="file",
+        choices=["file", "postgres"],
+        help="Write to --out in --format (default), or stream straight into the "
+             "Postgres messages/users tables via COPY (uses DATABASE_URL).",
+    )
+    p.add_argument(
+        "--entity-cache",
+        default=None,
+        help="Persistent user cache shared across runs and scripts (default: "
+             "TG_ENTITY_CACHE_PATH or data/.state/telethon_entities.sqlite; 'off' disables).",
+    )
+    p.add_argument(
+        "--dialog-index",
+        default=None,
+        help="Local dialog index used to resolve --group without walking every "
+             "dialog (default: TG_DIALOG_INDEX_PATH or "
+             "data/.state/telethon_dialogs.<session>.sqlite; 'off' disables).",
+    )
+    p.add_argument(
+        "--media-dir",
+        default=None,
+        help="Download message media into this content-addressed directory "
+             "(default: off, metadata only).",
+    )
+    p.add_argument(
+        "--media-types",
+        default=None,
+        help=f"Comma-separated media types to download (default: all of {', '.join(MEDIA_FILE_TYPES)}).",
+    )
+    p.add_argument(
+        "--media-max-mb",
+        type=float,
+        default=50,
+        help="Skip media files larger than this many MB (default: 50; 0 = no limit).",
+    )
+    p.add_argument(
+        "--media-concurrency",
+        type=int,
+        default=3,
+        help="Concurrent media downloads (default: 3).",
+    )
+    p.add_argument(
+        "--reply-graph",
+        default="false",
+        choices=["true", "false"],
+        help="Maintain an append-only reply-graph sidecar (<out>.replies/) for file "
+             "exports (default: false).",
+    )
+    p.add_argument(
+        "--metrics",
+        default=None,
+        help="Run metrics JSON path (default: <out>.metrics.json; 'off' disables).",
+    )
+    p.add_argument(
+        "--metrics-prom",
+        default=None,
+        help="Also write the metrics in Prometheus text format to this path "
+             "(e.g. a node_exporter textfile collector directory).",
+    )
+    args = p.parse_args(argv)
+    if args.media_types:
+        unknown = set(args.media_types.split(",")) - set(MEDIA_FILE_TYPES)
+        if unknown:
+            p.error(f"unknown --media-types: {', '.join(sorted(unknown))}")
+    if args.sink == "postgres" and not os.getenv("DATABASE_URL"):
+        p.error("--sink postgres requires DATABASE_URL")
+    if args.out is None and args.sink == "file":
+        args.out = _DEFAULT_OUT
+    if args.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        p.error("--format parquet requires pyarrow (pip install pyarrow)")
+    if args.workers < 1:
+        p.error("--workers must be >= 1")
+    if args.workers > 1 and args.limit:
+        p.error("--limit cannot be combined with --workers > 1")
+    return args
 
 
 # ── Group resolution ────────────────────────────────────
 
-async def resolve_group(client: TelegramClient, group_arg: str):
+class GroupResolutionError(Exception):
+    """Raised when a --group argument matches no dialog unambiguously."""
+
+
+async def resolve_group(
+    client: TelegramClient,
+    group_arg: str,
+    dialogs: DialogIndex | None = None,
+    limiter: RateLimiter | None = None,
+):
     """
     Try to resolve the group argument to a Telethon entity.
-    Falls back to fuzzy-matching dialog titles if direct resolution fails.
+    Ids, @usernames and exact titles are looked up in the local dialog
+    index first; the index is refreshed (incrementally) only on a miss.
+    Falls back to fuzzy-matching dialog titles, printing candidates and
+    raising GroupResolutionError.
     """
-    # Try numeric ID
+    needle = group_arg.strip()
+
+    # Try numeric ID (a bare channel id is only known through the index)
     try:
-        group_id = int(group_arg)
-        return await client.get_entity(group_id)
-    except (ValueError, Exception):
-        pass
+        group_id = int(needle)
+    except ValueError:
+        group_id = None
+    if group_id is not None:
+        if dialogs is not None:
+            for entry in dialogs.exact(needle):
+                try:
+                    return await client.get_entity(entry.peer_id)
+                except Exception:
+                    pass
+        try:
+            return await client.get_entity(group_id)
+        except Exception:
+            pass
+
+    # Try the dialog index (username or exact title, no network)
+    if dialogs is not None and group_id is None:
+        for entry in dialogs.exact(needle):
+            try:
+                return await client.get_entity(entry.peer_id)
+            except Exception:
+                pass  # left the chat since the last refresh
 
     # Try direct resolution (username or exact title)
     try:
-        return await client.get_entity(group_arg)
+        return await client.get_entity(needle)
     except Exception:
         pass
 
-    # Fallback: fuzzy-match against dialog titles
-    print(f"\n⚠️  Could not resolve '{group_arg}' directly. Searching dialogs...\n")
+    if dialogs is None:
+        matches = await _scan_dialogs(client, needle)
+    else:
+        # Joined or renamed since the last refresh?
+        print(f"\n⚠️  Could not resolve '{group_arg}' directly. Refreshing dialog index...\n")
+        scanned, changed = await dialogs.refresh(client, limiter)
+        print(f"   📇 Dialog index: {len(dialogs):,} dialogs ({scanned:,} scanned, {changed:,} changed)")
+        for entry in dialogs.exact(needle):
+            try:
+                return await client.get_entity(entry.peer_id)
+            except Exception:
+                pass
+        matches = [
+            (e.title, e.entity_id, e.username, e.type)
+            for e in dialogs.search(needle, limit=10)
+        ]
+
+    if not matches:
+        print("❌  No matching dialogs found. Use list_dialogs.py to see all chats.")
+        raise GroupResolutionError(group_arg)
+
+    print("Did you mean one of these?\n")
+    for i, (title, eid, uname, dtype) in enumerate(matches, 1):
+        print(f"  {i}. {title}  (id={eid}  username={uname or ''}  type={dtype})")
+
+    print(f"\nRe-run with the exact title, @username, or numeric ID.")
+    raise GroupResolutionError(group_arg)
+
 
+async def _scan_dialogs(client: TelegramClient, needle: str) -> list[tuple]:
+    """Substring match over a live dialog walk (--dialog-index off)."""
+    print(f"\n⚠️  Could not resolve '{needle}' directly. Searching dialogs...\n")
     matches = []
-    needle = group_arg.lower().strip().lstrip("@")
+    needle = needle.lower().lstrip("@")
     async for dialog in client.iter_dialogs():
         title = (dialog.title or "").lower()
         username = getattr(dialog.entity, "username", None) or ""
         if needle in title or needle == username.lower():
-            matches.append(dialog)
+            matches.append((dialog.title, dialog.entity.id, username, entity_type(dialog.entity)))
         if len(matches) >= 10:
             break
-
-    if not matches:
-        print("❌  No matching dialogs found. Use list_dialogs.py to see all chats.")
-        sys.exit(1)
-
-    print("Did you mean one of these?\n")
-    for i, d in enumerate(matches, 1):
-        eid = d.entity.id
-        uname = getattr(d.entity, "username", None) or ""
-        print(f"  {i}. {d.title}  (id={eid}  username={uname})")
-
-    print(f"\nRe-run with the exact title, @username, or numeric ID.")
-    sys.exit(1)
+    return matches
 
 
 # ── Entity type helper ──────────────────────────────────
@@ -145,17 +345,40 @@ def _group_type(entity) -> str:
 
 # ── Sender cache ────────────────────────────────────────
 
+_SENDER_BATCH = 100     # Queued sender ids per GetUsersRequest
+_SENDER_HOLD_MAX = 2000  # Messages held back for pending senders before iteration waits
+
+
 class SenderCache:
     """Cache sender entities to avoid repeated API calls.
 
     Pre-seed with the participant list so most messages resolve instantly
-    without any API round-trip.
+    without any API round-trip. Senders Telethon already attached to a
+    fetched batch are harvested for free, then the persistent ``store`` is
+    consulted; anything still unknown is queued and resolved in bulk by
+    ``resolve_pending`` (GetUsersRequest with InputUserFromMessage, so no
+    access hash is needed) instead of one get_entity call per miss. Every
+    user learned from Telegram is written back to the store.
     """
 
-    def __init__(self, client: TelegramClient):
+    def __init__(
+        self,
+        client: TelegramClient,
+        limiter: RateLimiter | None = None,
+        store: EntityCache | None = None,
+    ):
         self._client = client
+        self._limiter = limiter or RateLimiter()
+        self._store = store
+        self._store_hits = 0
         self._cache: dict[int, User | None] = {}
+        self._queued: dict[int, int] = {}  # sender_id -> id of a message it sent
+        self._input_chat = None
         self._misses = 0
+        self._hits = 0          # Answered from the in-memory cache
+        self._harvested = 0     # Taken from the users attached to a fetched batch
+        self._batches = 0       # GetUsersRequest calls
+        self._batch_seconds = 0.0
 
     def seed_from_participants(self, participants: list[dict]) -> None:
         """Pre-populate cache from collected participants (dict format)."""
@@ -164,6 +387,10 @@ class SenderCache:
             if uid is not None:
                 # Store a lightweight object with the fields we need
                 self._cache[uid] = p  # type: ignore
+                if self._store:
+                    self._store.put(CachedUser(
+                        uid, p.get("first_name"), p.get("last_name"), p.get("username"), p.get("bot", False), 0,
+                    ))
         print(f"   📦 Sender cache pre-seeded with {len(self._cache)} participants")
 
     def _extract_name(self, entry) -> str | None:
@@ -184,27 +411,113 @@ class SenderCache:
             return entry.get("username")
         return getattr(entry, "username", None)
 
-    async def get(self, sender_id: int | None) -> tuple[str | None, str | None]:
-        """Return (display_name, from_id_str) without API calls when possible."""
+    @property
+    def pending(self) -> int:
+        """Number of sender ids waiting for ``resolve_pending``."""
+        return len(self._queued)
+
+    def is_pending(self, sender_id: int | None) -> bool:
+        return sender_id in self._queued
+
+    def name(self, sender_id: int | None) -> str | None:
+        return self._extract_name(self._cache.get(sender_id))
+
+    def lookup(self, msg) -> tuple[str | None, str | None]:
+        """Return (display_name, from_id_str) for ``msg`` without any API call.
+
+        An unknown sender is taken from the entities Telethon attached to the
+        fetched batch; failing that it is queued, and the caller should hold
+        the message until ``is_pending`` turns false.
+        """
+        sender_id = msg.sender_id
         if sender_id is None:
             return None, None
         from_id = f"user{sender_id}"
 
-        if sender_id in self._cache:
-            entry = self._cache[sender_id]
-            return self._extract_name(entry), from_id
-
-        # Cache miss — must resolve via API (uncommon if participants were seeded)
-        self._misses += 1
+        if sender_id not in self._cache:
+            sender = msg.sender
+            stored = None
+            if isinstance(sender, User) and not sender.min:
+                self._cache[sender_id] = sender
+                self._harvested += 1
+                if self._store:
+                    self._store.put(sender)
+            elif sender is not None and not isinstance(sender, User):
+                # Channel / anonymous admin posts have no user name
+                self._cache[sender_id] = None
+            elif self._store and (stored := self._store.get(sender_id)):
+                self._cache[sender_id] = stored
+                self._store_hits += 1
+            else:
+                if sender_id not in self._queued:
+                    self._misses += 1
+                    self._queued[sender_id] = msg.id
+                if isinstance(sender, User):
+                    # Min constructor: names are usable until the full user arrives
+                    return self._extract_name(sender), from_id
+                return None, from_id
+        else:
+            self._hits += 1
+
+        return self._extract_name(self._cache[sender_id]), from_id
+
+    def flush(self) -> None:
+        """Commit users learned so far to the persistent store."""
+        if self._store:
+            self._store.flush()
+
+    def close(self) -> None:
+        if self._store:
+            self._store.close()
+            self._store = None
+
+    async def resolve_pending(self, chat) -> None:
+        """Resolve every queued sender with batched GetUsersRequest calls.
+
+        Ids queued while a batch is in flight are picked up by the next loop
+        iteration. A failed batch is bisected so one stale reference cannot
+        cost the whole chunk its names; only senders Telegram rejects on
+        their own, or leaves out of a successful reply, are cached as None.
+        """
+        if self._queued and self._input_chat is None:
+            self._input_chat = await self._client.get_input_entity(chat)
+        while self._queued:
+            chunk = list(self._queued.items())[:_SENDER_BATCH]
+            await self._resolve_chunk(chunk)
+            for user_id, _ in chunk:
+                self._queued.pop(user_id, None)
+
+    async def _resolve_chunk(self, chunk: list[tuple[int, int]]) -> None:
+        request = GetUsersRequest([
+            InputUserFromMessage(self._input_chat, msg_id, user_id)
+            for user_id, msg_id in chunk
+        ])
+        t0 = time.perf_counter()
         try:
-            entity = await self._client.get_entity(sender_id)
-            if isinstance(entity, User):
-                self._cache[sender_id] = entity
-                return self._extract_name(entity), from_id
-        except Exception:
-            pass
-        self._cache[sender_id] = None
-        return None, from_id
+            users = await self._limiter.call("entities", self._client, request)
+        except FloodBudgetExceeded:
+            raise
+        except Exception as e:
+            users, error = None, e
+        finally:
+            self._batches += 1
+            self._batch_seconds += time.perf_counter() - t0
+        if users is None:
+            if len(chunk) > 1:
+                mid = len(chunk) // 2
+                await self._resolve_chunk(chunk[:mid])
+                await self._resolve_chunk(chunk[mid:])
+            elif isinstance(error, RPCError):
+                self._cache.setdefault(chunk[0][0], None)  # Rejected by the server
+            # Anything else (network) stays uncached; a later message re-queues it
+            return
+        for user in users:
+            if isinstance(user, User):
+                self._cache[user.id] = user
+                if self._store:
+                    self._store.put(user)
+        for user_id, _ in chunk:
+            self._cache.setdefault(user_id, None)
 
 
 # ── Message export ──────────────────────────────────────
@@ -217,33 +530,238 @@ def _display_name(user: User | None) -> str | None:
     return name or None
 
 
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+_encode_compact = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+# Media types as in Telegram Desktop exports (``media_type``), plus
+# "photo" and "document"; other media (web previews, polls, ...) carry no file
+MEDIA_FILE_TYPES = (
+    "photo", "sticker", "animation", "video_message", "voice_message",
+    "video_file", "audio_file", "document",
+)
+
+
+def _media_type(msg) -> str | None:
+    media = msg.media
+    if media is None:
+        return None
+    if isinstance(media, MessageMediaPhoto):
+        return "photo"
+    if isinstance(media, MessageMediaDocument):
+        if msg.sticker:
+            return "sticker"
+        if msg.gif:
+            return "animation"
+        if msg.video_note:
+            return "video_message"
+        if msg.voice:
+            return "voice_message"
+        if msg.video:
+            return "video_file"
+        if msg.audio:
+            return "audio_file"
+        return "document"
+    # MessageMediaWebPage -> "webpage", MessageMediaPoll -> "poll", ...
+    return type(media).__name__.removeprefix("MessageMedia").lower()
+
+
+def _media_meta(msg, media_type: str) -> dict:
+    """Export metadata of a message's media; file fields only when it has one."""
+    file = msg.file if media_type in MEDIA_FILE_TYPES else None
+    if file is None:
+        return {"type": media_type}  # also photos / documents that expired
+    return {
+        "type": media_type,
+        "file_id": str(file.media.id),
+        "size": file.size,
+        "mime_type": file.mime_type,
+        "file_name": file.name,
+        "duration": file.duration,
+        "width": file.width,
+        "height": file.height,
+    }
+
+
+def _reaction_label(reaction) -> str | None:
+    """Render a Reaction as the export's emoji string."""
+    if isinstance(reaction, ReactionEmoji):
+        return reaction.emoticon
+    if isinstance(reaction, ReactionCustomEmoji):
+        return f"custom_emoji_id:{reaction.document_id}"
+    return str(reaction) if reaction else None
+
+
+class MessageRecord:
+    """One exported message, kept as slots instead of a per-message dict.
+
+    ``json_line`` writes the export's JSON object directly (same keys, order
+    and bytes as ``_json_line(to_dict())``); ``to_dict`` is only needed where
+    a whole JSON document is built.
+    """
+
+    __slots__ = (
+        "id", "date", "from_name", "from_id", "text",
+        "reply_to", "views", "forwards", "reply_count", "reactions",
+        "media_type", "media",
+    )
+
+    def __init__(self, msg, from_name: str | None, from_id: str | None):
+        self.id = msg.id
+        self.date = msg.date.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        self.from_name = from_name
+        self.from_id = from_id
+        self.text = msg.message or ""
+        reply_to = msg.reply_to
+        self.reply_to = reply_to.reply_to_msg_id if reply_to else None
+        self.views = msg.views or 0
+        self.forwards = msg.forwards or 0
+        replies = msg.replies
+        self.reply_count = replies.replies if replies else 0
+        reactions = msg.reactions
+        # (count, emoji) pairs; None when the message has no reactions object
+        self.reactions = (
+            tuple((r.count, _reaction_label(r.reaction)) for r in reactions.results)
+            if reactions else None
+        )
+        self.media_type = _media_type(msg)
+        self.media = None if self.media_type is None else _media_meta(msg, self.media_type)
+
+    def _reactions_dict(self) -> dict | None:
+        if self.reactions is None:
+            return None
+        return {"results": [{"count": c, "emoji": e} for c, e in self.reactions]}
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "type": "message",
+            "date": self.date,
+            "from": self.from_name,
+            "from_id": self.from_id,
+            "text": self.text,
+            "reply_to_message_id": self.reply_to,
+            "views": self.views,
+            "forwards": self.forwards,
+            "reply_count": self.reply_count,
+            "reactions": self._reactions_dict(),
+            "media_type": self.media_type,
+            "media": self.media,
+        }
+
+    def json_line(self) -> bytes:
+        if self.reactions is None:
+            reactions = "null"
+        else:
+            reactions = '{"results":[' + ",".join(
+                f'{{"count":{c},"emoji":{_encode(e)}}}' for c, e in self.reactions
+            ) + "]}"
+        reply_to = "null" if self.reply_to is None else self.reply_to
+        if self.media is None:
+            media = "null,\"media\":null"
+        else:
+            media = f'"{self.media_type}","media":{_encode_compact(self.media)}'
+        return (
+            f'{{"id":{self.id},"type":"message","date":"{self.date}",'
+            f'"from":{_encode(self.from_name)},"from_id":{_encode(self.from_id)},'
+            f'"text":{_encode(self.text)},"reply_to_message_id":{reply_to},'
+            f'"views":{self.views},"forwards":{self.forwards},'
+            f'"reply_count":{self.reply_count},"reactions":{reactions},'
+            f'"media_type":{media}}}\n'
+        ).encode("utf-8")
+
+
 # ── Incremental + checkpoint support ───────────────────
 
 def _checkpoint_path(out_path: Path) -> Path:
-    """Return the path for the in-progress checkpoint file."""
-    return out_path.with_suffix(".checkpoint.json")
+    """Return the path for the in-progress checkpoint journal."""
+    return out_path.with_suffix(".checkpoint.ndjson")
 
 
-def _save_checkpoint(path: Path, messages: list[dict], meta: dict) -> None:
-    """Save an in-progress checkpoint to disk."""
-    data = {**meta, "messages": messages}
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+class CheckpointJournal:
+    """Append-only NDJSON checkpoint journal for single-document exports.
 
+    The first line holds the run metadata; every later line is one collected
+    message. ``flush`` fsyncs only what was appended since the previous
+    flush, so each checkpoint costs O(interval) rather than O(total).
+    """
 
-def _load_checkpoint(out_path: Path) -> tuple[list[dict] | None, int | None, dict | None]:
-    """Load checkpoint if it exists. Returns (messages, max_id, meta) or (None, None, None)."""
+    def __init__(self, path: Path, meta: dict):
+        self.path = path
+        self.meta = meta
+        self.written = 0  # Records appended by this process
+        self.bytes = 0
+        self._fh = None
+
+    def write(self, msg_obj: dict | MessageRecord) -> None:
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fresh = not self.path.exists() or self.path.stat().st_size == 0
+            self._fh = self.path.open("ab")
+            if fresh:
+                self._fh.write(_json_line({**self.meta, "checkpoint": True}))
+            elif _last_byte(self.path) != b"\n":
+                # Isolate a torn line from an interrupted run; replay skips it
+                self._fh.write(b"\n")
+        line = _json_line(msg_obj)
+        self._fh.write(line)
+        self.written += 1
+        self.bytes += len(line)
+
+    def flush(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self.flush()
+            self._fh.close()
+            self._fh = None
+
+
+def _last_byte(path: Path) -> bytes:
+    with path.open("rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1)
+
+
+def _json_line(obj: dict | MessageRecord) -> bytes:
+    if isinstance(obj, MessageRecord):
+        return obj.json_line()
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _load_checkpoint(out_path: Path) -> tuple[int, int | None, int | None, dict | None, bool]:
+    """Scan the checkpoint journal if it exists, without keeping its messages.
+
+    Returns (count, max_id, min_id, meta, ordered), where ``ordered`` says
+    the journaled ids are strictly descending (the newest-first walk always
+    produces this). A torn final line from an interrupted write is ignored.
+    """
     cp = _checkpoint_path(out_path)
+    count, max_id, min_id, meta, ordered = 0, None, None, None, True
     if not cp.exists():
-        return None, None, None
+        return count, max_id, min_id, meta, ordered
     try:
-        data = json.loads(cp.read_text(encoding="utf-8"))
-        msgs = data.get("messages", [])
-        max_id = max((m["id"] for m in msgs if "id" in m), default=None)
-        meta = {k: v for k, v in data.items() if k != "messages"}
-        return msgs, max_id, meta
-    except Exception:
-        return None, None, None
+        with cp.open("rb") as f:
+            for raw in f:
+                try:
+                    obj = json.loads(raw)
+                except ValueError:
+                    continue
+                if meta is None and obj.get("checkpoint"):
+                    meta = obj
+                elif "id" in obj:
+                    mid = obj["id"]
+                    if min_id is not None and mid >= min_id:
+                        ordered = False
+                    count += 1
+                    max_id = mid if max_id is None else max(max_id, mid)
+                    min_id = mid if min_id is None else min(min_id, mid)
+    except OSError:
+        return 0, None, None, None, True
+    return count, max_id, min_id, meta, ordered
 
 
 def _load_existing(out_path: Path) -> tuple[dict | None, int | None]:
@@ -259,6 +777,605 @@ def _load_existing(out_path: Path) -> tuple[dict | None, int | None]:
         return None, None
 
 
+# ── JSON export (streaming merge) ──────────────────────
+#
+# The JSON export keeps its pretty-printed single-document layout; messages
+# are written in descending id order, which the index sidecar records as
+# "messages_order": "id_desc". That lets the next run stream the previous
+# export message by message and merge it with the (also descending)
+# checkpoint journal in one pass, so memory stays flat however long the
+# history is.
+
+_MESSAGES_ORDER = "id_desc"
+_MESSAGES_OPEN = '  "messages": [\n'
+_MESSAGES_CLOSE = "  ]"
+_MESSAGE_START = "    {\n"
+_MESSAGE_ENDS = ("    }\n", "    },\n", "    }")
+_MESSAGE_ID = b'\n      "id": '
+
+
+def _line_id(line: bytes) -> int:
+    """Message id of a compact JSON line (MessageRecord lines lead with it)."""
+    if line.startswith(b'{"id":'):
+        end = line.find(b",", 6)
+        if end > 6:
+            return int(line[6:end])
+    return json.loads(line)["id"]
+
+
+def _block_id(block: bytes) -> int:
+    """Message id of a pretty-printed export message (the id is its first key)."""
+    if block[5:5 + len(_MESSAGE_ID)] == _MESSAGE_ID:
+        start = 5 + len(_MESSAGE_ID)
+        end = block.find(b",", start)
+        if end > start:
+            return int(block[start:end])
+    return json.loads(block)["id"]
+
+
+def _pretty_message(line: bytes) -> bytes:
+    """Format a compact message line the way json.dumps(indent=2) nests it in the export."""
+    text = json.dumps(json.loads(line), indent=2, ensure_ascii=False)
+    return ("    " + text.replace("\n", "\n    ")).encode("utf-8")
+
+
+def _export_is_ordered(out_path: Path) -> bool:
+    index = _read_index(out_path)
+    return (
+        index is not None
+        and index.get("messages_order") == _MESSAGES_ORDER
+        and _index_is_current(out_path, index, exact=True)
+    )
+
+
+def _iter_export_messages(out_path: Path):
+    """Yield (id, block) for every message of an existing JSON export, id-descending.
+
+    ``block`` is the message's pretty-printed text as stored. Exports this
+    collector wrote (per the index) are streamed; older or hand-edited ones
+    are loaded once and sorted, after which the rewrite makes every later
+    run stream.
+    """
+    if _export_is_ordered(out_path):
+        with out_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if line == _MESSAGES_OPEN:
+                    break
+            else:
+                return
+            block: list[str] = []
+            for line in f:
+                if not block:
+                    if line != _MESSAGE_START:
+                        return  # "  ]": end of the messages array
+                    block.append(line)
+                elif line in _MESSAGE_ENDS:
+                    block.append("    }")
+                    raw = "".join(block).encode("utf-8")
+                    yield _block_id(raw), raw
+                    block = []
+                else:
+                    block.append(line)
+        return
+
+    print(f"   🔎 Reading {out_path.name} in full to sort it by id (one-time full load)")
+    data, _ = _load_existing(out_path)
+    messages = sorted(
+        (m for m in (data or {}).get("messages", []) if "id" in m),
+        key=lambda m: m["id"],
+        reverse=True,
+    )
+    for m in messages:
+        yield m["id"], _pretty_message(_json_line(m))
+
+
+def _iter_journal_messages(path: Path, ordered: bool):
+    """Yield (id, line) for every complete message in the checkpoint journal, id-descending."""
+    if not path.exists():
+        return
+    pending: dict[int, bytes] = {}
+    with path.open("rb") as f:
+        for raw in f:
+            try:
+                obj = json.loads(raw)
+            except ValueError:
+                continue  # torn line from an interrupted write
+            if "id" not in obj or obj.get("checkpoint"):
+                continue
+            line = raw.rstrip(b"\n")
+            if ordered:
+                yield obj["id"], line
+            else:
+                pending[obj["id"]] = line  # later lines win
+    for mid in sorted(pending, reverse=True):
+        yield mid, pending[mid]
+
+
+def _write_json_export(out_path: Path, header: dict, *sources, skip: set[int] = frozenset()) -> dict:
+    """Merge id-descending (id, message) ``sources`` into the JSON export.
+
+    Sources yield compact JSON lines (journal, refreshed messages) or
+    pretty-printed blocks (the previous export, copied through untouched).
+    Earlier sources win on duplicate ids; ids in ``skip`` are dropped.
+    Messages are merged into a temp file first, since ``messages_count``
+    precedes them in the document; the export is then assembled in a second
+    temp file and swapped in with os.replace, so a crash never leaves a
+    partial export. Returns {"max_id", "min_id", "count"}.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    body = out_path.with_name(out_path.name + ".messages.tmp")
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    stats = {"max_id": None, "min_id": None, "count": 0}
+    last_id = None
+    with body.open("wb") as f:
+        # heapq.merge is stable, so on equal ids the earlier source comes first
+        for mid, msg in heapq.merge(*sources, key=lambda item: -item[0]):
+            if mid == last_id or mid in skip:
+                continue
+            if last_id is not None:
+                f.write(b",\n")
+            f.write(msg if msg.startswith(b" ") else _pretty_message(msg))
+            last_id = mid
+            stats["count"] += 1
+            if stats["max_id"] is None:
+                stats["max_id"] = mid
+        stats["min_id"] = last_id
+
+    # Key order of the original export: messages_count before limits,
+    # participants and messages
+    doc = {}
+    for key, value in header.items():
+        if key == "limits":
+            doc["messages_count"] = stats["count"]
+        doc[key] = value
+    doc.setdefault("messages_count", stats["count"])
+    doc["messages"] = []
+    head = json.dumps(doc, indent=2, ensure_ascii=False)
+    try:
+        with tmp.open("wb") as f:
+            if stats["count"]:
+                f.write(head[:-len("[]\n}")].encode("utf-8") + b"[\n")
+                with body.open("rb") as src:
+                    shutil.copyfileobj(src, f, 1 << 20)
+                f.write(f"\n{_MESSAGES_CLOSE}\n}}".encode("utf-8"))
+            else:
+                f.write(head.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        body.unlink()
+    os.replace(tmp, out_path)
+    return stats
+
+
+# ── Export index (high-water mark) ─────────────────────
+
+_INDEX_TAIL_BYTES = 64 * 1024  # Bytes hashed at the end of the export to detect rewrites
+
+
+def _index_path(out_path: Path) -> Path:
+    """Return the path for the export index (id range, count, size, tail hash)."""
+    return out_path.with_suffix(".index.json")
+
+
+def _empty_index() -> dict:
+    return {
+        "max_id": None,
+        "min_id": None,
+        "count": 0,
+        "bytes": 0,
+        "tail_sha256": None,
+        "collected_at": None,
+    }
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    """Write a small JSON file via rename so readers never see a torn file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _tail_sha256(path: Path, end: int) -> str:
+    """Hash the last ``_INDEX_TAIL_BYTES`` before byte offset ``end``."""
+    start = max(0, end - _INDEX_TAIL_BYTES)
+    with path.open("rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def _read_index(out_path: Path) -> dict | None:
+    """Read the index sidecar, or None if it is missing or unreadable."""
+    ip = _index_path(out_path)
+    if not ip.exists():
+        return None
+    try:
+        return {**_empty_index(), **json.loads(ip.read_text(encoding="utf-8"))}
+    except Exception:
+        return None
+
+
+def _index_is_current(out_path: Path, index: dict, exact: bool) -> bool:
+    """Check the index still describes the export on disk.
+
+    ``exact`` requires the file size to match (single-document exports);
+    otherwise the file may have grown past the committed bytes (append-only
+    logs). Either way the committed tail must hash to the recorded value.
+    """
+    size = out_path.stat().st_size
+    if index["bytes"] > size or (exact and index["bytes"] != size):
+        return False
+    if index["bytes"] and index["tail_sha256"] != _tail_sha256(out_path, index["bytes"]):
+        return False
+    return True
+
+
+def _commit_index(out_path: Path, index: dict) -> None:
+    """Stamp the tail hash for ``index["bytes"]`` and write the index sidecar."""
+    index["tail_sha256"] = _tail_sha256(out_path, index["bytes"]) if index["bytes"] else None
+    _write_json_atomic(_index_path(out_path), index)
+
+
+def _recover_json_index(out_path: Path) -> dict:
+    """Return the index for a single-document JSON export.
+
+    The export itself is only parsed when the index is missing or stale
+    (e.g. the file was edited or rewritten by another tool).
+    """
+    if not out_path.exists():
+        return _empty_index()
+
+    index = _read_index(out_path)
+    if index is not None and _index_is_current(out_path, index, exact=True):
+        return index
+
+    print(f"   🔎 Rebuilding index for {out_path.name} (full scan)")
+    data, max_id = _load_existing(out_path)
+    index = _empty_index()
+    if data is not None:
+        ids = [m["id"] for m in data.get("messages", []) if "id" in m]
+        index["max_id"] = max_id
+        index["min_id"] = min(ids) if ids else None
+        index["count"] = len(ids)
+        index["collected_at"] = data.get("collected_at")
+    index["bytes"] = out_path.stat().st_size
+    _commit_index(out_path, index)
+    return index
+
+
+# ── NDJSON export (append-only) ────────────────────────
+
+def _header_path(out_path: Path) -> Path:
+    """Return the path for the NDJSON export header (group metadata + participants)."""
+    return out_path.with_suffix(".header.json")
+
+
+def _scan_ndjson(path: Path, index: dict, start: int) -> dict:
+    """Fold complete lines from byte offset ``start`` into ``index``.
+
+    A torn final line (no trailing newline, e.g. after a crash) is truncated
+    so the next append starts on a clean line boundary.
+    """
+    pos = start
+    with path.open("rb") as f:
+        f.seek(start)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            pos += len(raw)
+            try:
+                mid = json.loads(raw)["id"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            index["count"] += 1
+            index["max_id"] = mid if index["max_id"] is None else max(index["max_id"], mid)
+            index["min_id"] = mid if index["min_id"] is None else min(index["min_id"], mid)
+    if path.stat().st_size > pos:
+        with path.open("r+b") as f:
+            f.truncate(pos)
+        print(f"   🩹 Truncated torn trailing line in {path.name}")
+    index["bytes"] = pos
+    return index
+
+
+def _recover_ndjson_index(out_path: Path) -> dict:
+    """Load the NDJSON index, reconciling it with the message log on disk.
+
+    Only bytes written after the last index flush are re-read; a missing or
+    stale index falls back to a single streaming scan of the log.
+    """
+    if not out_path.exists():
+        return _empty_index()
+
+    index = _read_index(out_path)
+    if index is None or not _index_is_current(out_path, index, exact=False):
+        print(f"   🔎 Rebuilding index for {out_path.name} (full scan)")
+        index = _scan_ndjson(out_path, _empty_index(), 0)
+    elif index["bytes"] < out_path.stat().st_size:
+        index = _scan_ndjson(out_path, index, index["bytes"])
+    else:
+        return index
+
+    _commit_index(out_path, index)
+    return index
+
+
+class NdjsonExportWriter:
+    """Append-only NDJSON message log with a sidecar index.
+
+    Each message is written as one line as soon as it is collected; ``flush``
+    fsyncs the log and then records the committed byte length in the index,
+    so an interrupted run loses at most the lines since the last flush.
+    """
+
+    def __init__(self, out_path: Path, index: dict):
+        self.out_path = out_path
+        self.index = dict(index)
+        self._fh = None
+
+    def __enter__(self) -> "NdjsonExportWriter":
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self.out_path.open("ab")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, record: MessageRecord) -> None:
+        line = record.json_line()
+        self._fh.write(line)
+        mid = record.id
+        idx = self.index
+        idx["count"] += 1
+        idx["bytes"] += len(line)
+        idx["max_id"] = mid if idx["max_id"] is None else max(idx["max_id"], mid)
+        idx["min_id"] = mid if idx["min_id"] is None else min(idx["min_id"], mid)
+
+    def flush(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        _commit_index(self.out_path, self.index)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self.flush()
+            self._fh.close()
+            self._fh = None
+
+
+# ── Parquet export (columnar, optional) ────────────────
+#
+# --format parquet writes a dataset directory at --out:
+#   messages/part-<seq>.parquet   one row group per checkpoint flush
+#   reactions/part-<seq>.parquet  one row per (message, reaction)
+#   participants.parquet                rewritten each run
+# Parts are written as .tmp files and renamed once complete; the index
+# sidecar lists committed message parts, so an interrupted run loses at
+# most the open part and resumes from the last committed id.
+# pyarrow is imported lazily and is not part of requirements.txt.
+
+_PARQUET_PART_ROWS = 100_000  # Messages per part file before it is committed
+
+
+def _require_pyarrow():
+    import pyarrow
+    import pyarrow.parquet
+
+    return pyarrow, pyarrow.parquet
+
+
+def _parquet_schemas(pa) -> dict:
+    return {
+        "messages": pa.schema([
+            ("id", pa.int64()),
+            ("date", pa.timestamp("s", tz="UTC")),
+            ("from", pa.string()),
+            ("from_id", pa.string()),
+            ("text", pa.string()),
+            ("reply_to_message_id", pa.int64()),
+            ("views", pa.int64()),
+            ("forwards", pa.int64()),
+            ("reply_count", pa.int64()),
+            ("reaction_count", pa.int64()),
+            ("media_type", pa.string()),
+            ("media_file_id", pa.string()),
+            ("media_size", pa.int64()),
+            ("media_mime_type", pa.string()),
+            ("media_duration", pa.float64()),
+        ]),
+        "reactions": pa.schema([
+            ("message_id", pa.int64()),
+            ("emoji", pa.string()),
+            ("count", pa.int64()),
+        ]),
+        "participants": pa.schema([
+            ("user_id", pa.int64()),
+            ("username", pa.string()),
+            ("first_name", pa.string()),
+            ("last_name", pa.string()),
+            ("display_name", pa.string()),
+            ("bot", pa.bool_()),
+            ("deleted", pa.bool_()),
+            ("scam", pa.bool_()),
+            ("fake", pa.bool_()),
+            ("verified", pa.bool_()),
+            ("premium", pa.bool_()),
+            ("lang_code", pa.string()),
+        ]),
+    }
+
+
+def _recover_parquet_index(out_path: Path) -> dict:
+    """Load the Parquet dataset index, rebuilding it from part metadata if stale.
+
+    Uncommitted (.tmp) parts from an interrupted run are discarded, as are
+    reaction parts whose message part never got committed.
+    """
+    index = {**_empty_index(), "parts": []}
+    if not out_path.exists():
+        return index
+    for tmp in out_path.glob("*/*.tmp"):
+        tmp.unlink()
+    parts = sorted(p.name for p in (out_path / "messages").glob("part-*.parquet"))
+    for orphan in (out_path / "reactions").glob("part-*.parquet"):
+        if orphan.name not in parts:
+            orphan.unlink()
+
+    stored = _read_index(out_path)
+    if stored is not None and stored.get("parts") == parts:
+        return stored
+
+    print(f"   🔎 Rebuilding index for {out_path.name} (part metadata scan)")
+    _, pq = _require_pyarrow()
+    import pyarrow.compute as pc
+
+    for name in parts:
+        path = out_path / "messages" / name
+        ids = pq.read_table(path, columns=["id"]).column("id")
+        if len(ids):
+            bounds = pc.min_max(ids)
+            lo, hi = bounds["min"].as_py(), bounds["max"].as_py()
+            index["max_id"] = hi if index["max_id"] is None else max(index["max_id"], hi)
+            index["min_id"] = lo if index["min_id"] is None else min(index["min_id"], lo)
+        index["count"] += len(ids)
+        index["bytes"] += path.stat().st_size
+    index["parts"] = parts
+    _write_json_atomic(_index_path(out_path), index)
+    return index
+
+
+class ParquetExportWriter:
+    """Columnar message sink with the same interface as NdjsonExportWriter.
+
+    Records are buffered column-wise; ``flush`` writes them as one row group
+    of the open part file, and every ``_PARQUET_PART_ROWS`` messages (and on
+    close) the part is committed: renamed into place and added to the index.
+    """
+
+    def __init__(self, out_path: Path, index: dict):
+        self.out_path = out_path
+        self.index = {**index, "parts": list(index.get("parts", []))}
+        self._pa, self._pq = _require_pyarrow()
+        self._schemas = _parquet_schemas(self._pa)
+        # Recovery leaves exactly the committed parts on disk, so numbering
+        # continues after them
+        self._seq = len(self.index["parts"])
+        self._writers: dict = {}
+        self._part_rows = 0
+        self._part_ids: list[int] = []
+        self._reset_buffers()
+
+    def __enter__(self) -> "ParquetExportWriter":
+        for table in ("messages", "reactions"):
+            (self.out_path / table).mkdir(parents=True, exist_ok=True)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _reset_buffers(self) -> None:
+        self._messages = {name: [] for name in self._schemas["messages"].names}
+        self._reactions = {name: [] for name in self._schemas["reactions"].names}
+
+    def write(self, record: MessageRecord) -> None:
+        m = self._messages
+        m["id"].append(record.id)
+        m["date"].append(record.date)
+        m["from"].append(record.from_name)
+        m["from_id"].append(record.from_id)
+        m["text"].append(record.text)
+        m["reply_to_message_id"].append(record.reply_to)
+        m["views"].append(record.views)
+        m["forwards"].append(record.forwards)
+        m["reply_count"].append(record.reply_count)
+        total = 0
+        for count, emoji in record.reactions or ():
+            self._reactions["message_id"].append(record.id)
+            self._reactions["emoji"].append(emoji)
+            self._reactions["count"].append(count)
+            total += count
+        m["reaction_count"].append(total)
+        meta = record.media or {}
+        m["media_type"].append(record.media_type)
+        m["media_file_id"].append(meta.get("file_id"))
+        m["media_size"].append(meta.get("size"))
+        m["media_mime_type"].append(meta.get("mime_type"))
+        m["media_duration"].append(meta.get("duration"))
+
+    def _table(self, name: str, columns: dict):
+        pa = self._pa
+        schema = self._schemas[name]
+        arrays = []
+        for field in schema:
+            values = columns[field.name]
+            if pa.types.is_timestamp(field.type):
+                # "YYYY-MM-DDTHH:MM:SS" strings are UTC; cast parses them in C
+                arrays.append(pa.array(values, pa.string()).cast(pa.timestamp("s")).cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _part_paths(self, table: str) -> tuple[Path, Path]:
+        final = self.out_path / table / f"part-{self._seq:06d}.parquet"
+        return final, final.with_name(final.name + ".tmp")
+
+    def flush(self) -> None:
+        if not self._messages["id"]:
+            return
+        for name, columns in (("messages", self._messages), ("reactions", self._reactions)):
+            writer = self._writers.get(name)
+            if writer is None:
+                _, tmp = self._part_paths(name)
+                writer = self._writers[name] = self._pq.ParquetWriter(
+                    str(tmp), self._schemas[name], compression="zstd",
+                )
+            writer.write_table(self._table(name, columns))
+        self._part_rows += len(self._messages["id"])
+        self._part_ids.extend((min(self._messages["id"]), max(self._messages["id"])))
+        self._reset_buffers()
+        if self._part_rows >= _PARQUET_PART_ROWS:
+            self._commit_part()
+
+    def _commit_part(self) -> None:
+        if not self._writers:
+            return
+        # Reactions first: a messages part is only visible once complete
+        for name in ("reactions", "messages"):
+            self._writers.pop(name).close()
+            final, tmp = self._part_paths(name)
+            with tmp.open("rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, final)
+        final, _ = self._part_paths("messages")
+        idx = self.index
+        lo, hi = min(self._part_ids), max(self._part_ids)
+        idx["count"] += self._part_rows
+        idx["bytes"] += final.stat().st_size
+        idx["max_id"] = hi if idx["max_id"] is None else max(idx["max_id"], hi)
+        idx["min_id"] = lo if idx["min_id"] is None else min(idx["min_id"], lo)
+        idx["parts"].append(final.name)
+        _write_json_atomic(_index_path(self.out_path), idx)
+        self._seq += 1
+        self._part_rows = 0
+        self._part_ids = []
+
+    def write_participants(self, participants: list[dict]) -> None:
+        """Rewrite participants.parquet from the participant dicts."""
+        schema = self._schemas["participants"]
+        table = self._table("participants", {
+            name: [p.get(name) for p in participants] for name in schema.names
+        })
+        final = self.out_path / "participants.parquet"
+        tmp = final.with_name(final.name + ".tmp")
+        self._pq.write_table(table, str(tmp), compression="zstd")
+        os.replace(tmp, final)
+
+    def close(self) -> None:
+        self.flush()
+        self._commit_part()
+
+
 def _format_eta(seconds: float) -> str:
     """Format seconds into a human-readable ETA string."""
     if seconds < 60:
@@ -269,39 +1386,107 @@ def _format_eta(seconds: float) -> str:
         return f"{seconds / 3600:.1f}h"
 
 
-def _serialize_reactions(msg) -> dict | None:
-    """Helper to serialize message reactions (Telethon MessageReactions object)."""
-    if not hasattr(msg, "reactions") or not msg.reactions:
-        return None
+_CHECKPOINT_INTERVAL = 1000  # Save to disk every N messages
+_FETCH_OBSERVE_MIN = 0.001   # Iterator waits at least this long are network fetches
+_RANGE_SIZE = 5000  # Max message ids per range in --workers mode
+
+
+async def _since_floor(client: TelegramClient, entity, since: datetime, limiter: RateLimiter) -> int:
+    """Return the id of the newest message sent before ``since`` (0 if none)."""
+    older = await limiter.call("messages", client.get_messages, entity, limit=1, offset_date=since)
+    return older[0].id if older else 0
+
+
+async def _limit_floor(
+    client: TelegramClient, entity, limit: int, min_id: int, limiter: RateLimiter,
+) -> int:
+    """Return the id just below the ``limit`` newest messages above ``min_id``.
+
+    An oldest-first walk starting there yields the same newest-N messages a
+    newest-first walk with ``limit`` would; ``min_id`` if there are fewer.
+    """
+    nth = await limiter.call(
+        "messages", client.get_messages, entity, limit=1, add_offset=limit - 1, min_id=min_id,
+    )
+    return nth[0].id - 1 if nth else min_id
+
 
-    # msg.reactions -> MessageReactions(results=[ReactionCount(...), ...], ...)
-    out_results = []
-    
-    # Use 'results' if present
-    results = getattr(msg.reactions, "results", [])
-    for r in results:
-        count = getattr(r, "count", 0)
-        
-        # Extract the reaction symbol
-        emoji = None
-        # r.reaction is usually ReactionEmoji(emoticon='👍') or ReactionCustomEmoji(document_id=123)
-        rxn = getattr(r, "reaction", None)
-        if rxn:
-            if hasattr(rxn, "emoticon"):
-                emoji = rxn.emoticon
-            elif hasattr(rxn, "document_id"):
-                emoji = f"custom_emoji_id:{rxn.document_id}"
+async def _fetch_range(
+    client: TelegramClient,
+    entity,
+    lo: int,
+    hi: int,
+    reverse: bool,
+    limiter: RateLimiter,
+) -> list:
+    """Fetch all messages with lo < id <= hi, resuming mid-range after FloodWait."""
+
+    def page(last):
+        # Continue past the last message this range already fetched
+        min_id, max_id = lo, hi
+        if last is not None:
+            if reverse:
+                min_id = last.id
             else:
-                emoji = str(rxn)
-        
-        out_results.append({"count": count, "emoji": emoji})
+                max_id = last.id - 1
+        return client.iter_messages(entity, min_id=min_id, max_id=max_id + 1, reverse=reverse)
 
-    return {
-        "results": out_results
-    }
+    return [msg async for msg in limiter.iterate("messages", page)]
 
 
-_CHECKPOINT_INTERVAL = 1000  # Save to disk every N messages
+async def _iter_messages_parallel(
+    client: TelegramClient,
+    entity,
+    workers: int,
+    min_id: int,
+    offset_id: int,
+    reverse: bool,
+    limiter: RateLimiter,
+):
+    """Yield messages above ``min_id`` (and below ``offset_id``) in walk order.
+
+    The id space is split into ranges of at most ``_RANGE_SIZE`` ids, fetched
+    by up to ``workers`` concurrent requests. Ranges are emitted strictly in
+    order, and at most ``2 * workers`` are in flight or buffered at a time.
+    """
+    if offset_id:
+        top = offset_id - 1
+    else:
+        latest = await limiter.call("messages", client.get_messages, entity, limit=1)
+        top = latest[0].id if latest else 0
+    if top <= min_id:
+        return
+
+    span = top - min_id
+    step = max(1, min(_RANGE_SIZE, math.ceil(span / workers)))
+    bounds = [(lo, min(lo + step, top)) for lo in range(min_id, top, step)]
+    if not reverse:
+        bounds.reverse()
+    print(f"   ⚡ {len(bounds):,} id ranges over ({min_id}, {top}] with {workers} workers")
+
+    sem = asyncio.Semaphore(workers)
+
+    async def fetch(lo: int, hi: int) -> list:
+        async with sem:
+            return await _fetch_range(client, entity, lo, hi, reverse, limiter)
+
+    todo = iter(bounds)
+    pending: deque[asyncio.Task] = deque()
+    try:
+        for lo, hi in todo:
+            pending.append(asyncio.create_task(fetch(lo, hi)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            msgs = await pending.popleft()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(asyncio.create_task(fetch(*nxt)))
+            for msg in msgs:
+                yield msg
+    finally:
+        for task in pending:
+            task.cancel()
 
 
 async def collect_messages(
@@ -311,51 +1496,112 @@ async def collect_messages(
     limit: int | None,
     since: datetime | None,
     min_id: int = 0,
-    out_path: Path | None = None,
-    checkpoint_meta: dict | None = None,
-) -> list[dict]:
+    offset_id: int = 0,
+    journal: CheckpointJournal | None = None,
+    sink: NdjsonExportWriter | None = None,
+    workers: int = 1,
+    limiter: RateLimiter | None = None,
+    media: MediaDownloader | None = None,
+    replies: ReplyGraph | None = None,
+    metrics: Metrics | None = None,
+) -> list[MessageRecord]:
     """Collect messages in Telegram Desktop export format.
 
     If min_id > 0, only fetches messages with id > min_id (incremental mode).
-    Saves a checkpoint every 1000 messages so interruptions lose minimal work.
+    If offset_id > 0, the newest-first walk starts below that id (used to
+    resume an interrupted run from the oldest journaled message).
+    Every message is appended to the ``journal``, which is fsynced every
+    1000 messages so interruptions lose minimal work; messages are then
+    read back from the journal rather than returned. Without a journal or
+    sink they are accumulated and returned.
+
+    With a ``sink``, messages are fetched oldest-first and streamed straight
+    to it instead of being accumulated; the sink is flushed in place of the
+    checkpoint file and the returned list is empty.
+
+    With ``workers`` > 1 the history is fetched as concurrent id ranges;
+    output order is unchanged. All requests go through ``limiter``, and a
+    FloodWait resumes the walk after the last fetched message.
+
+    Media files are handed to the ``media`` downloader as they are seen;
+    it downloads them on its own tasks without holding up the walk, and its
+    pending journal is fsynced with each checkpoint.
+    Every emitted message is also added to the ``replies`` graph.
+
+    Fetch waits, serialization, checkpoint flushes and sender-resolution
+    stalls are recorded in ``metrics``.
     """
     messages = []
     count = 0
+    seen = 0
     skipped_service = 0
     t0 = time.monotonic()
     last_checkpoint_count = 0
+    # Messages whose sender is queued in the SenderCache wait here, in fetch
+    # order, while the batched lookup runs alongside the iteration
+    held: deque[tuple[int | None, MessageRecord]] = deque()
+    resolving: asyncio.Task | None = None
+    metrics = metrics or Metrics()
+    perf = time.perf_counter
+    # Hot-loop timings are summed locally and reported once at the end
+    fetch_wait = build_time = write_time = 0.0
+
+    def bytes_written() -> int | None:
+        # Journal and NDJSON log sizes; Parquet / Postgres do not track bytes
+        if journal:
+            return journal.bytes
+        return sink.index["bytes"] if isinstance(sink, NdjsonExportWriter) else None
+
+    start_bytes = bytes_written()
 
     limit_str = str(limit) if limit else "all"
     mode = "incremental (new only)" if min_id > 0 else "full"
-    print(f"\n📨 Collecting messages (limit={limit_str}, mode={mode})...")
-    if out_path:
-        print(f"   💾 Checkpoints every {_CHECKPOINT_INTERVAL:,} messages → {_checkpoint_path(out_path)}")
-
-    async for msg in client.iter_messages(entity, limit=limit, offset_date=since, reverse=False, min_id=min_id):
-        # Skip service messages (joins, leaves, pin, etc.)
-        if isinstance(msg, MessageService) or msg.action is not None:
-            skipped_service += 1
-            continue
-
-        sender_id = msg.sender_id
-        from_name, from_id = await sender_cache.get(sender_id)
-
-        text = msg.message or ""
-
-        msg_obj = {
-            "id": msg.id,
-            "type": "message",
-            "date": msg.date.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
-            "from": from_name,
-            "from_id": from_id,
-            "text": text,
-            "reply_to_message_id": msg.reply_to.reply_to_msg_id if msg.reply_to else None,
-            "views": getattr(msg, "views", 0) or 0,
-            "forwards": getattr(msg, "forwards", 0) or 0,
-            "reply_count": getattr(msg.replies, "replies", 0) if hasattr(msg, "replies") and msg.replies else 0,
-            "reactions": _serialize_reactions(msg),
-        }
-        messages.append(msg_obj)
+    print(f"\n📨 Collecting messages (limit={limit_str}, mode={mode}, workers={workers})...")
+    if sink:
+        print(f"   💾 Streaming to {sink.out_path} (flush every {_CHECKPOINT_INTERVAL:,} messages)")
+    elif journal:
+        print(f"   💾 Checkpoints every {_CHECKPOINT_INTERVAL:,} messages → {journal.path}")
+
+    # An append-only sink needs ascending ids so an interrupted or limited run
+    # can always resume from the high-water mark without leaving gaps.
+    reverse = sink is not None
+    limiter = limiter or RateLimiter()
+    if since:
+        # --since becomes an id floor, so "after this date" holds in both
+        # walk directions and for range-partitioned fetches alike
+        min_id = max(min_id, await _since_floor(client, entity, since, limiter))
+    if reverse and limit:
+        # --limit keeps meaning "the newest N" when the walk runs oldest-first
+        min_id = await _limit_floor(client, entity, limit, min_id, limiter)
+    if workers > 1:
+        source = _iter_messages_parallel(
+            client, entity, workers, min_id, offset_id, reverse, limiter,
+        )
+    else:
+        def page(last):
+            if last is None:
+                return client.iter_messages(
+                    entity, limit=limit, reverse=reverse, min_id=min_id, offset_id=offset_id,
+                )
+            remaining = limit - seen if limit else None
+            if reverse:
+                return client.iter_messages(entity, limit=remaining, reverse=True, min_id=last.id)
+            return client.iter_messages(entity, limit=remaining, min_id=min_id, offset_id=last.id)
+
+        source = limiter.iterate("messages", page)
+
+    def emit(record: MessageRecord) -> None:
+        nonlocal count, last_checkpoint_count, write_time
+        t = perf()
+        if sink:
+            sink.write(record)
+        elif journal:
+            journal.write(record)
+        else:
+            messages.append(record)
+        write_time += perf() - t
+        if replies is not None:
+            replies.add(record.id, record.reply_to, record.from_id)
         count += 1
 
         # ── Progress every 100 messages ──────────
@@ -371,29 +1617,325 @@ async def collect_messages(
                   f"ETA {eta}, {sender_cache._misses} misses, {skipped_service} svc skipped)")
 
         # ── Checkpoint every 1000 messages ───────
-        if out_path and count - last_checkpoint_count >= _CHECKPOINT_INTERVAL:
-            _save_checkpoint(_checkpoint_path(out_path), messages, checkpoint_meta or {})
+        # Media jobs go first, so a checkpointed message never loses its
+        # queued download on resume
+        if sink and count - last_checkpoint_count >= _CHECKPOINT_INTERVAL:
+            t = perf()
+            if media is not None:
+                media.flush()
+            sink.flush()
+            metrics.add_time("checkpoint", perf() - t)
+            last_checkpoint_count = count
+        elif journal and count - last_checkpoint_count >= _CHECKPOINT_INTERVAL:
+            t = perf()
+            if media is not None:
+                media.flush()
+            journal.flush()
+            metrics.add_time("checkpoint", perf() - t)
             last_checkpoint_count = count
             print(f"   💾 Checkpoint saved: {count:,} messages")
 
+    def release() -> None:
+        # Emit held messages oldest-first, up to the first still-pending sender
+        while held and not sender_cache.is_pending(held[0][0]):
+            sender_id, record = held.popleft()
+            record.from_name = sender_cache.name(sender_id) or record.from_name
+            emit(record)
+
+    try:
+        mark = perf()
+        async for msg in source:
+            # Time spent waiting for the iterator; waits that hit the network
+            # (one per page, or a FloodWait) go into the latency histogram
+            t = perf()
+            wait = t - mark
+            fetch_wait += wait
+            if wait >= _FETCH_OBSERVE_MIN:
+                metrics.observe("fetch_seconds", wait)
+            seen += 1
+            # Skip service messages (joins, leaves, pin, etc.)
+            if isinstance(msg, MessageService) or msg.action is not None:
+                skipped_service += 1
+                mark = perf()
+                continue
+
+            sender_id = msg.sender_id
+            from_name, from_id = sender_cache.lookup(msg)
+
+            record = MessageRecord(msg, from_name, from_id)
+            build_time += perf() - t
+            if media is not None and record.media is not None:
+                media.offer(msg, record.media)
+            if held or sender_cache.is_pending(sender_id):
+                held.append((sender_id, record))
+            else:
+                emit(record)
+
+            # ── Batched sender resolution ────────────
+            # Started at the first miss; it only runs while the next page is
+            # awaited, so every miss of the current page lands in one batch.
+            if resolving and resolving.done():
+                await resolving
+                resolving = None
+                release()
+            if resolving is None and sender_cache.pending:
+                resolving = asyncio.create_task(sender_cache.resolve_pending(entity))
+            if len(held) >= _SENDER_HOLD_MAX:
+                t = perf()
+                await resolving
+                metrics.add_time("sender_stall", perf() - t)
+                resolving = None
+                release()
+            mark = perf()
+
+        t = perf()
+        if resolving:
+            await resolving
+            resolving = None
+        await sender_cache.resolve_pending(entity)
+        metrics.add_time("sender_stall", perf() - t)
+        release()
+    finally:
+        if resolving:
+            resolving.cancel()
+        sender_cache.flush()
+        # Commit whatever was collected, even when a FloodWait or error
+        # escapes; held messages were never written and are fetched again
+        # on resume. The journal is removed by the caller once the export
+        # itself is written
+        t = perf()
+        if media is not None:
+            media.flush()
+        if sink:
+            sink.flush()
+        elif journal:
+            journal.close()
+        metrics.add_time("checkpoint", perf() - t)
+        metrics.add_stage("messages", time.monotonic() - t0)
+        _record_loop_metrics(
+            metrics, sender_cache, seen=seen, count=count, skipped_service=skipped_service,
+            fetch_wait=fetch_wait, build_time=build_time, write_time=write_time,
+            checkpoint_bytes=None if start_bytes is None else bytes_written() - start_bytes,
+        )
+
     elapsed = time.monotonic() - t0
     rate = count / elapsed if elapsed > 0 else 0
     print(f"   ✅ {count:,} messages collected in {elapsed:.1f}s ({rate:.0f} msg/s)")
     if skipped_service:
         print(f"   ℹ️  {skipped_service} service messages skipped")
+    if sender_cache._store_hits:
+        print(f"   📦 {sender_cache._store_hits} senders resolved from the persistent entity cache")
     if sender_cache._misses:
-        print(f"   ℹ️  {sender_cache._misses} sender cache misses (API lookups)")
-
-    # Clean up checkpoint file on successful completion
-    if out_path:
-        cp = _checkpoint_path(out_path)
-        if cp.exists():
-            cp.unlink()
-            print(f"   🧹 Checkpoint file removed (collection complete)")
+        print(f"   ℹ️  {sender_cache._misses} sender cache misses (batched API lookups)")
 
     return messages
 
 
+def _record_loop_metrics(
+    metrics: Metrics,
+    sender_cache: SenderCache,
+    *,
+    seen: int,
+    count: int,
+    skipped_service: int,
+    fetch_wait: float,
+    build_time: float,
+    write_time: float,
+    checkpoint_bytes: int | None,
+) -> None:
+    """Fold the collection loop's local tallies into ``metrics``."""
+    metrics.inc("messages_fetched", seen)
+    metrics.inc("messages_written", count)
+    metrics.inc("service_messages_skipped", skipped_service)
+    metrics.add_time("fetch_wait", fetch_wait, seen)
+    metrics.add_time("record_build", build_time, seen - skipped_service)
+    metrics.add_time("serialize_write", write_time, count)
+    if checkpoint_bytes is not None:
+        metrics.inc("checkpoint_bytes", checkpoint_bytes)
+    sc = sender_cache
+    metrics.inc("sender_cache_hits", sc._hits)
+    metrics.inc("sender_cache_harvested", sc._harvested)
+    metrics.inc("sender_cache_store_hits", sc._store_hits)
+    metrics.inc("sender_cache_misses", sc._misses)
+    metrics.add_time("sender_batch", sc._batch_seconds, sc._batches)
+    lookups = sc._hits + sc._harvested + sc._store_hits + sc._misses
+    metrics.set("sender_cache_hit_ratio", round(1 - sc._misses / lookups, 4) if lookups else None)
+
+
+# ── Rewind window refresh (edits / deletions) ──────────
+#
+# Incremental runs only fetch ids above the high-water mark. With
+# --refresh-window / --refresh-hours the newest stored messages are
+# re-fetched by id, compared on their mutable fields, and only changed or
+# deleted messages produce a patch:
+#   {"op": "update", "id": 123, "text": ..., "views": ..., ...}
+#   {"op": "delete", "id": 124}
+# JSON exports apply patches in the merge; NDJSON and Parquet exports
+# append them to <out>.patches.ndjson; the Postgres sink applies them.
+
+_PATCH_FIELDS = ("text", "views", "forwards", "reply_count", "reactions")
+_REFRESH_BATCH = 100  # Ids per get_messages(ids=...) request
+_TAIL_BLOCK = 1 << 20  # Bytes read per step when scanning an NDJSON log backwards
+
+
+def _patches_path(out_path: Path) -> Path:
+    return out_path.with_suffix(".patches.ndjson")
+
+
+def _mutable_fields(obj: dict) -> dict:
+    """The patchable fields of an export message, reactions normalized."""
+    fields = {k: obj.get(k) for k in _PATCH_FIELDS}
+    if fields["reactions"] is not None and not fields["reactions"].get("results"):
+        fields["reactions"] = None  # an empty reactions object and none are the same
+    return fields
+
+
+def _apply_patch_log(out_path: Path, stored: dict[int, dict]) -> None:
+    """Fold earlier patches from the sidecar into ``stored`` (in place)."""
+    pp = _patches_path(out_path)
+    if not pp.exists():
+        return
+    with pp.open("rb") as f:
+        for raw in f:
+            try:
+                patch = json.loads(raw)
+            except ValueError:
+                continue
+            mid = patch.get("id")
+            if mid not in stored:
+                continue
+            if patch.get("op") == "delete":
+                del stored[mid]
+            else:
+                stored[mid].update({k: patch[k] for k in _PATCH_FIELDS if k in patch})
+
+
+def _json_window(out_path: Path, floor: int) -> dict[int, dict]:
+    """Messages with id >= floor from the head of an id-descending JSON export."""
+    stored = {}
+    for mid, line in _iter_export_messages(out_path):
+        if mid < floor:
+            break
+        stored[mid] = json.loads(line)
+    return stored
+
+
+def _ndjson_window(out_path: Path, floor: int, end: int) -> dict[int, dict]:
+    """Messages with id >= floor, read backwards from the committed end of the log."""
+    stored = {}
+    with out_path.open("rb") as f:
+        pos, rest = end, b""
+        while pos > 0:
+            step = min(_TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b"\n")
+            rest = lines.pop(0) if pos > 0 else b""  # possibly partial first line
+            for raw in reversed(lines):
+                if not raw:
+                    continue
+                obj = json.loads(raw)
+                if obj["id"] < floor:
+                    return stored
+                stored[obj["id"]] = obj
+    return stored
+
+
+def _parquet_window(out_path: Path, floor: int) -> dict[int, dict]:
+    """Messages with id >= floor from the Parquet dataset, in export dict shape."""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    msgs = ds.dataset(out_path / "messages").to_table(
+        columns=["id", "text", "views", "forwards", "reply_count"],
+        filter=ds.field("id") >= floor,
+    )
+    stored = {row["id"]: {**row, "reactions": None} for row in msgs.to_pylist()}
+    reactions = ds.dataset(out_path / "reactions").to_table(filter=ds.field("message_id") >= floor)
+    for row in reactions.to_pylist():
+        entry = stored.get(row["message_id"])
+        if entry is not None:
+            entry["reactions"] = entry["reactions"] or {"results": []}
+            entry["reactions"]["results"].append({"count": row["count"], "emoji": row["emoji"]})
+    return stored
+
+
+async def _window_floor(
+    client: TelegramClient,
+    entity,
+    max_id: int,
+    refresh_ids: int,
+    refresh_hours: float,
+    limiter: RateLimiter,
+) -> int | None:
+    """Lowest message id inside the rewind window, or None when disabled."""
+    floors = []
+    if refresh_ids:
+        floors.append(max(1, max_id - refresh_ids + 1))
+    if refresh_hours:
+        since = datetime.now(timezone.utc) - timedelta(hours=refresh_hours)
+        floors.append(await _since_floor(client, entity, since, limiter) + 1)
+    return min(floors) if floors else None
+
+
+async def refresh_window(
+    client: TelegramClient,
+    entity,
+    stored: dict[int, dict],
+    limiter: RateLimiter,
+) -> list[dict]:
+    """Re-fetch ``stored`` messages by id and return patches for what changed."""
+    patches = []
+    ids = sorted(stored)
+    for i in range(0, len(ids), _REFRESH_BATCH):
+        batch = ids[i:i + _REFRESH_BATCH]
+        fresh = await limiter.call("messages", client.get_messages, entity, ids=batch)
+        for mid, msg in zip(batch, fresh):
+            if msg is None or isinstance(msg, MessageService):
+                patches.append({"op": "delete", "id": mid})
+                continue
+            now = _mutable_fields(MessageRecord(msg, None, None).to_dict())
+            if now != _mutable_fields(stored[mid]):
+                patches.append({"op": "update", "id": mid, **now})
+    return patches
+
+
+# ── Reply graph sidecar ────────────────────────────────
+#
+# With --reply-graph, <out>.replies/ holds append-only (id, reply_to, sender)
+# columns; reply_graph.py builds the CSR thread index from them on demand.
+# Messages are added as they are emitted; stored messages the sidecar does
+# not cover yet (first run on an existing export, or a run that died after
+# committing messages) are read back once.
+
+def _replies_path(out_path: Path) -> Path:
+    return out_path.with_suffix(".replies")
+
+
+def _stored_reply_rows(out_path: Path, fmt: str, after: int, index: dict):
+    """(id, reply_to, from_id) of stored messages with id > ``after``."""
+    if fmt == "json":
+        for mid, line in _iter_export_messages(out_path):
+            if mid <= after:
+                break
+            obj = json.loads(line)
+            yield mid, obj.get("reply_to_message_id"), obj.get("from_id")
+        return
+    if fmt == "parquet":
+        _require_pyarrow()
+        import pyarrow.dataset as ds
+
+        table = ds.dataset(out_path / "messages").to_table(
+            columns=["id", "reply_to_message_id", "from_id"], filter=ds.field("id") > after,
+        )
+        stored = {row["id"]: row for row in table.to_pylist()}
+    else:
+        stored = _ndjson_window(out_path, after + 1, index["bytes"])
+    _apply_patch_log(out_path, stored)  # deletions recorded by earlier refreshes
+    for obj in stored.values():
+        yield obj["id"], obj.get("reply_to_message_id"), obj.get("from_id")
+
+
 # ── Participant export ──────────────────────────────────
 
 def _participant_obj(user: User) -> dict:
@@ -416,50 +1958,151 @@ def _participant_obj(user: User) -> dict:
     }
 
 
+_PARTICIPANTS_PAGE = 200  # Max users per GetParticipantsRequest
+# Search-prefix buckets used once plain listing is capped below the member count
+_PARTICIPANT_SEARCH_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+_PARTICIPANT_SEARCH_MAX_PREFIX = 3
+
+
+def _participants_checkpoint_path(out_path: Path) -> Path:
+    """Return the path for the in-progress participant enumeration journal."""
+    return out_path.with_suffix(".participants.checkpoint.ndjson")
+
+
+def _load_participants_checkpoint(path: Path, group_id: int) -> tuple[dict[int, dict], dict | None]:
+    """Replay a participant journal into ({user_id: participant}, last state).
+
+    A journal written for another group (its meta line names a different
+    id) is discarded rather than merged.
+    """
+    participants: dict[int, dict] = {}
+    state = None
+    if not path.exists():
+        return participants, state
+    owner = group_id
+    with path.open("rb") as f:
+        for raw in f:
+            try:
+                obj = json.loads(raw)
+            except ValueError:
+                continue
+            if obj.get("checkpoint"):
+                owner = obj.get("id")
+                if owner != group_id:
+                    break
+            elif "state" in obj:
+                state = obj["state"]
+            elif "user_id" in obj:
+                participants[obj["user_id"]] = obj
+    if owner != group_id:
+        print(f"   ⚠️  {path.name} was written for group {owner}, not {group_id}; discarding it")
+        path.unlink()
+        return {}, None
+    return participants, state
+
+
+async def _enumerate_channel_participants(
+    client: TelegramClient,
+    entity,
+    limiter: RateLimiter,
+    participants: dict[int, dict],
+    journal: CheckpointJournal | None,
+    state: dict | None,
+) -> None:
+    """Enumerate channel members into ``participants`` with offset checkpoints.
+
+    Work is a queue of buckets: "" is the plain (recent) listing, any other
+    entry a ChannelParticipantsSearch prefix. Telegram caps how far a single
+    listing can be paged, so when a bucket ends before its reported count it
+    is split into one bucket per next character. After every page the new
+    users and the (queue, offset) state are appended to the journal, so an
+    interrupted run resumes at the exact page.
+    """
+    state = state or {"queue": [""], "offset": 0, "total": None}
+    while state["queue"]:
+        q = state["queue"][0]
+        flt = ChannelParticipantsSearch(q) if q else ChannelParticipantsRecent()
+        page = await limiter.call(
+            "participants",
+            client,
+            GetParticipantsRequest(entity, flt, state["offset"], _PARTICIPANTS_PAGE, hash=0),
+        )
+        if not q and state["total"] is None:
+            state["total"] = page.count
+
+        if page.participants:
+            state["offset"] += len(page.participants)
+            before = len(participants)
+            for user in page.users:
+                if isinstance(user, User) and user.id not in participants:
+                    participants[user.id] = _participant_obj(user)
+                    if journal:
+                        journal.write(participants[user.id])
+            if len(participants) // 1000 > before // 1000:
+                bucket = f"search '{q}'" if q else "listing"
+                print(f"   ... {len(participants):,}/{state['total'] or '?'} participants ({bucket})")
+        else:
+            # Bucket exhausted: split it if Telegram stopped short of its count
+            state["queue"].pop(0)
+            capped = state["offset"] < page.count
+            if capped and len(q) < _PARTICIPANT_SEARCH_MAX_PREFIX:
+                state["queue"].extend(q + c for c in _PARTICIPANT_SEARCH_ALPHABET)
+            state["offset"] = 0
+            if state["total"] and len(participants) >= state["total"]:
+                state["queue"].clear()
+
+        if journal:
+            journal.write({"state": state})
+            journal.flush()
+
+
 async def collect_participants(
     client: TelegramClient,
     entity,
+    limiter: RateLimiter | None = None,
+    checkpoint_path: Path | None = None,
 ) -> tuple[list[dict], str, str | None, int | None]:
     """
     Attempt to collect the full participant list.
 
+    Channels are enumerated page by page with offsets (and search-prefix
+    buckets past Telegram's listing cap), deduplicated by user_id and
+    journaled to ``checkpoint_path``; a failed run leaves the journal in
+    place and the next run resumes from it.
+
     Returns:
         (participants, status, error, count)
     """
     print("\n👥 Collecting participants...")
-    participants = []
-    retries = 0
+    limiter = limiter or RateLimiter()
+    participants: dict[int, dict] = {}
+    state = None
+    if checkpoint_path:
+        participants, state = _load_participants_checkpoint(checkpoint_path, entity.id)
+        if state:
+            print(f"   🔄 Resuming participant enumeration: {len(participants):,} collected, "
+                  f"{len(state['queue'])} buckets left")
 
     try:
-        async for user in client.iter_participants(entity):
-            if isinstance(user, User):
-                participants.append(_participant_obj(user))
-
-                if len(participants) % 200 == 0:
-                    print(f"   ... {len(participants)} participants collected")
+        if isinstance(entity, Channel):
+            journal = CheckpointJournal(checkpoint_path, {"id": entity.id}) if checkpoint_path else None
+            try:
+                await _enumerate_channel_participants(client, entity, limiter, participants, journal, state)
+            finally:
+                if journal:
+                    journal.close()
+        else:
+            # Basic groups return every member in a single request
+            async for user in limiter.iterate("participants", lambda last: client.iter_participants(entity)):
+                if isinstance(user, User) and user.id not in participants:
+                    participants[user.id] = _participant_obj(user)
 
         count = len(participants)
         print(f"   ✅ {count} participants collected")
-        return participants, "ok", None, count
+        return list(participants.values()), "ok", None, count
 
     except FloodWaitError as e:
-        while retries < _FLOOD_MAX_RETRIES:
-            retries += 1
-            wait = e.seconds
-            print(f"   ⏳ FloodWait: sleeping {wait}s (retry {retries}/{_FLOOD_MAX_RETRIES})...")
-            time.sleep(wait)
-            try:
-                async for user in client.iter_participants(entity):
-                    if isinstance(user, User):
-                        participants.append(_participant_obj(user))
-                count = len(participants)
-                print(f"   ✅ {count} participants collected (after retry)")
-                return participants, "ok", None, count
-            except FloodWaitError as e2:
-                e = e2
-                continue
-
-        error_msg = f"FloodWaitError after {_FLOOD_MAX_RETRIES} retries (last wait: {e.seconds}s)"
+        error_msg = f"FloodWaitError after {limiter.max_retries} retries (last wait: {e.seconds}s)"
         print(f"   ⚠️  {error_msg}")
         return [], "unavailable", error_msg, None
 
@@ -468,6 +2111,9 @@ async def collect_participants(
         print(f"   ⚠️  Participant list unavailable: {error_msg}")
         return [], "unavailable", error_msg, None
 
+    except FloodBudgetExceeded:
+        raise
+
     except Exception as e:
         error_msg = f"{type(e).__name__}: {e}"
         print(f"   ⚠️  Participant list unavailable: {error_msg}")
@@ -476,141 +2122,412 @@ async def collect_participants(
 
 # ── Main ────────────────────────────────────────────────
 
-async def main() -> None:
-    args = parse_args()
-
-    if not API_ID or not API_HASH:
-        print("❌  TG_API_ID and TG_API_HASH must be set in .env", file=sys.stderr)
-        sys.exit(1)
-
+async def collect_group(
+    client: TelegramClient,
+    args: argparse.Namespace,
+    limiter: RateLimiter | None = None,
+    metrics: Metrics | None = None,
+) -> dict:
+    """Collect one group over an already-connected client.
+
+    ``args`` carries the same options as the command line; ``limiter`` may
+    be shared between groups so a FloodWait pauses all of them. Stage times
+    and counters go into ``metrics``. Returns a short summary of the run.
+    """
+    limiter = limiter or RateLimiter()
+    metrics = metrics or Metrics(group=args.group)
     include_participants = args.include_participants == "true"
     since_dt = None
     if args.since:
         since_dt = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
 
-    out_path = Path(args.out)
-
-    # ── Check for checkpoint from interrupted run ────
-    cp_messages, cp_max_id, cp_meta = _load_checkpoint(out_path)
-    if cp_messages and cp_max_id:
-        print(f"\n🔄 Resuming from checkpoint: {len(cp_messages):,} messages (max id={cp_max_id})")
-        print(f"   Will continue fetching from where we left off")
-
-    # ── Check for existing export (incremental mode) ─
-    existing_export, existing_max_id = _load_existing(out_path)
-    if existing_export and existing_max_id:
-        existing_count = len(existing_export.get("messages", []))
-        print(f"\n♻️  Existing export found: {existing_count:,} messages (max id={existing_max_id})")
+    out_path = Path(args.out) if args.out else None  # Postgres default is per group, set once resolved
+    # NDJSON, Parquet and Postgres are append-only sinks fed oldest-first
+    postgres = args.sink == "postgres"
+    streamed = not postgres and args.format in ("ndjson", "parquet")
+
+    # ── High-water mark from the index sidecar (no export parse) ─
+    cp_count, cp_max_id, cp_min_id, cp_ordered = 0, None, None, True
+    if postgres:
+        index = _empty_index()  # Read from the database once the group is known
+    elif args.format == "ndjson":
+        index = _recover_ndjson_index(out_path)
+    elif args.format == "parquet":
+        index = _recover_parquet_index(out_path)
+    else:
+        index = _recover_json_index(out_path)
+        # ── Check for checkpoint from interrupted run ────
+        cp_count, cp_max_id, cp_min_id, _, cp_ordered = _load_checkpoint(out_path)
+        if cp_count:
+            print(f"\n🔄 Resuming from checkpoint: {cp_count:,} messages (ids {cp_min_id}..{cp_max_id})")
+            print(f"   Will continue fetching below id {cp_min_id}")
+
+    existing_max_id = index["max_id"]
+    if existing_max_id:
+        print(f"\n♻️  Existing export found: {index['count']:,} messages (max id={existing_max_id})")
         print(f"   Will fetch only messages newer than id {existing_max_id}")
 
-    # ── Connect ──────────────────────────────────────
-    client = TelegramClient(SESSION_PATH, int(API_ID), API_HASH)
-    await client.start()
-    print(f"\n✅ Connected as: {(await client.get_me()).first_name}")
-
     # ── Resolve group ────────────────────────────────
     print(f"\n🔍 Resolving group: {args.group}")
-    entity = await resolve_group(client, args.group)
+    with metrics.stage("resolve"):
+        dialogs = None
+        if args.dialog_index != "off":
+            dialogs = DialogIndex(args.dialog_index or dialog_index_path(SESSION_PATH))
+        try:
+            entity = await resolve_group(client, args.group, dialogs, limiter)
+        finally:
+            if dialogs is not None:
+                dialogs.close()
     group_title = getattr(entity, "title", str(entity.id))
     group_type = _group_type(entity)
     print(f"   Found: {group_title} (id={entity.id}, type={group_type})")
 
+    if out_path is None:
+        # Participant journal and metrics must not be shared between groups
+        args.out = str(Path(_DEFAULT_OUT).with_name(f"telethon_{entity.id}.json"))
+        out_path = Path(args.out)
+
+    if postgres:
+        from pg_sink import PostgresSink
+
+        pg_sink = PostgresSink(os.environ["DATABASE_URL"], entity.id, group_title)
+        index = pg_sink.index
+        existing_max_id = index["max_id"]
+        print(f"   🐘 Streaming into Postgres (groups.id={pg_sink.group_id})")
+        if existing_max_id:
+            print(f"\n♻️  {index['count']:,} messages already ingested (max id={existing_max_id})")
+            print(f"   Will fetch only messages newer than id {existing_max_id}")
+
     # ── Collect participants ─────────────────────────
     if include_participants:
-        participants, p_status, p_error, p_count = await collect_participants(client, entity)
+        with metrics.stage("participants"):
+            participants, p_status, p_error, p_count = await collect_participants(
+                client, entity, limiter, checkpoint_path=_participants_checkpoint_path(out_path),
+            )
     else:
         participants, p_status, p_error, p_count = [], "unavailable", "Skipped (--include-participants false)", None
 
     # ── Pre-seed sender cache from participants ──────
-    sender_cache = SenderCache(client)
+    store = None if args.entity_cache == "off" else EntityCache(args.entity_cache)
+    sender_cache = SenderCache(client, limiter, store)
     if participants:
         sender_cache.seed_from_participants(participants)
 
     # ── Determine starting point ─────────────────────
-    # Priority: checkpoint > existing export > fresh start
-    if cp_messages and cp_max_id:
-        min_id = cp_max_id
-    elif existing_max_id:
-        min_id = existing_max_id
-    else:
-        min_id = 0
+    # The walk is newest-first, so an interrupted run has journaled a
+    # contiguous block from the top down: keep the export's floor and
+    # continue below the oldest journaled message.
+    min_id = existing_max_id or 0
+    offset_id = cp_min_id if cp_count else 0
 
-    # Metadata for checkpoint files
+    # Metadata for the checkpoint journal
     checkpoint_meta = {
         "name": group_title,
         "type": group_type,
         "id": entity.id,
-        "checkpoint": True,
     }
 
-    # ── Collect messages ─────────────────────────────
-    new_messages = await collect_messages(
-        client, entity, sender_cache, args.limit, since_dt,
-        min_id=min_id, out_path=out_path, checkpoint_meta=checkpoint_meta,
-    )
+    # ── Reply graph: previous sidecar plus anything it missed ─
+    replies = None
+    if args.reply_graph == "true" and not postgres:
+        legacy = out_path.with_suffix(".replies.json")
+        if legacy.exists():
+            legacy.unlink()  # Superseded by the append-only directory; rebuilt below
+        replies = ReplyGraph.open(_replies_path(out_path))
+        covered = replies.max_id or 0
+        if index["count"] and covered < (existing_max_id or 0):
+            for row in _stored_reply_rows(out_path, args.format, covered, index):
+                replies.add(*row)
+            print(f"\n🧵 Indexed {replies.added:,} stored messages into the reply graph")
+        if cp_count:
+            for _, line in _iter_journal_messages(_checkpoint_path(out_path), cp_ordered):
+                obj = json.loads(line)
+                replies.add(obj["id"], obj.get("reply_to_message_id"), obj.get("from_id"))
 
-    # ── Merge all sources ────────────────────────────
-    all_prior: list[dict] = []
-    if existing_export:
-        all_prior.extend(existing_export.get("messages", []))
-    if cp_messages:
-        all_prior.extend(cp_messages)
-
-    if all_prior:
-        # Deduplicate by message id, keeping the latest version
-        seen_ids: dict[int, dict] = {}
-        for m in all_prior:
-            seen_ids[m["id"]] = m
-        for m in new_messages:
-            seen_ids[m["id"]] = m
-        messages = list(seen_ids.values())
-        prior_count = len(all_prior)
-        new_count = len(new_messages)
-        print(f"\n🔀 Merged: {prior_count:,} prior + {new_count:,} new = {len(messages):,} total (deduplicated)")
-    elif not new_messages:
-        messages = []
-        print(f"\n⚠️  No messages collected.")
-    else:
-        messages = new_messages
-
-    # ── Build export object ──────────────────────────
-    export_obj = {
-        "name": group_title,
-        "type": group_type,
-        "id": entity.id,
-        "collected_at": datetime.now(timezone.utc).isoformat(),
-        "participants_status": p_status,
-        "participants_error": p_error,
-        "participants_count": p_count,
-        "messages_count": len(messages),
-        "limits": {
-            "since": args.since,
-            "limit": args.limit,
-        },
-        "participants": participants,
-        "messages": messages,
-    }
+    # ── Collect messages ─────────────────────────────
+    collected_at = datetime.now(timezone.utc).isoformat()
+
+    # ── Refresh the rewind window (edits / deletions) ─
+    patches: list[dict] = []
+    stored: dict[int, dict] = {}
+    floor = None
+    if existing_max_id and (args.refresh_window or args.refresh_hours):
+        floor = await _window_floor(
+            client, entity, existing_max_id, args.refresh_window, args.refresh_hours, limiter,
+        )
+    if floor is not None:
+        if postgres:
+            stored = pg_sink.window(floor)
+        elif args.format == "json":
+            stored = _json_window(out_path, floor)
+        else:
+            if args.format == "parquet":
+                stored = _parquet_window(out_path, floor)
+            else:
+                stored = _ndjson_window(out_path, floor, index["bytes"])
+            _apply_patch_log(out_path, stored)
+        print(f"\n🔁 Refreshing {len(stored):,} stored messages (ids >= {floor})...")
+        with metrics.stage("refresh"):
+            patches = await refresh_window(client, entity, stored, limiter)
+        metrics.inc("refresh_checked", len(stored))
+        metrics.inc("refresh_patches", len(patches))
+        deleted = sum(1 for p in patches if p["op"] == "delete")
+        print(f"   ✅ {len(patches) - deleted:,} edited, {deleted:,} deleted")
+        if replies is not None:
+            replies.discard(p["id"] for p in patches if p["op"] == "delete")
+        if postgres:
+            pg_sink.apply_patches(patches)
+        elif streamed and patches:
+            with _patches_path(out_path).open("ab") as f:
+                for patch in patches:
+                    f.write(_json_line({**patch, "at": collected_at}))
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ── Media downloads run alongside, on their own tasks ─
+    downloader = None
+    if args.media_dir:
+        downloader = MediaDownloader(
+            client, entity, args.media_dir, limiter,
+            types=set(args.media_types.split(",")) if args.media_types else None,
+            max_bytes=int(args.media_max_mb * 1024 * 1024) or None,
+            concurrency=args.media_concurrency,
+        )
+        downloader.start()
+        print(f"\n📎 Downloading media to {args.media_dir} ({args.media_concurrency} at a time)")
 
-    # ── Write output ─────────────────────────────────
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(export_obj, indent=2, ensure_ascii=False), encoding="utf-8")
+    try:
+        if postgres:
+            with pg_sink:
+                if participants:
+                    pg_sink.write_participants(participants)
+                await collect_messages(
+                    client, entity, sender_cache, args.limit, since_dt,
+                    min_id=min_id, sink=pg_sink, workers=args.workers, limiter=limiter,
+                    media=downloader, metrics=metrics,
+                )
+            messages_count = pg_sink.index["count"]
+        elif streamed:
+            writer_cls = ParquetExportWriter if args.format == "parquet" else NdjsonExportWriter
+            with writer_cls(out_path, index) as writer:
+                await collect_messages(
+                    client, entity, sender_cache, args.limit, since_dt,
+                    min_id=min_id, sink=writer, workers=args.workers, limiter=limiter,
+                    media=downloader, replies=replies, metrics=metrics,
+                )
+                writer.index["collected_at"] = collected_at
+                if args.format == "parquet" and participants:
+                    writer.write_participants(participants)
+            messages_count = writer.index["count"]
+
+            # ── Write header sidecar (small, rewritten each run) ─
+            header = {
+                "name": group_title,
+                "type": group_type,
+                "id": entity.id,
+                "format": args.format,
+                "messages_file": out_path.name,
+                "patches_file": _patches_path(out_path).name if _patches_path(out_path).exists() else None,
+                "replies_dir": _replies_path(out_path).name if replies is not None else None,
+                "collected_at": collected_at,
+                "participants_status": p_status,
+                "participants_error": p_error,
+                "participants_count": p_count,
+                "messages_count": messages_count,
+                "limits": {
+                    "since": args.since,
+                    "limit": args.limit,
+                },
+                "participants": participants,
+            }
+            if args.format == "parquet":
+                # Tables live in the dataset directory; keep the header small
+                header["messages_file"] = f"{out_path.name}/messages"
+                header["reactions_file"] = f"{out_path.name}/reactions"
+                header["participants_file"] = f"{out_path.name}/participants.parquet" if participants else None
+                del header["participants"]
+            _write_json_atomic(_header_path(out_path), header)
+        else:
+            journal = CheckpointJournal(_checkpoint_path(out_path), checkpoint_meta)
+            # Messages already journaled by the interrupted run count towards --limit
+            limit = max(args.limit - cp_count, 0) if args.limit else args.limit
+            if args.limit and not limit:
+                print(f"\n✅ Checkpoint already holds the {args.limit:,} messages --limit asks for")
+            else:
+                await collect_messages(
+                    client, entity, sender_cache, limit, since_dt,
+                    min_id=min_id, offset_id=offset_id, journal=journal,
+                    workers=args.workers, limiter=limiter,
+                    media=downloader, replies=replies, metrics=metrics,
+                )
+            new_count = journal.written
+
+            # ── Merge all sources in one streaming pass ──────
+            # The journal holds the resumed checkpoint plus this run, newest
+            # first; the existing export is streamed only when the index says it
+            # holds messages. Journal lines win over the export on equal ids.
+            # Refreshed messages sit between the two; deleted ones are skipped.
+            sources = [_iter_journal_messages(_checkpoint_path(out_path), cp_ordered)]
+            updated = sorted((
+                (p["id"], _json_line({**stored[p["id"]], **{k: p[k] for k in _PATCH_FIELDS}})[:-1])
+                for p in patches if p["op"] == "update"
+            ), reverse=True)
+            if updated:
+                sources.append(iter(updated))
+            if index["count"]:
+                sources.append(_iter_export_messages(out_path))
+            t = time.perf_counter()
+            stats = _write_json_export(out_path, {
+                "name": group_title,
+                "type": group_type,
+                "id": entity.id,
+                "collected_at": collected_at,
+                "participants_status": p_status,
+                "participants_error": p_error,
+                "participants_count": p_count,
+                "limits": {
+                    "since": args.since,
+                    "limit": args.limit,
+                },
+                "participants": participants,
+            }, *sources, skip={p["id"] for p in patches if p["op"] == "delete"})
+            metrics.add_stage("export", time.perf_counter() - t)
+            messages_count = stats["count"]
+            prior_count = index["count"] + cp_count
+            if prior_count:
+                print(f"\n🔀 Merged: {prior_count:,} prior + {new_count:,} new = {messages_count:,} total (deduplicated)")
+            elif not messages_count:
+                print(f"\n⚠️  No messages collected.")
+
+            # ── Update index so the next run starts without parsing the export ─
+            _commit_index(out_path, {
+                **_empty_index(),
+                **stats,
+                "bytes": out_path.stat().st_size,
+                "collected_at": collected_at,
+                "messages_order": _MESSAGES_ORDER,
+            })
+
+            # ── Journal is only dropped once the export is safely on disk ─
+            cp = _checkpoint_path(out_path)
+            if cp.exists():
+                cp.unlink()
+                print(f"   🧹 Checkpoint journal removed (collection complete)")
+
+        if replies is not None:
+            with metrics.stage("replies"):
+                added = replies.commit()
+            print(f"   🧵 Reply graph: +{added:,} messages ({len(replies):,} total) "
+                  f"-> {_replies_path(out_path).name}/")
+
+        # Text is safely written; let outstanding downloads finish
+        if downloader is not None:
+            with metrics.stage("media"):
+                await downloader.drain()
+            metrics.inc("media_downloaded", downloader.downloaded)
+            metrics.inc("media_deduplicated", downloader.deduped)
+            metrics.inc("media_filtered", downloader.filtered)
+            metrics.inc("media_failed", downloader.failed)
+            metrics.inc("media_bytes", downloader.bytes)
+    finally:
+        if downloader is not None:
+            downloader.stop()
+
+    sender_cache.close()
+
+    # A completed participant list is in the export; drop its journal too
+    pcp = _participants_checkpoint_path(out_path)
+    if p_status == "ok" and pcp.exists():
+        pcp.unlink()
 
     print(f"\n{'━' * 50}")
     print(f"✅ Export complete:")
     print(f"   Group:              {group_title}")
     print(f"   Type:               {group_type}")
-    print(f"   Messages:           {len(messages):,}")
+    print(f"   Messages:           {messages_count:,}")
     print(f"   Participants:       {p_status} ({p_count if p_count is not None else 'N/A'})")
     if p_error:
         print(f"   Participant error:  {p_error}")
-    print(f"   Output:             {out_path}")
+    if limiter.total_wait:
+        print(f"   FloodWait paused:   {limiter.total_wait:.0f}s")
+    print(f"   Output:             {'postgres' if postgres else out_path}")
+    if streamed:
+        print(f"   Header / index:     {_header_path(out_path).name}, {_index_path(out_path).name}")
+    elif not postgres:
+        print(f"   Index:              {_index_path(out_path).name}")
     if existing_max_id:
         print(f"   Mode:               incremental (re-run to fetch newer messages)")
     else:
         print(f"   Mode:               full collection")
     print()
 
-    await client.disconnect()
+    # Flood waits are per limiter, so a shared (batch) limiter reports all groups
+    metrics.set("flood_wait_seconds", round(limiter.total_wait, 3))
+    for method, n in limiter.floods.items():
+        metrics.set(f"flood_waits_{method}", n)
+    metrics.set("messages_total", messages_count)
+
+    return {
+        "group": args.group,
+        "title": group_title,
+        "id": entity.id,
+        "out": str(out_path),
+        "format": "postgres" if postgres else args.format,
+        "messages_count": messages_count,
+        "participants_status": p_status,
+        "collected_at": collected_at,
+        "metrics": metrics.to_dict(),
+    }
+
+
+def _metrics_path(args: argparse.Namespace) -> Path | None:
+    if args.metrics == "off":
+        return None
+    if args.metrics:
+        return Path(args.metrics)
+    if args.out is None:
+        # --sink postgres run that failed before the group (and its path) was known
+        slug = "".join(c if c.isalnum() else "_" for c in args.group.strip().lstrip("@")).lower()
+        return Path(_DEFAULT_OUT).with_name(f"telethon_{slug}.metrics.json")
+    return Path(args.out).with_suffix(".metrics.json")
+
+
+def write_metrics(args: argparse.Namespace, metrics: Metrics) -> None:
+    """Write the run's metrics JSON and, with --metrics-prom, Prometheus text."""
+    path = _metrics_path(args)
+    if path is not None:
+        _write_json_atomic(path, metrics.to_dict())
+        print(f"📈 Metrics: {path}")
+    if args.metrics_prom:
+        prom = Path(args.metrics_prom)
+        prom.parent.mkdir(parents=True, exist_ok=True)
+        tmp = prom.with_name(prom.name + ".tmp")
+        tmp.write_text(metrics.to_prometheus(), encoding="utf-8")
+        os.replace(tmp, prom)  # textfile collectors must never see a partial file
+        print(f"📈 Prometheus metrics: {prom}")
+
+
+async def main() -> None:
+    args = parse_args()
+
+    if not API_ID or not API_HASH:
+        print("❌  TG_API_ID and TG_API_HASH must be set in .env", file=sys.stderr)
+        sys.exit(1)
+
+    # ── Connect ──────────────────────────────────────
+    client = TelegramClient(SESSION_PATH, int(API_ID), API_HASH)
+    await client.start()
+    print(f"\n✅ Connected as: {(await client.get_me()).first_name}")
+
+    metrics = Metrics(group=args.group)
+    try:
+        await collect_group(client, args, metrics=metrics)
+    except GroupResolutionError:
+        sys.exit(1)
+    finally:
+        # Also written for failed runs: where the time went matters most then
+        write_metrics(args, metrics)
+        await client.disconnect()
 
 
 if __name__ == "__main__":
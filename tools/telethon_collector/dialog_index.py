@@ -0,0 +1,365 @@
+"""
+Local, incrementally refreshed index of the account's Telegram dialogs.
+
+Resolving a group by title used to walk every dialog with iter_dialogs()
+on each run. This index keeps one SQLite row per dialog (peer id, type,
+title, username, top message, unread / participant counts) so lookups and
+fuzzy searches are answered locally. The index is brought up to date with
+a partial walk: dialogs arrive newest activity first, so the walk stops
+once it reaches dialogs whose top message is already indexed. A full walk
+(which also drops dialogs that disappeared) runs when the index is empty
+or older than a day.
+
+Dialogs belong to an account, so the default index file is named after
+the session file and lives next to the entity cache.
+
+Usage:
+    index = DialogIndex(default_path(SESSION_PATH))  # or TG_DIALOG_INDEX_PATH
+    await index.refresh(client, limiter)             # incremental; full=True to rebuild
+    matches = index.search("bd web3", types={"supergroup", "channel"})
+    index.close()
+"""
+
+import difflib
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from telethon import TelegramClient, utils
+from telethon.tl.types import Channel, Chat, User
+
+from rate_limiter import FloodBudgetExceeded, RateLimiter
+
+_SCRIPT_DIR = Path(__file__).resolve().parent
+_ROOT_DIR = _SCRIPT_DIR.parent.parent
+
+DEFAULT_DIR = _ROOT_DIR / "data" / ".state"
+FULL_REFRESH_AGE = 24 * 3600   # Seconds before a partial refresh is upgraded to a full walk
+_STOP_AFTER_UNCHANGED = 5      # Consecutive unchanged (unpinned) dialogs that end a partial walk
+_FUZZY_CUTOFF = 0.6            # Minimum similarity ratio for a fuzzy-only search hit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dialogs (
+    peer_id            INTEGER PRIMARY KEY,  -- marked id (-100… for channels)
+    entity_id          INTEGER NOT NULL,
+    type               TEXT NOT NULL,
+    title              TEXT,
+    username           TEXT,
+    top_message_id     INTEGER,
+    last_message_at    REAL,
+    unread_count       INTEGER,
+    participants_count INTEGER,
+    pinned             INTEGER NOT NULL DEFAULT 0,
+    archived           INTEGER NOT NULL DEFAULT 0,
+    updated_at         REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = (
+    "peer_id, entity_id, type, title, username, top_message_id, last_message_at, "
+    "unread_count, participants_count, pinned, archived, updated_at"
+)
+
+# Dialog listings rarely carry participant counts; keep a previously fetched one
+_UPSERT = f"""
+INSERT INTO dialogs ({_COLUMNS}) VALUES ({", ".join("?" * 12)})
+ON CONFLICT (peer_id) DO UPDATE SET
+    entity_id = excluded.entity_id,
+    type = excluded.type,
+    title = excluded.title,
+    username = excluded.username,
+    top_message_id = excluded.top_message_id,
+    last_message_at = excluded.last_message_at,
+    unread_count = excluded.unread_count,
+    participants_count = COALESCE(excluded.participants_count, dialogs.participants_count),
+    pinned = excluded.pinned,
+    archived = excluded.archived,
+    updated_at = excluded.updated_at
+"""
+
+
+class DialogEntry(NamedTuple):
+    peer_id: int
+    entity_id: int
+    type: str
+    title: str | None
+    username: str | None
+    top_message_id: int | None
+    last_message_at: float | None
+    unread_count: int | None
+    participants_count: int | None
+    pinned: bool
+    archived: bool
+    updated_at: float
+
+    def to_dict(self) -> dict:
+        last = self.last_message_at
+        return {
+            "peer_id": self.peer_id,
+            "id": self.entity_id,
+            "type": self.type,
+            "title": self.title,
+            "username": self.username,
+            "top_message_id": self.top_message_id,
+            "last_message_at": datetime.fromtimestamp(last, timezone.utc).isoformat() if last else None,
+            "unread_count": self.unread_count,
+            "participants_count": self.participants_count,
+            "pinned": self.pinned,
+            "archived": self.archived,
+        }
+
+
+def entity_type(entity) -> str:
+    if isinstance(entity, User):
+        return "user"
+    if isinstance(entity, Channel):
+        return "supergroup" if entity.megagroup else "channel"
+    if isinstance(entity, Chat):
+        return "group"
+    return "unknown"
+
+
+def default_path(session_path: str | Path) -> Path:
+    raw = os.getenv("TG_DIALOG_INDEX_PATH")
+    if raw:
+        path = Path(raw)
+        return path if path.is_absolute() else (_ROOT_DIR / path).resolve()
+    return DEFAULT_DIR / f"telethon_dialogs.{Path(session_path).stem}.sqlite"
+
+
+def _normalize(text: str | None) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def _is_exact(needle: str, entry: DialogEntry) -> bool:
+    return (
+        needle == _normalize(entry.title)
+        or needle == (entry.username or "").lower()
+        or needle in (str(entry.entity_id), str(entry.peer_id))
+    )
+
+
+def _score(needle: str, entry: DialogEntry) -> float:
+    """How well ``needle`` matches a dialog: 1.0 exact, then prefix, substring, fuzzy."""
+    if _is_exact(needle, entry):
+        return 1.0
+    title = _normalize(entry.title)
+    username = (entry.username or "").lower()
+    if title.startswith(needle) or (username and username.startswith(needle)):
+        return 0.9
+    if needle in title:
+        return 0.8
+    # Every word of the query appears in the title ("web3 bd" -> "BD in Web3")
+    words = needle.split()
+    if len(words) > 1 and all(w in title for w in words):
+        return 0.75
+    ratio = max(
+        difflib.SequenceMatcher(None, needle, title).ratio(),
+        difflib.SequenceMatcher(None, needle, username).ratio() if username else 0.0,
+    )
+    return ratio * 0.7 if ratio >= _FUZZY_CUTOFF else 0.0
+
+
+class DialogIndex:
+    """SQLite-backed dialog index with incremental refresh and fuzzy search."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self) -> "DialogIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ── Metadata ────────────────────────────────────────
+
+    def _meta(self, key: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def synced_at(self) -> float | None:
+        """When the last refresh (partial or full) finished."""
+        value = self._meta("synced_at")
+        return float(value) if value else None
+
+    @property
+    def full_synced_at(self) -> float | None:
+        value = self._meta("full_synced_at")
+        return float(value) if value else None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM dialogs").fetchone()[0]
+
+    # ── Refresh ─────────────────────────────────────────
+
+    async def refresh(
+        self,
+        client: TelegramClient,
+        limiter: RateLimiter | None = None,
+        full: bool = False,
+    ) -> tuple[int, int]:
+        """Bring the index up to date; returns (dialogs scanned, rows changed).
+
+        A partial walk stops at the first unpinned dialog whose top message
+        is already indexed and no newer than the newest message seen by the
+        previous refresh (or after a run of unchanged dialogs). A full walk
+        visits every dialog and removes rows for dialogs the account no
+        longer has.
+        """
+        limiter = limiter or RateLimiter()
+        full_synced = self.full_synced_at
+        if not full and (full_synced is None or time.time() - full_synced > FULL_REFRESH_AGE):
+            full = True
+        known = dict(self._conn.execute("SELECT peer_id, top_message_id FROM dialogs"))
+        watermark = self._meta("newest_message_at")
+        watermark = float(watermark) if watermark else None
+
+        def page(last):
+            if last is None:
+                return client.iter_dialogs()
+            # Continue after the last dialog received (FloodWait resume)
+            return client.iter_dialogs(
+                offset_date=last.date, offset_id=last.message.id if last.message else 0,
+                offset_peer=last.input_entity,
+            )
+
+        now = time.time()
+        scanned = changed = unchanged_run = 0
+        newest = watermark
+        seen: set[int] = set()
+        rows = []
+        async for dialog in limiter.iterate("dialogs", page):
+            scanned += 1
+            peer_id = utils.get_peer_id(dialog.entity)
+            if peer_id in seen:
+                continue  # a resumed page can repeat the boundary dialog
+            seen.add(peer_id)
+            top_id = dialog.message.id if dialog.message else None
+            last_at = dialog.date.timestamp() if dialog.date else None
+            if peer_id in known and known[peer_id] == top_id:
+                if not full and not dialog.pinned:
+                    # Pinned dialogs aside, the walk is ordered by top message date
+                    unchanged_run += 1
+                    if unchanged_run >= _STOP_AFTER_UNCHANGED or (
+                        watermark is not None and last_at is not None and last_at <= watermark
+                    ):
+                        break
+            else:
+                changed += 1
+                unchanged_run = 0
+            if last_at is not None and (newest is None or last_at > newest):
+                newest = last_at
+            entity = dialog.entity
+            rows.append((
+                peer_id,
+                entity.id,
+                entity_type(entity),
+                dialog.name or None,
+                getattr(entity, "username", None),
+                top_id,
+                last_at,
+                dialog.unread_count,
+                getattr(entity, "participants_count", None),
+                int(bool(dialog.pinned)),
+                int(dialog.folder_id == 1),
+                now,
+            ))
+        self._conn.executemany(_UPSERT, rows)
+        if full:
+            gone = set(known) - seen
+            changed += len(gone)
+            self._conn.executemany("DELETE FROM dialogs WHERE peer_id = ?", [(p,) for p in gone])
+            self._set_meta("full_synced_at", now)
+        if newest is not None:
+            self._set_meta("newest_message_at", newest)
+        self._set_meta("synced_at", now)
+        self._conn.commit()
+        return scanned, changed
+
+    async def fill_participant_counts(
+        self,
+        client: TelegramClient,
+        entries: list[DialogEntry],
+        limiter: RateLimiter | None = None,
+    ) -> list[DialogEntry]:
+        """Fetch missing participant counts of groups/channels (one request each)."""
+        limiter = limiter or RateLimiter()
+        filled = []
+        for entry in entries:
+            if entry.participants_count is None and entry.type != "user":
+                try:
+                    found = await limiter.call("participants", client.get_participants, entry.peer_id, limit=0)
+                except FloodBudgetExceeded:
+                    raise
+                except Exception:
+                    pass  # admin-only member list, left chat, ...
+                else:
+                    entry = entry._replace(participants_count=found.total)
+                    self._conn.execute(
+                        "UPDATE dialogs SET participants_count = ? WHERE peer_id = ?",
+                        (found.total, entry.peer_id),
+                    )
+            filled.append(entry)
+        self._conn.commit()
+        return filled
+
+    # ── Lookup ──────────────────────────────────────────
+
+    def _rows(self, where: str = "", params: tuple = ()) -> list[DialogEntry]:
+        cur = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM dialogs {where} ORDER BY last_message_at DESC", params,
+        )
+        return [
+            DialogEntry(*row[:9], bool(row[9]), bool(row[10]), row[11])
+            for row in cur
+        ]
+
+    def get(self, peer_id: int) -> DialogEntry | None:
+        rows = self._rows("WHERE peer_id = ?", (peer_id,))
+        return rows[0] if rows else None
+
+    def all(self, types: set[str] | None = None) -> list[DialogEntry]:
+        """Every indexed dialog, most recently active first."""
+        entries = self._rows()
+        return [e for e in entries if types is None or e.type in types]
+
+    def exact(self, query: str, types: set[str] | None = None) -> list[DialogEntry]:
+        """Dialogs whose id, @username or title equals ``query`` (case-insensitive)."""
+        needle = _normalize(query).lstrip("@")
+        return [e for e in self.all(types) if needle and _is_exact(needle, e)]
+
+    def search(
+        self,
+        query: str,
+        types: set[str] | None = None,
+        limit: int | None = 10,
+    ) -> list[DialogEntry]:
+        """Dialogs ranked by match quality (exact, prefix, substring, fuzzy)."""
+        needle = _normalize(query).lstrip("@")
+        if not needle:
+            return []
+        scored = [(score, e) for e in self.all(types) if (score := _score(needle, e)) > 0]
+        # Stable sort keeps recent activity as the tie-breaker
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        hits = [e for _, e in scored]
+        return hits if limit is None else hits[:limit]
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Segmented, rotating DM event log shared by listen-dms.py and snapshot-dms.py.
+
+A DM log is a directory instead of one ever-growing JSONL file:
+
+    <log>/00000001.jsonl.gz     sealed, consumed by every consumer, compressed
+    <log>/00000002.jsonl        sealed, not yet fully consumed
+    <log>/00000003.jsonl        active segment (appends go here)
+    <log>/manifest.json         segments + per-consumer read positions
+    <log>/manifest.lock         short-lived lock around manifest updates
+
+The active segment is sealed and a new one started once it exceeds
+``max_bytes`` or is older than ``max_age`` seconds. Consumers (``npm run
+ingest-dm-jsonl``) record how far they have read as a (segment, byte
+offset) pair in the manifest and only read bytes after it. A sealed segment
+that every registered consumer has read past is gzip-compressed by the
+consumer (or ``dm_log.py compact``). Writers take the manifest lock only
+to rotate, never per append; a rotation always terminates a torn final
+line, so a sealed segment is complete. The manifest format is shared with src/lib/dm-segment-log.ts, which implements
+the consumer side, so both use the same lock file.
+
+A path ending in ``.jsonl`` keeps the single-file layout (``open_log``
+returns a plain appender), so existing setups continue to work until they
+are moved over with ``adopt``.
+
+Usage:
+    log = open_log("data/exports/telethon_dms_live")   # or a legacy *.jsonl path
+    log.append(b'{"message_id": 1}\\n')
+    log.sync(); log.close()
+
+    python tools/telethon_collector/dm_log.py status data/exports/telethon_dms_live
+    python tools/telethon_collector/dm_log.py compact data/exports/telethon_dms_live
+    python tools/telethon_collector/dm_log.py reset data/exports/telethon_dms_live --consumer ingest
+    python tools/telethon_collector/dm_log.py adopt data/exports/telethon_dms_live \\
+        --from data/exports/telethon_dms_live.jsonl --state-file data/.state/dm-live.state.json
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_SEGMENT_BYTES = 64 << 20     # Seal the active segment past this size
+DEFAULT_SEGMENT_SECONDS = 24 * 3600  # ... or once it is this old
+MANIFEST = "manifest.json"
+LOCK = "manifest.lock"
+_LOCK_STALE = 30.0                   # Seconds a lock without a pid is trusted
+_LOCK_POLL = 0.02
+
+
+def is_segmented(path: str | Path) -> bool:
+    """A directory (or a path without a .jsonl suffix) is a segmented log."""
+    path = Path(path)
+    return path.is_dir() or path.suffix != ".jsonl"
+
+
+def segment_name(seq: int) -> str:
+    return f"{seq:08d}.jsonl"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ── Manifest ────────────────────────────────────────────
+
+def _holder_alive(path: Path) -> bool:
+    """Whether the process named in a lock file still runs (same host).
+
+    A lock without a pid yet is trusted until ``_LOCK_STALE``: its holder
+    may be between creating the file and writing its pid.
+    """
+    try:
+        raw = path.read_text().strip()
+        age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    if not raw.isdigit():
+        return age <= _LOCK_STALE
+    try:
+        os.kill(int(raw), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return True
+
+
+@contextmanager
+def manifest_lock(log_dir: Path):
+    """Exclusive lock via O_EXCL lock file holding the owner's pid (usable from Node as well).
+
+    A leftover lock is broken only once its pid is gone, never because a
+    live holder is slow.
+    """
+    path = log_dir / LOCK
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            if not _holder_alive(path):
+                try:
+                    path.unlink()  # holder died while holding it
+                except FileNotFoundError:
+                    pass
+                continue
+            time.sleep(_LOCK_POLL)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def load_manifest(log_dir: Path) -> dict:
+    path = log_dir / MANIFEST
+    if not path.exists():
+        return {"version": 1, "segments": [], "consumers": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_manifest(log_dir: Path, manifest: dict) -> None:
+    path = log_dir / MANIFEST
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _segment_size(log_dir: Path, seg: dict) -> int:
+    path = log_dir / seg["file"]
+    return path.stat().st_size if path.exists() else seg.get("bytes") or 0
+
+
+def consumed_by_all(log_dir: Path, manifest: dict, seg: dict) -> bool:
+    """True when ``seg`` is sealed and every consumer has read all of it."""
+    consumers = manifest["consumers"].values()
+    if seg["sealed_at"] is None or not consumers:
+        return False
+    size = _segment_size(log_dir, seg)
+    return all(
+        c["seq"] > seg["seq"] or (c["seq"] == seg["seq"] and c["offset"] >= size)
+        for c in consumers
+    )
+
+
+def compact(log_dir: Path) -> int:
+    """Gzip sealed segments every consumer has read; returns how many.
+
+    Compression runs outside the lock. Before the original is unlinked the
+    segment is checked again under the lock: still sealed, uncompressed,
+    consumed and the size it had when compression started. Otherwise the
+    archive is discarded and the segment is left for a later pass.
+    """
+    log_dir = Path(log_dir)
+    with manifest_lock(log_dir):
+        manifest = load_manifest(log_dir)
+        todo = [s for s in manifest["segments"] if not s["compressed"] and consumed_by_all(log_dir, manifest, s)]
+    done = 0
+    for seg in todo:
+        src = log_dir / seg["file"]
+        dst = src.with_name(src.name + ".gz")
+        tmp = dst.with_name(dst.name + ".tmp")
+        size = src.stat().st_size
+        with src.open("rb") as f_in, gzip.open(tmp, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1 << 20)
+        with manifest_lock(log_dir):
+            manifest = load_manifest(log_dir)
+            current = next((s for s in manifest["segments"] if s["seq"] == seg["seq"]), None)
+            if (
+                current is None
+                or current["compressed"]
+                or not consumed_by_all(log_dir, manifest, current)
+                or src.stat().st_size != size
+            ):
+                tmp.unlink()
+                continue
+            os.replace(tmp, dst)
+            current["bytes"] = size
+            current["compressed"] = True
+            save_manifest(log_dir, manifest)
+            src.unlink()
+        done += 1
+    return done
+
+
+# ── Writers ─────────────────────────────────────────────
+
+class PlainLog:
+    """Single-file appender (legacy *.jsonl layout)."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("ab")
+
+    def append(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+
+    def sync(self) -> None:
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SegmentedLog:
+    """Appender for a segmented log directory; rotates the active segment.
+
+    The writer keeps the active segment open and the manifest in memory;
+    appends take no lock. Several processes may append at once (the
+    snapshot catch-up and the listener), so each append compares the
+    manifest's stat with the cached one and follows another writer's
+    rotation. Should that rotation land during the write itself, the rows
+    are appended again to the new active segment; ingest upserts by message
+    id, so the copy left in the sealed segment is harmless. The manifest
+    lock is only taken to rotate.
+    """
+
+    def __init__(
+        self,
+        log_dir: str | Path,
+        max_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_age: float = DEFAULT_SEGMENT_SECONDS,
+    ):
+        self.dir = Path(log_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._fd = None
+        self._seq = None
+        self._created = 0.0
+        self._manifest = None
+        self._stamp = None
+        with manifest_lock(self.dir):
+            manifest = load_manifest(self.dir)
+            if not manifest["segments"] or manifest["segments"][-1]["sealed_at"] is not None:
+                self._add_segment(manifest)
+                save_manifest(self.dir, manifest)
+            self._switch(manifest)
+            # A crashed writer may have left half a line; start on a fresh one
+            self._terminate_torn_line()
+
+    def _add_segment(self, manifest: dict) -> None:
+        seq = manifest["segments"][-1]["seq"] + 1 if manifest["segments"] else 1
+        manifest["segments"].append({
+            "seq": seq,
+            "file": segment_name(seq),
+            "created_at": _now(),
+            "sealed_at": None,
+            "bytes": None,
+            "compressed": False,
+        })
+
+    def _manifest_stamp(self) -> tuple:
+        st = (self.dir / MANIFEST).stat()
+        return st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size
+
+    def _switch(self, manifest: dict) -> None:
+        """Open the manifest's active segment for appending."""
+        active = manifest["segments"][-1]
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+        self._seq = active["seq"]
+        self._created = datetime.fromisoformat(active["created_at"]).timestamp()
+        # O_APPEND: each append is one write(2) at the current end, so
+        # concurrent writers never interleave inside a batch
+        self._fd = os.open(self.dir / active["file"], os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._manifest = manifest
+        self._stamp = self._manifest_stamp()
+
+    def _follow(self) -> bool:
+        """Reload the cached manifest if it changed; True if it did."""
+        stamp = self._manifest_stamp()
+        if stamp == self._stamp:
+            return False
+        manifest = load_manifest(self.dir)
+        if manifest["segments"][-1]["seq"] != self._seq:
+            self._switch(manifest)
+        else:
+            self._manifest, self._stamp = manifest, stamp
+        return True
+
+    def _sealed(self, seq: int) -> bool:
+        return any(s["seq"] == seq and s["sealed_at"] is not None for s in self._manifest["segments"])
+
+    def _terminate_torn_line(self) -> None:
+        size = os.fstat(self._fd).st_size
+        if size and os.pread(self._fd, 1, size - 1) != b"\n":
+            os.write(self._fd, b"\n")
+
+    def _rotate(self) -> None:
+        with manifest_lock(self.dir):
+            manifest = load_manifest(self.dir)
+            active = manifest["segments"][-1]
+            if active["seq"] == self._seq:
+                # Sealed segments must end on a line boundary: consumers treat
+                # them as complete and never wait for the rest of a line
+                self._terminate_torn_line()
+                active["sealed_at"] = _now()
+                active["bytes"] = os.fstat(self._fd).st_size
+                self._add_segment(manifest)
+                save_manifest(self.dir, manifest)
+            self._switch(manifest)
+
+    def append(self, data: bytes) -> None:
+        self._follow()
+        # fstat rather than a local count: other writers append here too
+        size = os.fstat(self._fd).st_size
+        if size and (size + len(data) > self.max_bytes or time.time() - self._created >= self.max_age):
+            self._rotate()
+        seq = self._seq
+        self._write(data)
+        if self._follow() and self._sealed(seq):
+            # Another writer sealed the segment while we wrote; compaction
+            # may drop anything past the seal, so keep a copy in the active one
+            self._write(data)
+
+    def _write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+
+    def sync(self) -> None:
+        os.fsync(self._fd)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def open_log(
+    path: str | Path,
+    max_bytes: int = DEFAULT_SEGMENT_BYTES,
+    max_age: float = DEFAULT_SEGMENT_SECONDS,
+) -> PlainLog | SegmentedLog:
+    """Appender for ``path``: segmented for a directory, plain for *.jsonl."""
+    if is_segmented(path):
+        return SegmentedLog(path, max_bytes, max_age)
+    return PlainLog(path)
+
+
+# ── CLI ─────────────────────────────────────────────────
+
+def _byte_offset(path: Path, lines: int) -> int:
+    """Byte offset just after the first ``lines`` complete lines."""
+    offset = 0
+    with path.open("rb") as f:
+        for _ in range(lines):
+            raw = f.readline()
+            if not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+    return offset
+
+
+def adopt(log_dir: Path, legacy: Path, state_file: Path | None, consumer: str) -> None:
+    """Move a legacy single-file log in as the first (sealed) segment."""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with manifest_lock(log_dir):
+        manifest = load_manifest(log_dir)
+        if manifest["segments"]:
+            raise SystemExit(f"❌  {log_dir} already has segments; adopt into an empty log")
+        manifest["segments"].append({
+            "seq": 1,
+            "file": segment_name(1),
+            "created_at": datetime.fromtimestamp(legacy.stat().st_mtime, timezone.utc).isoformat(),
+            "sealed_at": _now(),
+            "bytes": legacy.stat().st_size,
+            "compressed": False,
+        })
+        offset = 0
+        if state_file is not None and state_file.exists():
+            state = json.loads(state_file.read_text(encoding="utf-8"))
+            offset = _byte_offset(legacy, int(state.get("lastLine") or 0))
+        os.replace(legacy, log_dir / segment_name(1))
+        manifest["consumers"][consumer] = {"seq": 1, "offset": offset, "updated_at": _now()}
+        save_manifest(log_dir, manifest)
+    print(f"✅ Adopted {legacy} as segment 1 of {log_dir} ({consumer} at byte {offset:,})")
+
+
+def reset(log_dir: Path, consumer: str) -> None:
+    """Forget a consumer's position; its next read starts at the oldest segment."""
+    with manifest_lock(log_dir):
+        manifest = load_manifest(log_dir)
+        dropped = manifest["consumers"].pop(consumer, None)
+        save_manifest(log_dir, manifest)
+    print(f"♻️  Consumer {consumer} {'reset' if dropped else 'had no position'} in {log_dir}")
+
+
+def status(log_dir: Path) -> None:
+    manifest = load_manifest(log_dir)
+    print(f"\n{'Seq':<6} {'File':<20} {'Bytes':>12}  {'Created':<20} State")
+    print("─" * 72)
+    for seg in manifest["segments"]:
+        state = "compressed" if seg["compressed"] else "sealed" if seg["sealed_at"] else "active"
+        size = seg["bytes"] if seg["compressed"] else _segment_size(log_dir, seg)
+        print(f"{seg['seq']:<6} {seg['file']:<20} {size:>12,}  {seg['created_at'][:19]:<20} {state}")
+    for name, c in manifest["consumers"].items():
+        print(f"\n📍 Consumer {name}: segment {c['seq']} @ byte {c['offset']:,} (updated {c['updated_at'][:19]})")
+    print()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Inspect and maintain a segmented DM event log.")
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="List segments and consumer positions.").add_argument("log")
+    sub.add_parser("compact", help="Compress segments every consumer has read.").add_argument("log")
+    r = sub.add_parser("reset", help="Forget a consumer's position (full replay on its next read).")
+    r.add_argument("log")
+    r.add_argument("--consumer", default="ingest", help="Consumer name (default: ingest).")
+    a = sub.add_parser("adopt", help="Turn a legacy *.jsonl file into the first segment of a log.")
+    a.add_argument("log")
+    a.add_argument("--from", dest="legacy", required=True, help="Legacy JSONL file (moved into the log).")
+    a.add_argument("--state-file", default=None, help="Ingest state file whose lastLine becomes the consumer offset.")
+    a.add_argument("--consumer", default="ingest", help="Consumer name to seed (default: ingest).")
+    args = p.parse_args()
+
+    log_dir = Path(args.log)
+    if args.command == "adopt":
+        adopt(log_dir, Path(args.legacy), Path(args.state_file) if args.state_file else None, args.consumer)
+    elif not (log_dir / MANIFEST).exists():
+        print(f"❌  No DM log at {log_dir}", file=sys.stderr)
+        sys.exit(1)
+    elif args.command == "status":
+        status(log_dir)
+    elif args.command == "reset":
+        reset(log_dir, args.consumer)
+    else:
+        print(f"🗜️  Compressed {compact(log_dir)} segment(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Direct-to-Postgres DM writer for listen-dms.py (--db-write).
+
+Each captured DM row is stored in users / dm_conversations / dm_messages
+the moment it arrives, with the same upserts ``npm run ingest-dm-jsonl``
+uses, so an inbound message is 'pending' in the database (and announced
+with NOTIFY dm_inbound by the trigger from migration
+20261016120000_add_dm_inbound_notify_trigger.sql) within milliseconds.
+
+The JSONL log is still written and ingested as before; it is the
+fallback for rows the database did not take. Rows stored here carry
+``"stored_by": "listen-dms"`` in raw_payload, so that ingest replaces the
+payload once and runs its profile-signal extraction, which this writer
+leaves out. The responder holds such rows until that has happened (or
+its --extraction-wait has passed); the trigger from migration
+20261016130000_notify_dm_inbound_after_profile_ingest.sql wakes it then.
+
+Usage:
+    sink = DmPostgresSink(os.environ["DATABASE_URL"])
+    stored = await sink.write(row)     # serialize_message() row; False on failure
+    sink.close()
+"""
+
+import asyncio
+import json
+
+import psycopg
+
+STORED_BY = "listen-dms"
+
+# Same list as ONBOARDING_REQUIRED_FIELDS in src/cli/ingest-dm-jsonl.ts
+ONBOARDING_REQUIRED_FIELDS = ["primary_role", "primary_company", "notable_topics", "preferred_contact_style"]
+
+# ── SQL (mirrors ingestBatch in src/cli/ingest-dm-jsonl.ts) ──
+
+_UPSERT_USER = """
+INSERT INTO users (platform, external_id, handle, display_name)
+VALUES ('telegram', %s, %s::text, %s::text)
+ON CONFLICT (platform, external_id) DO UPDATE SET
+  handle = COALESCE(NULLIF(EXCLUDED.handle, ''), users.handle),
+  display_name = COALESCE(NULLIF(EXCLUDED.display_name, ''), users.display_name)
+RETURNING id
+"""
+
+_ONBOARDING_COLUMNS = """
+SELECT count(*)
+FROM information_schema.columns
+WHERE table_schema = 'public'
+  AND table_name = 'dm_profile_state'
+  AND column_name IN ('onboarding_status', 'onboarding_required_fields',
+                      'onboarding_missing_fields', 'onboarding_turns')
+"""
+
+_PROFILE_STATE_ONBOARDING = """
+INSERT INTO dm_profile_state (
+  user_id, onboarding_status, onboarding_required_fields, onboarding_missing_fields, onboarding_turns
+)
+VALUES (%s, 'not_started', %s::jsonb, %s::jsonb, 0)
+ON CONFLICT (user_id) DO NOTHING
+"""
+
+_PROFILE_STATE = """
+INSERT INTO dm_profile_state (user_id)
+VALUES (%s)
+ON CONFLICT (user_id) DO NOTHING
+"""
+
+_UPSERT_CONVERSATION = """
+INSERT INTO dm_conversations (platform, external_chat_id, user_a_id, user_b_id, last_message_at)
+VALUES ('telegram', %s, %s, %s, %s::timestamptz)
+ON CONFLICT (platform, external_chat_id) DO UPDATE SET
+  user_a_id = EXCLUDED.user_a_id,
+  user_b_id = EXCLUDED.user_b_id,
+  last_message_at = GREATEST(dm_conversations.last_message_at, EXCLUDED.last_message_at),
+  updated_at = now()
+RETURNING id
+"""
+
+_INSERT_MESSAGE = """
+INSERT INTO dm_messages (
+  conversation_id, external_message_id, sender_id, direction, text,
+  text_len, sent_at, reply_to_external_message_id,
+  views, forwards, has_links, has_mentions, response_status,
+  raw_payload
+) VALUES (%s, %s, %s, %s::text, %s, %s, %s::timestamptz, %s, %s, %s, %s, %s, %s::text, %s::jsonb)
+ON CONFLICT (conversation_id, external_message_id) DO NOTHING
+"""
+
+
+def _handle(raw: str | None) -> str | None:
+    return raw.strip().lower() if raw else None
+
+
+class DmPostgresSink:
+    """One connection; rows are stored one transaction each, off the event loop."""
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self._conn: psycopg.Connection | None = None
+        self._onboarding: bool | None = None
+        self._lock = asyncio.Lock()
+        self.stored = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    async def write(self, row: dict) -> bool:
+        """Store one serialize_message() row; returns False if it could not be stored."""
+        if not row.get("sender_id") or not row.get("peer_id"):
+            return False
+        async with self._lock:
+            try:
+                inserted = await asyncio.to_thread(self._store, row)
+            except psycopg.Error as exc:
+                self.failed += 1
+                print(f"⚠️  DM db write failed for message {row.get('message_id')} (JSONL ingest will retry): {exc}")
+                self._reset()
+                return False
+        if inserted:
+            self.stored += 1
+        else:
+            self.duplicates += 1
+        return True
+
+    def close(self) -> None:
+        self._reset()
+
+    # ── Worker thread ───────────────────────────────────
+
+    def _connect(self) -> psycopg.Connection:
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg.connect(self.database_url, connect_timeout=5)
+            self._onboarding = None
+        return self._conn
+
+    def _reset(self) -> None:
+        """Drop the connection; the next write reconnects."""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg.Error:
+                pass
+            self._conn = None
+
+    def _store(self, row: dict) -> bool:
+        conn = self._connect()
+        with conn.transaction(), conn.cursor() as cur:
+            if self._onboarding is None:
+                self._onboarding = cur.execute(_ONBOARDING_COLUMNS).fetchone()[0] >= 4
+
+            user_ids: dict[str, int] = {}
+
+            def user_id(ext: str, handle: str | None, name: str | None) -> int:
+                key = ext.lower()
+                if key not in user_ids:
+                    display = (name or "").strip() or _handle(handle)
+                    user_ids[key] = cur.execute(_UPSERT_USER, (ext, _handle(handle), display)).fetchone()[0]
+                    if self._onboarding:
+                        fields = json.dumps(ONBOARDING_REQUIRED_FIELDS)
+                        cur.execute(_PROFILE_STATE_ONBOARDING, (user_ids[key], fields, fields))
+                    else:
+                        cur.execute(_PROFILE_STATE, (user_ids[key],))
+                return user_ids[key]
+
+            sender_ext, peer_ext = row["sender_id"], row["peer_id"]
+            outbound = row["direction"] == "outbound"
+            sender_id = user_id(sender_ext, row.get("sender_username"), row.get("sender_name"))
+            peer_id = user_id(peer_ext, row.get("peer_username"), row.get("peer_name"))
+
+            account_ext = row.get("account_id") or (sender_ext if outbound else peer_ext)
+            subject_ext = peer_ext if outbound else sender_ext
+            if subject_ext == account_ext:
+                subject_ext = sender_ext if outbound else peer_ext
+            account_id = user_id(account_ext, row.get("sender_username"), row.get("sender_name"))
+            subject_id = user_id(subject_ext, row.get("sender_username"), row.get("sender_name"))
+            if subject_id == account_id:
+                subject_id = peer_id if account_id == sender_id else sender_id
+
+            conversation_id = cur.execute(
+                _UPSERT_CONVERSATION, (str(row["chat_id"]), account_id, subject_id, row["date"]),
+            ).fetchone()[0]
+            cur.execute(
+                _INSERT_MESSAGE,
+                (
+                    conversation_id,
+                    str(row["message_id"]),
+                    sender_id,
+                    row["direction"],
+                    row.get("text"),
+                    row.get("text_len") or 0,
+                    row["date"],
+                    str(row["reply_to_message_id"]) if row.get("reply_to_message_id") is not None else None,
+                    int(row.get("views") or 0),
+                    int(row.get("forwards") or 0),
+                    bool(row.get("has_links")),
+                    bool(row.get("has_mentions")),
+                    "not_applicable" if outbound else "pending",
+                    json.dumps({**row, "stored_by": STORED_BY}, ensure_ascii=False),
+                ),
+            )
+            return cur.rowcount == 1
@@ -0,0 +1,293 @@
+"""
+Persistent user cache shared by the Telethon collectors.
+
+A small SQLite table keyed by Telegram user id holds the fields the
+collectors need to name a sender (first/last name, username, bot flag)
+together with when they were last seen. Every script writes the users it
+receives from Telegram anyway, and looks users up here before asking the
+API, so repeat runs resolve nearly every sender without a network round
+trip. Entries older than the TTL are treated as misses and refreshed by
+the next script that sees the user.
+
+The database runs in WAL mode with a busy timeout, so the live DM
+listener and a collector can use it at the same time.
+
+``MemoryEntityCache`` is an in-process LRU in front of it for hot paths
+(the DM listener): primed at startup from the Telethon session's
+``entities`` table and the shared table, it answers lookups without any
+I/O and writes only changed users through.
+
+Usage:
+    cache = EntityCache()                 # TG_ENTITY_CACHE_PATH or data/.state/telethon_entities.sqlite
+    user = cache.get(123456789)           # CachedUser or None (missing / expired)
+    cache.put(telethon_user)              # buffered; committed by flush()/close()
+    cache.close()
+
+    users = MemoryEntityCache(EntityCache(), maxsize=50_000)
+    users.prime_from_session("tools/telethon_collector/telethon.session")
+    user = users.get(123456789)           # in memory; falls back to the shared table
+"""
+
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+_SCRIPT_DIR = Path(__file__).resolve().parent
+_ROOT_DIR = _SCRIPT_DIR.parent.parent
+
+DEFAULT_PATH = _ROOT_DIR / "data" / ".state" / "telethon_entities.sqlite"
+DEFAULT_TTL = 7 * 24 * 3600  # Names and usernames change rarely; refresh weekly
+DEFAULT_LRU_SIZE = 50_000    # Users held in memory by MemoryEntityCache
+_FLUSH_EVERY = 500           # Buffered puts per commit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id    INTEGER PRIMARY KEY,
+    first_name TEXT,
+    last_name  TEXT,
+    username   TEXT,
+    bot        INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class CachedUser(NamedTuple):
+    """Cached subset of a Telethon User, attribute-compatible for naming."""
+
+    id: int
+    first_name: str | None
+    last_name: str | None
+    username: str | None
+    bot: bool
+    updated_at: float
+
+
+def default_path() -> Path:
+    raw = os.getenv("TG_ENTITY_CACHE_PATH")
+    if not raw:
+        return DEFAULT_PATH
+    path = Path(raw)
+    return path if path.is_absolute() else (_ROOT_DIR / path).resolve()
+
+
+class EntityCache:
+    """SQLite-backed user cache with a TTL and buffered writes."""
+
+    def __init__(self, path: str | Path | None = None, ttl: float = DEFAULT_TTL):
+        self.path = Path(path) if path else default_path()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._pending: dict[int, tuple] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self) -> "EntityCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get(self, user_id: int | None, allow_expired: bool = False) -> CachedUser | None:
+        """Return the cached user if present and younger than the TTL."""
+        if user_id is None:
+            return None
+        row = self._pending.get(user_id)
+        if row is None:
+            row = self._conn.execute(
+                "SELECT user_id, first_name, last_name, username, bot, updated_at "
+                "FROM users WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        if row is None or (not allow_expired and time.time() - row[5] > self.ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedUser(row[0], row[1], row[2], row[3], bool(row[4]), row[5])
+
+    def recent(self, limit: int) -> list[CachedUser]:
+        """The ``limit`` most recently seen users (fresh or expired), newest first."""
+        self.flush()
+        rows = self._conn.execute(
+            "SELECT user_id, first_name, last_name, username, bot, updated_at "
+            "FROM users ORDER BY updated_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [CachedUser(r[0], r[1], r[2], r[3], bool(r[4]), r[5]) for r in rows]
+
+    def count(self) -> int:
+        """Number of users stored (fresh or expired)."""
+        self.flush()
+        return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def put(self, user) -> None:
+        """Buffer a Telethon User (or CachedUser / participant-like object)."""
+        # Min constructors carry no reliable names; never let them overwrite
+        if getattr(user, "min", False) or getattr(user, "id", None) is None:
+            return
+        self._pending[user.id] = (
+            user.id,
+            user.first_name,
+            user.last_name,
+            user.username,
+            int(bool(getattr(user, "bot", False))),
+            time.time(),
+        )
+        if len(self._pending) >= _FLUSH_EVERY:
+            self.flush()
+
+    def put_many(self, users: Iterable) -> None:
+        for user in users:
+            self.put(user)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO users (user_id, first_name, last_name, username, bot, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            list(self._pending.values()),
+        )
+        self._conn.commit()
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+
+# ── In-process LRU ──────────────────────────────────────
+
+def session_file(session_path: str | Path) -> Path:
+    """The SQLite file Telethon uses for ``session_path`` (adds .session)."""
+    path = Path(session_path)
+    return path if path.suffix == ".session" else path.with_name(path.name + ".session")
+
+
+def load_session_users(session_path: str | Path, limit: int) -> list[CachedUser]:
+    """Users the Telethon session has stored, newest first.
+
+    The session keeps one display name (no first/last split) and no bot
+    flag, so these entries only serve naming until refreshed from the API.
+    """
+    path = session_file(session_path)
+    if not path.exists():
+        return []
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5.0)
+    try:
+        rows = conn.execute(
+            "SELECT id, name, username, date FROM entities "
+            "WHERE id > 0 AND (name IS NOT NULL OR username IS NOT NULL) "
+            "ORDER BY date DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []  # Locked by a running client or not a session file
+    finally:
+        conn.close()
+    return [CachedUser(r[0], r[1] or None, None, r[2] or None, False, float(r[3] or 0)) for r in rows]
+
+
+class MemoryEntityCache:
+    """Bounded in-process LRU of users, backed by an EntityCache.
+
+    ``get`` never touches the network: it answers from memory and, on a
+    miss, from the shared SQLite table. Entries older than ``ttl`` count as
+    misses, so the caller refreshes them from the API and ``put``s the
+    result; ``get(..., allow_stale=True)`` still returns them as a fallback
+    when that refresh fails.
+    """
+
+    def __init__(
+        self,
+        store: EntityCache | None = None,
+        maxsize: int = DEFAULT_LRU_SIZE,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.store = store
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._users: OrderedDict[int, CachedUser] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _remember(self, user: CachedUser) -> None:
+        self._users[user.id] = user
+        self._users.move_to_end(user.id)
+        if len(self._users) > self.maxsize:
+            self._users.popitem(last=False)
+
+    def prime(self, users: list[CachedUser]) -> int:
+        """Load users (e.g. from ``load_session_users``); the newest copy of each wins."""
+        loaded = 0
+        # Oldest first, so the most recently seen users end up least likely to be evicted
+        for user in sorted(users, key=lambda u: u.updated_at):
+            current = self._users.get(user.id)
+            if current is None or current.updated_at <= user.updated_at:
+                self._remember(user)
+                loaded += 1
+        return loaded
+
+    def prime_from_session(self, session_path: str | Path) -> int:
+        """Prime from the Telethon session and the shared table; returns users held."""
+        self.prime(load_session_users(session_path, self.maxsize))
+        if self.store is not None:
+            self.prime(self.store.recent(self.maxsize))
+        return len(self._users)
+
+    def get(self, user_id: int | None, allow_stale: bool = False) -> CachedUser | None:
+        if user_id is None:
+            return None
+        user = self._users.get(user_id)
+        if user is None and self.store is not None:
+            # Another process may have stored the user since startup
+            user = self.store.get(user_id, allow_expired=True)
+            if user is not None:
+                self._remember(user)
+        if user is None:
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        if not allow_stale and time.time() - user.updated_at > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return user
+
+    def put(self, user) -> bool:
+        """Remember a Telethon User; returns True when it was new or changed."""
+        if getattr(user, "min", False) or getattr(user, "id", None) is None:
+            return False
+        now = time.time()
+        entry = CachedUser(
+            user.id,
+            user.first_name,
+            user.last_name,
+            user.username,
+            bool(getattr(user, "bot", False)),
+            now,
+        )
+        current = self._users.get(user.id)
+        if current is not None and current[:5] == entry[:5] and now - current.updated_at <= self.ttl / 2:
+            # Unchanged and recent: skip the write-through
+            self._users.move_to_end(user.id)
+            return False
+        self._remember(entry)
+        if self.store is not None:
+            self.store.put(user)
+        return True
+
+    def flush(self) -> None:
+        if self.store is not None:
+            self.store.flush()
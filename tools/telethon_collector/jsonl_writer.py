@@ -0,0 +1,228 @@
+"""
+Buffered, batched JSONL writer for long-running listeners.
+
+Event handlers hand rows to ``write()``, which only serializes them and
+puts them on an asyncio.Queue. One writer task keeps the output file open,
+collects queued lines and writes them in one call once ``max_lines`` or
+``max_bytes`` are pending or ``flush_interval`` seconds have passed since
+the first pending line. Writes, fsyncs and segment rotations run on a
+worker thread, so the event loop never waits on the disk or the segment
+manifest lock. Durability is chosen with ``fsync``:
+
+    "off"       leave flushed data to the OS (survives a process crash,
+                not a power loss)
+    "batch"     fsync after every write (default)
+    "interval"  fsync at most every ``fsync_interval`` seconds
+
+``close()`` drains everything still queued, flushes and fsyncs. Rows
+written after ``close()`` (a handler finishing during shutdown) are
+appended synchronously, so no accepted row is dropped.
+
+A failed write or fsync (ENOSPC, EIO, ...) is logged and the batch is
+retried on a freshly opened log. Once the retries are used up the writer
+is failed: the rows it could not write are reported, and every later
+``write()`` and ``close()`` raises ``JsonlWriterError`` at once.
+
+``path`` may be a single JSONL file or a segmented log directory (see
+dm_log.py); segments rotate at ``segment_bytes`` / ``segment_seconds``.
+
+Usage:
+    writer = JsonlWriter(out_path, fsync="batch")
+    writer.start()
+    writer.write(row)           # from event handlers; never blocks
+    await writer.close()        # on shutdown (SIGTERM / SIGINT)
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from dm_log import DEFAULT_SEGMENT_BYTES, DEFAULT_SEGMENT_SECONDS, open_log
+
+FSYNC_POLICIES = ("off", "batch", "interval")
+
+_STOP = object()  # Queue sentinel that ends the writer task
+_WRITE_RETRIES = 3      # Extra attempts for a batch whose write or fsync failed
+_RETRY_DELAY = 0.5      # Seconds before the first retry; doubles per attempt
+
+
+class JsonlWriterError(Exception):
+    """Raised once the writer could not persist a batch after retrying."""
+
+
+class JsonlWriter:
+    """Single-task appender; batches queued lines into grouped writes."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_lines: int = 256,
+        max_bytes: int = 1 << 20,
+        flush_interval: float = 0.05,
+        fsync: str = "batch",
+        fsync_interval: float = 1.0,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.path = Path(path)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_lines = max(1, max_lines)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._log = None
+        self._closed = False
+        self._synced_at = time.monotonic()
+        self._dirty = False
+        self._error: Exception | None = None
+        self.lines = 0
+        self.batches = 0
+        self.fsyncs = 0
+
+    # ── Producer side ───────────────────────────────────
+
+    def start(self) -> None:
+        self._log = self._open()
+        self._task = asyncio.create_task(self._run())
+
+    def _open(self):
+        return open_log(self.path, self.segment_bytes, self.segment_seconds)
+
+    def write(self, row: dict) -> None:
+        """Queue one row (serialized now, so later mutation cannot change it)."""
+        line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        self._raise_if_failed()
+        if self._closed or self._task is None:
+            # Shutdown already drained the queue: append directly
+            log = self._open()
+            try:
+                log.append(line)
+                log.sync()
+            finally:
+                log.close()
+            self.lines += 1
+            return
+        self._queue.put_nowait(line)
+
+    async def close(self) -> None:
+        """Write everything queued, fsync and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(_STOP)
+            await self._task
+            self._task = None
+        if self._log is not None:
+            try:
+                if self._dirty and self._error is None:
+                    await asyncio.to_thread(self._sync)
+            finally:
+                self._log.close()
+                self._log = None
+        self._raise_if_failed()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise JsonlWriterError(f"JSONL writer for {self.path} failed: {self._error}") from self._error
+
+    # ── Writer task ─────────────────────────────────────
+
+    async def _run(self) -> None:
+        while True:
+            line = await self._queue.get()
+            if line is _STOP:
+                return
+            batch, size = [line], len(line)
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            # Gather whatever else arrives within the flush window
+            while len(batch) < self.max_lines and size < self.max_bytes:
+                if self._queue.empty():
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        line = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    line = self._queue.get_nowait()
+                if line is _STOP:
+                    stop = True
+                    break
+                batch.append(line)
+                size += len(line)
+            if not await self._write_with_retry(batch):
+                return
+            if stop:
+                return
+
+    async def _write_with_retry(self, batch: list[bytes]) -> bool:
+        """Write ``batch``, retrying on a reopened log; False once the writer failed."""
+        delay = _RETRY_DELAY
+        for attempt in range(_WRITE_RETRIES + 1):
+            try:
+                # A retry starts on a new line so a torn partial write stays isolated
+                await self._write(batch if attempt == 0 else [b"\n", *batch])
+                self.lines += len(batch)
+                return True
+            except Exception as exc:
+                print(f"⚠️  JSONL write of {len(batch)} row(s) to {self.path} failed "
+                      f"(attempt {attempt + 1}/{_WRITE_RETRIES + 1}): {exc}")
+                if attempt == _WRITE_RETRIES:
+                    self._fail(exc, len(batch))
+                    return False
+                await asyncio.sleep(delay)
+                delay *= 2
+                try:
+                    await asyncio.to_thread(self._log.close)
+                except OSError:
+                    pass
+                try:
+                    self._log = await asyncio.to_thread(self._open)
+                except Exception as reopen_exc:
+                    print(f"⚠️  Reopening {self.path} failed: {reopen_exc}")
+                    self._fail(reopen_exc, len(batch))
+                    return False
+        return False
+
+    def _fail(self, exc: Exception, batch_rows: int) -> None:
+        self._error = exc
+        lost = batch_rows + sum(1 for line in self._drain() if line is not _STOP)
+        print(f"❌ JSONL writer for {self.path} stopped: {lost} row(s) not written; "
+              f"further writes raise")
+
+    def _drain(self) -> list:
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _write(self, batch: list[bytes]) -> None:
+        sync = self.fsync == "batch" or (
+            self.fsync == "interval" and time.monotonic() - self._synced_at >= self.fsync_interval
+        )
+        # Appends can rotate a segment (manifest lock, fsync) and fsync can
+        # take milliseconds; keep all of it off the event loop
+        await asyncio.to_thread(self._append, b"".join(batch), sync)
+        self.batches += 1
+
+    def _append(self, data: bytes, sync: bool) -> None:
+        self._log.append(data)
+        self._dirty = True
+        if sync:
+            self._sync()
+
+    def _sync(self) -> None:
+        self._log.sync()
+        self._synced_at = time.monotonic()
+        self._dirty = False
+        self.fsyncs += 1
@@ -4,17 +4,35 @@ List all Telegram dialogs (chats, groups, channels) visible to the
 authenticated user. Use this to identify the exact title / ID / username
 of the group you want to collect.
 
+Dialogs are read from the local dialog index (see dialog_index.py), which
+is refreshed incrementally before listing unless it is younger than
+--max-age. Each dialog carries its unread count, last message date and
+participant count; output is a table, JSON or CSV, optionally filtered,
+sorted and paginated.
+
 Usage:
     python tools/telethon_collector/list_dialogs.py
+    python tools/telethon_collector/list_dialogs.py "web3 bd"                 # fuzzy search
+    python tools/telethon_collector/list_dialogs.py --type supergroup --type group \\
+        --since 2026-01-01 --sort unread --format json --limit 50 --page 2
+    python tools/telethon_collector/list_dialogs.py --offline --format csv > dialogs.csv
+    python tools/telethon_collector/list_dialogs.py --max-age 600 --participants
 """
 
+import argparse
+import csv
+import json
 import os
 import sys
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 
 from dotenv import load_dotenv
 from telethon import TelegramClient
-from telethon.tl.types import Channel, Chat, User
+
+from dialog_index import DialogIndex, default_path
+from rate_limiter import RateLimiter
 
 # ── Load .env from the collector directory ──────────────
 _SCRIPT_DIR = Path(__file__).resolve().parent
@@ -24,44 +42,166 @@ API_ID = os.getenv("TG_API_ID")
 API_HASH = os.getenv("TG_API_HASH")
 SESSION_PATH = os.getenv("TG_SESSION_PATH", str(_SCRIPT_DIR / "telethon.session"))
 
+DIALOG_TYPES = ("user", "group", "supergroup", "channel")
+
+# Sort keys; missing values sort last
+_SORTS = {
+    "activity": lambda e: -(e.last_message_at or 0),
+    "unread": lambda e: -(e.unread_count or 0),
+    "participants": lambda e: -(e.participants_count or 0),
+    "title": lambda e: (e.title or "").lower(),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="List Telegram dialogs from the local dialog index.")
+    p.add_argument("query", nargs="?", default=None, help="Fuzzy-search titles and usernames.")
+    p.add_argument(
+        "--type",
+        action="append",
+        choices=DIALOG_TYPES,
+        default=None,
+        help="Only dialogs of this type (repeatable).",
+    )
+    p.add_argument("--since", default=None, help="Only dialogs with a message on/after this date (YYYY-MM-DD).")
+    p.add_argument("--unread", action="store_true", help="Only dialogs with unread messages.")
+    p.add_argument("--no-archived", action="store_true", help="Leave out archived dialogs.")
+    p.add_argument(
+        "--sort",
+        choices=tuple(_SORTS),
+        default=None,
+        help="Sort order (default: match quality with a query, else last activity).",
+    )
+    p.add_argument("--format", choices=["table", "json", "csv"], default="table", help="Output format.")
+    p.add_argument("--limit", type=int, default=None, help="Dialogs per page (default: all).")
+    p.add_argument("--page", type=int, default=1, help="1-based page number with --limit.")
+    p.add_argument(
+        "--index",
+        default=None,
+        help="Dialog index file (default: TG_DIALOG_INDEX_PATH or "
+             "data/.state/telethon_dialogs.<session>.sqlite).",
+    )
+    p.add_argument(
+        "--max-age",
+        type=float,
+        default=0,
+        help="Reuse the index without connecting if refreshed within this many seconds.",
+    )
+    p.add_argument("--offline", action="store_true", help="List the index as stored, without connecting.")
+    p.add_argument("--full-refresh", action="store_true", help="Walk every dialog instead of only recent changes.")
+    p.add_argument(
+        "--participants",
+        action="store_true",
+        help="Fetch missing participant counts of the listed groups/channels (one request each).",
+    )
+    args = p.parse_args()
+    if args.limit is not None and args.limit < 1:
+        p.error("--limit must be at least 1")
+    if args.page < 1:
+        p.error("--page must be at least 1")
+    if args.offline and (args.full_refresh or args.participants):
+        p.error("--offline cannot be combined with --full-refresh or --participants")
+    if args.since:
+        try:
+            args.since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            p.error("--since must be YYYY-MM-DD")
+    return args
+
+
+def _iso(ts: float | None) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else ""
 
-def _entity_type(entity) -> str:
-    if isinstance(entity, User):
-        return "user"
-    if isinstance(entity, Channel):
-        if entity.megagroup:
-            return "supergroup"
-        if entity.broadcast:
-            return "channel"
-        return "channel"
-    if isinstance(entity, Chat):
-        return "group"
-    return "unknown"
+
+def select(index: DialogIndex, args: argparse.Namespace) -> list:
+    types = set(args.type) if args.type else None
+    entries = index.search(args.query, types=types, limit=None) if args.query else index.all(types)
+    entries = [
+        e for e in entries
+        if (args.since is None or (e.last_message_at or 0) >= args.since)
+        and (not args.unread or e.unread_count)
+        and not (args.no_archived and e.archived)
+    ]
+    if args.sort:
+        entries.sort(key=_SORTS[args.sort])
+    return entries
+
+
+def print_table(entries: list, first: int) -> None:
+    print(f"\n{'#':<5} {'Type':<11} {'ID':<14} {'Unread':>7} {'Members':>8}  {'Last message':<17} {'Username':<24} Title")
+    print("─" * 120)
+    for idx, entry in enumerate(entries, first):
+        username = ("@" + entry.username) if entry.username else ""
+        members = entry.participants_count if entry.participants_count is not None else ""
+        last = _iso(entry.last_message_at)[:16].replace("T", " ")
+        print(
+            f"{idx:<5} {entry.type:<11} {entry.entity_id:<14} {entry.unread_count or 0:>7} {members:>8}  "
+            f"{last:<17} {username:<24} {entry.title or ''}"
+        )
 
 
 async def main() -> None:
-    if not API_ID or not API_HASH:
-        print("❌  TG_API_ID and TG_API_HASH must be set in .env", file=sys.stderr)
-        sys.exit(1)
-
-    client = TelegramClient(SESSION_PATH, int(API_ID), API_HASH)
-    await client.start()
-
-    print(f"\n{'#':<4} {'Type':<12} {'ID':<16} {'Username':<24} Title")
-    print("─" * 90)
-
-    idx = 0
-    async for dialog in client.iter_dialogs():
-        idx += 1
-        entity = dialog.entity
-        dtype = _entity_type(entity)
-        username = getattr(entity, "username", None) or ""
-        title = dialog.title or ""
-        eid = entity.id
-        print(f"{idx:<4} {dtype:<12} {eid:<16} {('@' + username) if username else '':<24} {title}")
-
-    print(f"\n✅  Total dialogs: {idx}\n")
-    await client.disconnect()
+    args = parse_args()
+    # Status lines stay off stdout when it carries JSON / CSV
+    log = sys.stdout if args.format == "table" else sys.stderr
+    index = DialogIndex(args.index or default_path(SESSION_PATH))
+
+    synced_at = index.synced_at
+    fresh = synced_at is not None and time.time() - synced_at <= args.max_age and not args.full_refresh
+    if args.offline or (fresh and not args.participants):
+        if not len(index):
+            print("❌  Dialog index is empty; run once without --offline", file=sys.stderr)
+            sys.exit(1)
+        entries = select(index, args)
+    else:
+        if not API_ID or not API_HASH:
+            print("❌  TG_API_ID and TG_API_HASH must be set in .env", file=sys.stderr)
+            sys.exit(1)
+
+        client = TelegramClient(SESSION_PATH, int(API_ID), API_HASH)
+        await client.start()
+        limiter = RateLimiter()
+        try:
+            if not fresh:
+                scanned, changed = await index.refresh(client, limiter, full=args.full_refresh)
+                print(f"\n📇 Dialog index refreshed: {scanned:,} scanned, {changed:,} changed", file=log)
+            entries = select(index, args)
+            if args.participants:
+                if args.limit:
+                    start = (args.page - 1) * args.limit
+                    entries[start:start + args.limit] = await index.fill_participant_counts(
+                        client, entries[start:start + args.limit], limiter,
+                    )
+                else:
+                    entries = await index.fill_participant_counts(client, entries, limiter)
+        finally:
+            await client.disconnect()
+    synced_at = index.synced_at
+    index.close()
+
+    total = len(entries)
+    start = (args.page - 1) * args.limit if args.limit else 0
+    page = entries[start:start + args.limit] if args.limit else entries
+
+    if args.format == "json":
+        json.dump({
+            "synced_at": _iso(synced_at) or None,
+            "total": total,
+            "page": args.page,
+            "limit": args.limit,
+            "dialogs": [e.to_dict() for e in page],
+        }, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    elif args.format == "csv":
+        rows = [e.to_dict() for e in page]
+        if rows:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        print_table(page, start + 1)
+        shown = f"{start + 1}-{start + len(page)} of {total}" if args.limit and page else str(total)
+        print(f"\n✅  {'Matches' if args.query else 'Dialogs'}: {shown}  (index synced {_iso(synced_at)[:19]})\n")
 
 
 if __name__ == "__main__":
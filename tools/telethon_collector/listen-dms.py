@@ -1,13 +1,35 @@
 #!/usr/bin/env python3
 """
 Listen only to Telegram private DMs and persist each new message to JSONL.
+``--out`` is a segmented DM log directory (rotating segments, see
+dm_log.py) or, for a path ending in .jsonl, a single file.
 
 This intentionally excludes group chats/supergroups/channels.
 
 Usage:
     source tools/telethon_collector/.venv/bin/activate
     python tools/telethon_collector/listen-dms.py \
-      --out data/exports/telethon_dms_live.jsonl
+      --out data/exports/telethon_dms_live [--fsync batch|interval|off]
+
+Rows go through a buffered writer task (jsonl_writer.py). On SIGTERM or
+SIGINT the listener stops taking new events, lets running handlers finish,
+then drains and fsyncs the writer before exiting.
+
+Sender and peer names come from the update itself or an in-memory user
+cache primed at startup from the session's entities table and the shared
+entity cache (entity_cache.py); get_sender()/get_chat() are only awaited
+for users missing from it or older than --entity-ttl-hours.
+
+Push delivery (both need DATABASE_URL / PG_DSN):
+  --db-write  also store each row in dm_messages right away (dm_pg_sink.py);
+              inbound rows trigger NOTIFY dm_inbound
+  --respond   run the DM responder (respond_dm_pending.serve()) in this
+              process on the listener's client; it LISTENs on dm_inbound
+              and replies within about a second of a row being ready
+The JSONL log stays the fallback: ingest-dm-jsonl still reads it and
+skips rows already stored, except that it runs the profile-signal
+extraction once on rows stored by --db-write. The responder holds those
+rows until then (at most DM_RESPONDER_EXTRACTION_WAIT seconds).
 
 Output schema (one JSON object per line):
   {
@@ -32,9 +54,10 @@ Output schema (one JSON object per line):
 
 import argparse
 import asyncio
-import json
+import fcntl
 import os
 import re
+import signal
 import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
@@ -43,7 +66,12 @@ from typing import Optional
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
 from telethon.errors import SessionPasswordNeededError
-from telethon.tl.types import PeerUser
+from telethon.tl.types import PeerUser, User
+
+from dm_log import DEFAULT_SEGMENT_BYTES, DEFAULT_SEGMENT_SECONDS
+from dm_pg_sink import DmPostgresSink
+from entity_cache import DEFAULT_LRU_SIZE, DEFAULT_TTL, EntityCache, MemoryEntityCache
+from jsonl_writer import FSYNC_POLICIES, JsonlWriter, JsonlWriterError
 
 # ── Load .env from collector directory ─────────────────
 _SCRIPT_DIR = Path(__file__).resolve().parent
@@ -52,8 +80,11 @@ load_dotenv(_SCRIPT_DIR / ".env")
 
 API_ID = os.getenv("TG_API_ID")
 API_HASH = os.getenv("TG_API_HASH")
+DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("PG_DSN")
 INTERACTIVE_AUTH = (os.getenv("TG_ALLOW_INTERACTIVE", "").strip().lower() in ("1", "true", "yes", "on", "y"))
 
+_DRAIN_TIMEOUT = 10.0  # Seconds to let running handlers finish on shutdown
+
 LINK_RE = re.compile(r"https?://\S+")
 MENTION_RE = re.compile(r"@[A-Za-z0-9_]+")
 
@@ -62,8 +93,9 @@ def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Listen for private Telegram DMs only.")
     p.add_argument(
         "--out",
-        default="data/exports/telethon_dms_live.jsonl",
-        help="JSONL output path (default: data/exports/telethon_dms_live.jsonl)",
+        default="data/exports/telethon_dms_live",
+        help="Segmented DM log directory, or a *.jsonl file for the single-file layout "
+             "(default: data/exports/telethon_dms_live)",
     )
     p.add_argument(
         "--skip-outgoing",
@@ -85,6 +117,74 @@ def parse_args() -> argparse.Namespace:
         default=os.getenv("DM_AUTO_ACK_TEXT", "Got it — I captured this and will process it.") ,
         help="Acknowledgement message when --auto-ack is enabled.",
     )
+    p.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default=os.getenv("DM_JSONL_FSYNC", "batch"),
+        help="When to fsync the JSONL output: after every batched write (batch, default), "
+             "at most every --fsync-interval seconds (interval), or never (off).",
+    )
+    p.add_argument(
+        "--fsync-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between fsyncs with --fsync interval (default: 1.0).",
+    )
+    p.add_argument(
+        "--flush-interval",
+        type=float,
+        default=0.05,
+        help="Max seconds a row waits for others to share its write (default: 0.05).",
+    )
+    p.add_argument(
+        "--flush-lines",
+        type=int,
+        default=256,
+        help="Write as soon as this many rows are pending (default: 256).",
+    )
+    p.add_argument(
+        "--segment-mb",
+        type=float,
+        default=DEFAULT_SEGMENT_BYTES / (1 << 20),
+        help="Rotate the active log segment past this size in MiB (default: 64).",
+    )
+    p.add_argument(
+        "--segment-hours",
+        type=float,
+        default=DEFAULT_SEGMENT_SECONDS / 3600,
+        help="Rotate the active log segment after this many hours (default: 24).",
+    )
+    p.add_argument(
+        "--db-write",
+        action="store_true",
+        default=parse_bool(os.getenv("DM_DB_WRITE")),
+        help="Also store each DM in dm_messages as it arrives (default: DM_DB_WRITE).",
+    )
+    p.add_argument(
+        "--respond",
+        action="store_true",
+        default=parse_bool(os.getenv("DM_RESPOND_LIVE")),
+        help="Run the DM responder in this process, woken by NOTIFY dm_inbound (default: DM_RESPOND_LIVE).",
+    )
+    p.add_argument(
+        "--respond-poll",
+        type=float,
+        default=30.0,
+        help="With --respond, longest wait between checks for pending DMs when no NOTIFY arrives (default: 30).",
+    )
+    p.add_argument(
+        "--entity-cache-size",
+        type=int,
+        default=int(os.getenv("DM_ENTITY_CACHE_SIZE", DEFAULT_LRU_SIZE)),
+        help=f"Users kept in the in-memory name cache (default: DM_ENTITY_CACHE_SIZE or {DEFAULT_LRU_SIZE}).",
+    )
+    p.add_argument(
+        "--entity-ttl-hours",
+        type=float,
+        default=float(os.getenv("DM_ENTITY_TTL_HOURS", DEFAULT_TTL / 3600)),
+        help="Refresh a cached sender/peer from Telegram once its entry is older than this "
+             f"(default: DM_ENTITY_TTL_HOURS or {DEFAULT_TTL // 3600:.0f}).",
+    )
     return p.parse_args()
 
 
@@ -99,6 +199,40 @@ def resolve_session_path(raw: str) -> str:
     return str(candidate)
 
 
+def load_responder():
+    """The DM responder module, imported only when --respond is used."""
+    import respond_dm_pending
+
+    return respond_dm_pending
+
+
+def responder_argv(session_path: str) -> list[str]:
+    """respond-dm-pending.py options from the env run-dm-response.sh uses."""
+    argv = [
+        "--session-path", session_path,
+        "--limit", os.getenv("DM_RESPONSE_LIMIT", "20"),
+        "--max-retries", os.getenv("DM_MAX_RETRIES", "3"),
+    ]
+    if os.getenv("DM_RESPONSE_TEMPLATE"):
+        argv += ["--template", os.environ["DM_RESPONSE_TEMPLATE"]]
+    if parse_bool(os.getenv("DM_RESPONSE_DRY_RUN")):
+        argv.append("--dry-run")
+    return argv
+
+
+def hold_responder_lock():
+    """Take the lock run-dm-response.sh uses, so no second responder runs beside this one."""
+    path = Path(os.getenv("DM_RESPONSE_LOCK_FILE", "/tmp/openclaw-tg-dm-responder.lock"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = path.open("w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        raise SystemExit(f"Another DM responder holds {path}; drop --respond or stop it first.")
+    return handle
+
+
 def looks_like_message(msg) -> bool:
     # Avoid service-only or empty placeholder updates
     return bool(msg.message or "")
@@ -199,6 +333,8 @@ async def main() -> None:
         raise SystemExit("TG_API_ID and TG_API_HASH must be set in tools/telethon_collector/.env")
 
     auto_ack = args.auto_ack or parse_bool(os.getenv("DM_AUTO_ACK"))
+    if (args.db_write or args.respond) and not DATABASE_URL:
+        raise SystemExit("--db-write and --respond need DATABASE_URL or PG_DSN")
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -207,7 +343,28 @@ async def main() -> None:
     session_parent.mkdir(parents=True, exist_ok=True)
 
     client = TelegramClient(session_path, int(API_ID), API_HASH)
+    entity_cache = EntityCache()
+    users = MemoryEntityCache(entity_cache, maxsize=args.entity_cache_size, ttl=args.entity_ttl_hours * 3600)
+    writer = JsonlWriter(
+        out_path,
+        max_lines=args.flush_lines,
+        flush_interval=args.flush_interval,
+        fsync=args.fsync,
+        fsync_interval=args.fsync_interval,
+        segment_bytes=int(args.segment_mb * (1 << 20)),
+        segment_seconds=args.segment_hours * 3600,
+    )
+    sink = DmPostgresSink(DATABASE_URL) if args.db_write else None
+    responder = load_responder() if args.respond else None
+    responder_lock = hold_responder_lock() if args.respond else None
+    responder_stop = asyncio.Event()
+    responder_task = None
     me = None
+    # Handlers still running; shutdown waits for them before disconnecting,
+    # since disconnect() cancels running handler tasks
+    running = 0
+    idle = asyncio.Event()
+    idle.set()
 
     async def on_startup(_: TelegramClient):
         nonlocal me
@@ -215,11 +372,42 @@ async def main() -> None:
         print(f"✅ DM listener connected as {me.first_name} ({me.id})")
         print("ℹ️  Filtering to private chats only (no groups/channels).")
         print(f"📝 Session path: {session_path}")
-        print(f"📝 Writing raw DM events to: {out_path}")
+        print(f"📝 Writing raw DM events to: {out_path} (fsync={args.fsync})")
+        print(f"👥 Name cache primed with {len(users):,} users")
+        if sink is not None:
+            print("🗄️  Storing DMs in dm_messages as they arrive")
         print("Press Ctrl+C to stop.")
 
-    @client.on(events.NewMessage)
     async def handler(event):
+        nonlocal running
+        running += 1
+        idle.clear()
+        try:
+            await capture(event)
+        finally:
+            running -= 1
+            if not running:
+                idle.set()
+
+    async def resolve_user(entity, user_id, fetch):
+        """User for one side of a DM: update payload, memory cache, then the API."""
+        if isinstance(entity, User):
+            users.put(entity)
+            return entity
+        cached = users.get(user_id)
+        if cached is not None:
+            return cached
+        try:
+            fetched = await fetch()
+        except Exception:
+            fetched = None
+        if isinstance(fetched, User):
+            users.put(fetched)
+            return fetched
+        # Refresh failed: an expired entry still beats no name
+        return users.get(user_id, allow_stale=True)
+
+    async def capture(event):
         msg = event.message
         if not looks_like_message(msg):
             return
@@ -231,24 +419,30 @@ async def main() -> None:
         if args.skip_outgoing and msg.out:
             return
 
-        sender = await event.get_sender()
+        # Users carried by the update or held in memory resolve without a
+        # round-trip; only misses and expired entries await an API lookup
+        sender = await resolve_user(event.sender, event.sender_id, event.get_sender)
         sender = sender or getattr(msg.from_id, "user_id", None)
         if sender is None:
             print("[warn] received message without sender", msg.id)
 
-        peer = None
-        try:
-            peer = await event.get_chat()
-        except Exception:
-            peer = None
+        peer = await resolve_user(event.chat, event.chat_id, event.get_chat)
+        users.flush()
 
         # sender can be a full User object or an int user_id fallback; serialize_message handles both.
         row = serialize_message(msg, sender, peer, f"user{me.id}" if me else None)
         row["captured_at"] = datetime.now(timezone.utc).isoformat()
 
-        # Persist one JSON object per line
-        with out_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        # Persist one JSON object per line (batched by the writer task); the
+        # log is also the fallback for rows the direct database write misses
+        try:
+            writer.write(row)
+        except JsonlWriterError as exc:
+            # The log can no longer be written: stop so the supervisor notices
+            print(f"❌ {exc}; stopping the listener")
+            request_stop("JSONL writer failure")
+        if sink is not None:
+            await sink.write(row)
 
         direction = row["direction"]
         sender_label = row["sender_name"] or row["sender_username"] or row["sender_id"] or "unknown"
@@ -261,9 +455,63 @@ async def main() -> None:
             except Exception as exc:
                 print(f"⚠️  Failed to send auto-ack: {exc}")
 
+    async def shutdown(signame: str) -> None:
+        print(f"\n🛑 {signame} received: finishing {running} running handler(s)...")
+        client.remove_event_handler(handler)
+        try:
+            await asyncio.wait_for(idle.wait(), _DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"⚠️  {running} handler(s) still running after {_DRAIN_TIMEOUT:.0f}s; disconnecting anyway")
+        if responder_task is not None:
+            # Let a reply in flight finish; claimed rows left behind are retried later
+            responder_stop.set()
+            try:
+                await asyncio.wait_for(responder_task, _DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print("⚠️  Responder still busy; cancelling it")
+        await client.disconnect()
+
+    stopping = []
+
+    def request_stop(signame: str) -> None:
+        if not stopping:
+            stopping.append(asyncio.create_task(shutdown(signame)))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, request_stop, sig.name)
+
+    # Read the session's entities before connecting, while nothing writes to it
+    users.prime_from_session(session_path)
     await start_with_retry(client)
+    writer.start()
+    client.add_event_handler(handler, events.NewMessage)
     await on_startup(client)
-    await client.run_until_disconnected()
+    if responder is not None:
+        responder_task = asyncio.create_task(
+            responder.serve(responder.parse_args(responder_argv(session_path)), client, responder_stop, args.respond_poll)
+        )
+        responder_task.add_done_callback(
+            lambda t: t.cancelled() or t.exception() is None
+            or print(f"⚠️  Responder stopped: {t.exception()!r}; pending DMs wait for the JSONL cycle")
+        )
+    try:
+        await client.run_until_disconnected()
+    finally:
+        if stopping:
+            await stopping[0]
+        if responder_task is not None:
+            responder_stop.set()
+            responder_task.cancel()
+            await asyncio.gather(responder_task, return_exceptions=True)
+            responder_lock.close()
+        await writer.close()
+        if sink is not None:
+            sink.close()
+            print(f"🗄️  DM db writes: {sink.stored:,} stored, {sink.duplicates:,} already present, {sink.failed:,} failed")
+        entity_cache.close()
+        print(f"💾 DM writer drained: {writer.lines:,} rows in {writer.batches:,} writes ({writer.fsyncs:,} fsyncs)")
+        print(f"👥 Name cache: {users.hits:,} hits, {users.misses:,} misses")
 
 
 if __name__ == "__main__":
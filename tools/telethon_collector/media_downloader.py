@@ -0,0 +1,293 @@
+"""
+Pipelined media downloads for collect_group_export.py (--media-dir).
+
+Message collection only records media metadata. Files are fetched by a
+separate pool of download tasks fed through a queue, so the text walk
+never waits on a download. Files are stored content-addressed:
+
+    <media-dir>/ab/ab12…ef.jpg                sha256 of the content + extension
+    <media-dir>/media.ndjson                  one line per stored Telegram file
+    <media-dir>/.partial/<file_id>.part       download in progress
+    <media-dir>/.partial/pending-<chat>.ndjson  queued downloads of a chat
+
+A Telegram file already listed in media.ndjson is never fetched again, and
+different files with identical content share one stored copy. Queued
+downloads are journaled, so an interrupted run picks them up again, and a
+partial file continues from its last complete chunk. The pending journal
+stays open and is fsynced by ``flush``, which the collector calls with
+each checkpoint of the export, before the checkpoint itself.
+
+Usage:
+    downloader = MediaDownloader(client, entity, "data/media", limiter,
+                                 types={"photo"}, max_bytes=20 << 20)
+    downloader.start()
+    downloader.offer(msg, record.media)   # from the collection loop; never blocks
+    downloader.flush()                    # before each export checkpoint
+    await downloader.drain()              # once the export is written
+    downloader.stop()
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from telethon import TelegramClient, utils
+from telethon.errors import FileReferenceExpiredError, FloodWaitError
+
+from rate_limiter import RateLimiter
+
+_CHUNK = 512 * 1024         # iter_download request size; resume offsets align to it
+_HELD_MAX = 5_000           # Queued jobs keeping their media object; later ones refetch by id
+_HASH_BLOCK = 1 << 20       # Bytes per read when hashing a finished download
+_MANIFEST = "media.ndjson"
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(_HASH_BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _last_byte(path: Path) -> bytes:
+    with path.open("rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1)
+
+
+def _append_line(path: Path, obj: dict) -> None:
+    with path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+
+class MediaDownloader:
+    """Bounded pool of download tasks fed from the collection loop.
+
+    ``types`` restricts downloads to those media types (None: all files),
+    ``max_bytes`` skips larger files, ``concurrency`` bounds the number of
+    simultaneous downloads. Requests go through the ``media`` bucket of
+    ``limiter``; a FloodWait pauses the download and it resumes from its
+    partial file.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        entity,
+        media_dir: str | Path,
+        limiter: RateLimiter | None = None,
+        types: set[str] | None = None,
+        max_bytes: int | None = None,
+        concurrency: int = 3,
+    ):
+        self.dir = Path(media_dir)
+        self._partial = self.dir / ".partial"
+        self._partial.mkdir(parents=True, exist_ok=True)
+        self._client = client
+        self._entity = entity
+        self._limiter = limiter or RateLimiter()
+        self.types = set(types) if types else None
+        self.max_bytes = max_bytes
+        self.concurrency = max(1, concurrency)
+        self._manifest = self.dir / _MANIFEST
+        self._pending_path = self._partial / f"pending-{entity.id}.ndjson"
+        self._pending_fh = None
+        self._done: dict[str, str] = {}   # file_id -> sha256
+        self._queued: set[str] = set()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._held = 0
+        self._workers: list[asyncio.Task] = []
+        self.downloaded = 0
+        self.deduped = 0
+        self.filtered = 0
+        self.failed = 0
+        self.bytes = 0
+        self._load_manifest()
+
+    def _load_manifest(self) -> None:
+        if not self._manifest.exists():
+            return
+        with self._manifest.open("rb") as f:
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue  # torn trailing line
+                self._done[entry["file_id"]] = entry["sha256"]
+
+    # ── Queueing (collection loop side) ─────────────────
+
+    def start(self) -> None:
+        """Start the download tasks and requeue downloads left by a previous run."""
+        if self._pending_path.exists():
+            with self._pending_path.open("rb") as f:
+                for raw in f:
+                    try:
+                        job = json.loads(raw)
+                    except ValueError:
+                        continue
+                    self._enqueue(job, None)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def offer(self, msg, meta: dict | None) -> None:
+        """Queue the file of ``msg`` unless filtered out or already stored."""
+        if meta is None or "file_id" not in meta:
+            return  # no file (web previews, polls, expired media, ...)
+        if self.types is not None and meta["type"] not in self.types:
+            self.filtered += 1
+            return
+        if self.max_bytes is not None and (meta["size"] or 0) > self.max_bytes:
+            self.filtered += 1
+            return
+        job = {
+            "message_id": msg.id,
+            "file_id": meta["file_id"],
+            "type": meta["type"],
+            "size": meta["size"],
+            "mime_type": meta["mime_type"],
+            "file_name": meta["file_name"],
+        }
+        if self._enqueue(job, msg.media):
+            if self._pending_fh is None:
+                self._pending_fh = self._pending_path.open("ab")
+                if self._pending_fh.tell() and _last_byte(self._pending_path) != b"\n":
+                    self._pending_fh.write(b"\n")  # Isolate a torn line; start() skips it
+            self._pending_fh.write(json.dumps(job, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def flush(self) -> None:
+        """Make the downloads queued so far durable in the pending journal."""
+        if self._pending_fh is not None:
+            self._pending_fh.flush()
+            os.fsync(self._pending_fh.fileno())
+
+    def _close_pending(self) -> None:
+        if self._pending_fh is not None:
+            self.flush()
+            self._pending_fh.close()
+            self._pending_fh = None
+
+    def _enqueue(self, job: dict, media) -> bool:
+        fid = job["file_id"]
+        if fid in self._done or fid in self._queued:
+            return False
+        self._queued.add(fid)
+        # Media objects are small but unbounded in number; past the cap the
+        # message is fetched again by id when its download starts
+        if media is not None and self._held < _HELD_MAX:
+            self._held += 1
+        else:
+            media = None
+        self._queue.put_nowait((job, media))
+        return True
+
+    async def drain(self) -> None:
+        """Wait for every queued download, then report."""
+        if self._queue.qsize() or self._queued:
+            print(f"\n📥 Finishing {self._queue.qsize():,} queued media downloads...")
+        await self._queue.join()
+        self._close_pending()
+        if self.failed == 0 and self._pending_path.exists():
+            self._pending_path.unlink()
+        print(
+            f"   ✅ Media: {self.downloaded:,} downloaded ({self.bytes / 1e6:.1f} MB), "
+            f"{self.deduped:,} deduplicated, {self.filtered:,} filtered, {self.failed:,} failed"
+        )
+
+    def stop(self) -> None:
+        """Cancel the download tasks; queued jobs stay in the pending journal."""
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self._close_pending()
+
+    # ── Downloading (worker tasks) ──────────────────────
+
+    async def _worker(self) -> None:
+        while True:
+            job, media = await self._queue.get()
+            if media is not None:
+                self._held -= 1
+            try:
+                await self._download(job, media)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"   ⚠️  Media download failed (message {job['message_id']}): {e}")
+            finally:
+                self._queued.discard(job["file_id"])
+                self._queue.task_done()
+
+    async def _refetch(self, message_id: int):
+        msg = await self._limiter.call("messages", self._client.get_messages, self._entity, ids=message_id)
+        return msg.media if msg is not None else None
+
+    async def _download(self, job: dict, media) -> None:
+        fid = job["file_id"]
+        if fid in self._done:
+            return  # stored meanwhile (same file in another message)
+        if media is None:
+            media = await self._refetch(job["message_id"])
+            if media is None:
+                self.filtered += 1  # deleted since it was queued
+                return
+        part = self._partial / f"{fid}.part"
+        retries = 0
+        while True:
+            await self._limiter.acquire("media")
+            try:
+                await self._fetch(media, part, job["size"])
+                break
+            except FileReferenceExpiredError:
+                # File references expire after a while; a fresh message carries a new one
+                if retries:
+                    raise
+                retries += 1
+                media = await self._refetch(job["message_id"])
+                if media is None:
+                    self.filtered += 1
+                    return
+            except FloodWaitError as e:
+                retries += 1
+                self._limiter.note_flood("media", e.seconds)
+                if retries > self._limiter.max_retries or self._limiter.exhausted:
+                    raise
+        self._limiter.bucket("media").reward()
+
+        sha = await asyncio.to_thread(_sha256, part)
+        ext = Path(job["file_name"] or "").suffix or utils.get_extension(media)
+        dest = self.dir / sha[:2] / f"{sha}{ext}"
+        size = part.stat().st_size
+        if dest.exists():
+            part.unlink()
+            self.deduped += 1
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(part, dest)
+            self.downloaded += 1
+            self.bytes += size
+        self._done[fid] = sha
+        _append_line(self._manifest, {
+            "file_id": fid,
+            "sha256": sha,
+            "path": str(dest.relative_to(self.dir)),
+            "size": size,
+            "type": job["type"],
+            "mime_type": job["mime_type"],
+            "chat_id": self._entity.id,
+            "message_id": job["message_id"],
+        })
+
+    async def _fetch(self, media, part: Path, size: int | None) -> None:
+        """Download into ``part``, continuing after its last complete chunk."""
+        offset = part.stat().st_size if part.exists() else 0
+        offset -= offset % _CHUNK
+        with part.open("ab") as f:
+            f.truncate(offset)
+            async for chunk in self._client.iter_download(
+                media, offset=offset, request_size=_CHUNK, file_size=size,
+            ):
+                f.write(chunk)
@@ -0,0 +1,187 @@
+"""
+Run metrics for the Telethon collectors.
+
+A Metrics object gathers counters, gauges, accumulated timers, per-stage
+wall times and latency histograms while a collection runs. ``to_dict``
+gives the JSON written next to the export (<out>.metrics.json) and
+``to_prometheus`` the Prometheus text exposition format, e.g. for
+node_exporter's textfile collector.
+
+Usage:
+    metrics = Metrics(group="BD in Web3")
+    with metrics.stage("participants"):
+        ...
+    metrics.observe("fetch_seconds", 0.21)
+    metrics.add_time("serialize", 0.000004)
+    metrics.inc("messages")
+    print(metrics.to_prometheus())
+"""
+
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Upper bounds (seconds) of latency histogram buckets; +Inf is implicit
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus semantics: ``le`` upper bounds)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (None if empty or +Inf)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_dict(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, n in zip(self.bounds, self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """Counters, gauges, timers, stage times and histograms for one run."""
+
+    def __init__(self, **labels: str):
+        self.labels = labels
+        self.counters: dict[str, float] = {}
+        self.gauges: dict[str, float | None] = {}
+        self.timers: dict[str, list] = {}       # name -> [count, seconds]
+        self.stages: dict[str, float] = {}      # name -> wall seconds
+        self.histograms: dict[str, Histogram] = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._t0 = time.monotonic()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float | None) -> None:
+        self.gauges[name] = value
+
+    def add_time(self, name: str, seconds: float, count: int = 1) -> None:
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [count, seconds]
+        else:
+            timer[0] += count
+            timer[1] += seconds
+
+    def observe(self, name: str, value: float) -> None:
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(value)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as one pipeline stage (repeated stages add up)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._t0
+
+    def to_dict(self) -> dict:
+        return {
+            "labels": self.labels,
+            "started_at": self.started_at.isoformat(),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "stages": {k: round(v, 3) for k, v in self.stages.items()},
+            "counters": self.counters,
+            "gauges": self.gauges,
+            "timers": {
+                k: {"count": n, "seconds": round(s, 6), "mean_us": round(s / n * 1e6, 3) if n else None}
+                for k, (n, s) in self.timers.items()
+            },
+            "histograms": {k: h.to_dict() for k, h in self.histograms.items()},
+        }
+
+    def to_prometheus(self, prefix: str = "telethon_collector") -> str:
+        """Render in the Prometheus text exposition format (version 0.0.4)."""
+        base = _labels(self.labels)
+        lines = []
+
+        def metric(name: str, kind: str, samples: list[tuple[str, str, float]]) -> None:
+            full = f"{prefix}_{_NAME_RE.sub('_', name)}"
+            lines.append(f"# TYPE {full} {kind}")
+            for suffix, extra, value in samples:
+                lines.append(f"{full}{suffix}{_merge(base, extra)} {_number(value)}")
+
+        metric("elapsed_seconds", "gauge", [("", "", self.elapsed)])
+        if self.stages:
+            metric("stage_seconds", "gauge", [
+                ("", f'stage="{_escape(k)}"', v) for k, v in self.stages.items()
+            ])
+        for name, value in self.counters.items():
+            metric(f"{name}_total", "counter", [("", "", value)])
+        for name, value in self.gauges.items():
+            if value is not None:
+                metric(name, "gauge", [("", "", value)])
+        for name, (n, seconds) in self.timers.items():
+            metric(f"{name}_seconds", "summary", [("_sum", "", seconds), ("_count", "", n)])
+        for name, hist in self.histograms.items():
+            cumulative, samples = 0, []
+            for bound, n in zip(hist.bounds, hist.counts):
+                cumulative += n
+                samples.append(("_bucket", f'le="{bound}"', cumulative))
+            samples += [("_bucket", 'le="+Inf"', hist.count), ("_sum", "", hist.sum), ("_count", "", hist.count)]
+            metric(name, "histogram", samples)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    return ",".join(f'{_NAME_RE.sub("_", k)}="{_escape(v)}"' for k, v in labels.items() if v is not None)
+
+
+def _merge(base: str, extra: str) -> str:
+    inner = ",".join(p for p in (base, extra) if p)
+    return f"{{{inner}}}" if inner else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
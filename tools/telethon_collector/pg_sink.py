@@ -0,0 +1,365 @@
+"""
+Direct-to-Postgres message sink for collect_group_export.py (--sink postgres).
+
+Messages are streamed into the same tables `npm run bulk-ingest` fills
+(groups, users, messages, message_mentions, memberships), so no
+intermediate export file is needed. Each checkpoint batch is loaded with
+COPY into temp staging tables and upserted in one transaction on a
+background thread, so the next batch is fetched from Telegram while the
+previous one is written.
+
+The sink follows the NdjsonExportWriter interface (write / flush / close
+and an ``index`` dict). Its high-water mark comes from the messages
+already stored for the group, so re-running resumes after the newest
+ingested message.
+
+Usage (via the collector):
+    python tools/telethon_collector/collect_group_export.py \
+        --group "BD in Web3" --sink postgres
+"""
+
+import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import psycopg
+
+# Same patterns as src/parsers/telegram.ts (hasLinks / extractMentions)
+LINK_RE = re.compile(r"https?://[^\s)>\]]+", re.IGNORECASE)
+MENTION_RE = re.compile(r"@([a-zA-Z0-9_]{3,32})")
+
+_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS staging_users (
+    external_id text,
+    handle text,
+    display_name text,
+    is_scam boolean,
+    is_fake boolean,
+    is_verified boolean,
+    is_premium boolean,
+    lang_code text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS staging_messages (
+    external_message_id text,
+    from_id text,
+    sent_at timestamptz,
+    text text,
+    text_len integer,
+    reply_to_external_message_id text,
+    has_links boolean,
+    has_mentions boolean,
+    views integer,
+    forwards integer,
+    reply_count integer,
+    reaction_count integer,
+    reactions jsonb,
+    media_type text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS staging_mentions (
+    external_message_id text,
+    mentioned_handle text
+) ON COMMIT DELETE ROWS;
+"""
+
+# Mirrors the participant upsert in src/cli/bulk-ingest.ts
+_UPSERT_USERS = """
+INSERT INTO users (platform, external_id, handle, display_name, is_scam, is_fake, is_verified, is_premium, lang_code)
+SELECT DISTINCT ON (external_id)
+       'telegram', external_id, handle, display_name, is_scam, is_fake, is_verified, is_premium, lang_code
+FROM staging_users
+ORDER BY external_id
+ON CONFLICT (platform, external_id) DO UPDATE SET
+  handle = COALESCE(EXCLUDED.handle, users.handle),
+  display_name = COALESCE(EXCLUDED.display_name, users.display_name),
+  is_scam = COALESCE(EXCLUDED.is_scam, users.is_scam),
+  is_fake = COALESCE(EXCLUDED.is_fake, users.is_fake),
+  is_verified = COALESCE(EXCLUDED.is_verified, users.is_verified),
+  is_premium = COALESCE(EXCLUDED.is_premium, users.is_premium),
+  lang_code = COALESCE(EXCLUDED.lang_code, users.lang_code),
+  updated_at = now()
+"""
+
+_UPSERT_MESSAGES = """
+INSERT INTO messages (
+  group_id, user_id, external_message_id, sent_at,
+  text, text_len, reply_to_external_message_id,
+  has_links, has_mentions, raw_ref_row_id,
+  views, forwards, reply_count, reaction_count, reactions, media_type
+)
+SELECT DISTINCT ON (s.external_message_id)
+  %(group_id)s, u.id, s.external_message_id, s.sent_at,
+  s.text, s.text_len, s.reply_to_external_message_id,
+  s.has_links, s.has_mentions, NULL,
+  s.views, s.forwards, s.reply_count, s.reaction_count, s.reactions, s.media_type
+FROM staging_messages s
+JOIN users u ON u.platform = 'telegram' AND u.external_id = s.from_id
+ORDER BY s.external_message_id
+ON CONFLICT (group_id, external_message_id) DO UPDATE SET
+  text = EXCLUDED.text,
+  text_len = EXCLUDED.text_len,
+  has_links = EXCLUDED.has_links,
+  has_mentions = EXCLUDED.has_mentions,
+  views = EXCLUDED.views,
+  forwards = EXCLUDED.forwards,
+  reply_count = EXCLUDED.reply_count,
+  reaction_count = EXCLUDED.reaction_count,
+  reactions = EXCLUDED.reactions,
+  media_type = COALESCE(EXCLUDED.media_type, messages.media_type),
+  updated_at = now()
+"""
+
+_INSERT_MENTIONS = """
+INSERT INTO message_mentions (message_id, mentioned_handle, mentioned_user_id)
+SELECT m.id, t.mentioned_handle, u.id
+FROM staging_mentions t
+JOIN messages m ON m.group_id = %(group_id)s AND m.external_message_id = t.external_message_id
+LEFT JOIN users u ON LOWER(u.handle) = t.mentioned_handle
+ON CONFLICT DO NOTHING
+"""
+
+_MEMBERSHIPS = """
+INSERT INTO memberships (group_id, user_id, first_seen_at, last_seen_at, msg_count, is_current_member)
+SELECT m.group_id, m.user_id, MIN(m.sent_at), MAX(m.sent_at), COUNT(*)::int, true
+FROM messages m
+WHERE m.group_id = %(group_id)s AND m.user_id IS NOT NULL
+GROUP BY m.group_id, m.user_id
+ON CONFLICT (group_id, user_id) DO UPDATE
+SET last_seen_at = EXCLUDED.last_seen_at,
+    msg_count = EXCLUDED.msg_count,
+    is_current_member = true
+"""
+
+_GROUP_RANGE = """
+SELECT COUNT(*), MAX(external_message_id::bigint), MIN(external_message_id::bigint)
+FROM messages
+WHERE group_id = %(group_id)s AND external_message_id ~ '^[0-9]+$'
+"""
+
+_WINDOW = """
+SELECT external_message_id::bigint, text, views, forwards, reply_count, reactions
+FROM messages
+WHERE group_id = %(group_id)s AND external_message_id ~ '^[0-9]+$'
+  AND external_message_id::bigint >= %(floor)s
+"""
+
+
+_MAX_IDS = """
+SELECT g.external_id, MAX(m.external_message_id::bigint)
+FROM groups g
+JOIN messages m ON m.group_id = g.id AND m.external_message_id ~ '^[0-9]+$'
+WHERE g.external_id = ANY(%(external_ids)s)
+GROUP BY g.external_id
+"""
+
+
+def stored_max_ids(database_url: str, external_ids: list[int]) -> dict[int, int]:
+    """Newest ingested message id per Telegram group id (groups without messages are absent)."""
+    with psycopg.connect(database_url) as conn:
+        rows = conn.execute(_MAX_IDS, {"external_ids": [str(e) for e in external_ids]}).fetchall()
+    return {int(ext): max_id for ext, max_id in rows}
+
+
+class PostgresSink:
+    """COPY-based message sink; one connection, batches upserted off-loop."""
+
+    def __init__(self, database_url: str, external_id: int, title: str):
+        self.out_path = "postgres"
+        self._conn = psycopg.connect(database_url)
+        with self._conn.cursor() as cur:
+            cur.execute(_STAGING)
+            cur.execute(
+                """
+                INSERT INTO groups (external_id, title, kind)
+                VALUES (%s, %s, 'unknown'::group_kind)
+                ON CONFLICT (platform, external_id) DO UPDATE SET title = EXCLUDED.title
+                RETURNING id
+                """,
+                (str(external_id), title),
+            )
+            self.group_id = cur.fetchone()[0]
+            cur.execute(_GROUP_RANGE, {"group_id": self.group_id})
+            count, max_id, min_id = cur.fetchone()
+        self._conn.commit()
+        self.index = {"max_id": max_id, "min_id": min_id, "count": count, "collected_at": None}
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._pending: Future | None = None
+        self._messages: list[tuple] = []
+        self._mentions: list[tuple] = []
+        self._senders: dict[str, str | None] = {}
+
+    def __enter__(self) -> "PostgresSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ── Rewind window (edits / deletions) ───────────────
+
+    def window(self, floor: int) -> dict[int, dict]:
+        """Stored messages with id >= floor, in export dict shape."""
+        with self._conn.cursor() as cur:
+            cur.execute(_WINDOW, {"group_id": self.group_id, "floor": floor})
+            rows = cur.fetchall()
+        self._conn.commit()
+        return {
+            mid: {"id": mid, "text": text, "views": views, "forwards": forwards,
+                  "reply_count": reply_count, "reactions": reactions}
+            for mid, text, views, forwards, reply_count, reactions in rows
+        }
+
+    def apply_patches(self, patches: list[dict]) -> None:
+        """Apply refresh patches: updates rewrite the mutable columns, deletes remove rows."""
+        if not patches:
+            return
+        updates, deletes = [], []
+        for p in patches:
+            ext_id = str(p["id"])
+            if p["op"] == "delete":
+                deletes.append((self.group_id, ext_id))
+                continue
+            text = p["text"] or ""
+            reactions = p["reactions"]
+            updates.append((
+                text, len(text), LINK_RE.search(text) is not None, MENTION_RE.search(text) is not None,
+                p["views"], p["forwards"], p["reply_count"],
+                sum(r["count"] for r in reactions["results"]) if reactions else 0,
+                None if reactions is None else json.dumps(reactions, ensure_ascii=False),
+                self.group_id, ext_id,
+            ))
+        self._wait()
+        try:
+            with self._conn.cursor() as cur:
+                if updates:
+                    cur.executemany(
+                        """
+                        UPDATE messages SET text = %s, text_len = %s, has_links = %s, has_mentions = %s,
+                          views = %s, forwards = %s, reply_count = %s, reaction_count = %s,
+                          reactions = %s, updated_at = now()
+                        WHERE group_id = %s AND external_message_id = %s
+                        """,
+                        updates,
+                    )
+                if deletes:
+                    cur.executemany(
+                        "DELETE FROM messages WHERE group_id = %s AND external_message_id = %s",
+                        deletes,
+                    )
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+        self.index["count"] -= len(deletes)
+
+    # ── Buffering (event loop side) ─────────────────────
+
+    def write(self, record) -> None:
+        if record.from_id is None:
+            return  # bulk-ingest skips messages without a sender as well
+        text = record.text
+        ext_id = str(record.id)
+        handles = {h.lower() for h in MENTION_RE.findall(text)}
+        reactions = record.reactions or ()
+        self._messages.append((
+            ext_id,
+            record.from_id,
+            f"{record.date}+00:00",
+            text,
+            len(text),
+            None if record.reply_to is None else str(record.reply_to),
+            LINK_RE.search(text) is not None,
+            bool(handles),
+            record.views,
+            record.forwards,
+            record.reply_count,
+            sum(c for c, _ in reactions),
+            None if record.reactions is None else json.dumps(
+                {"results": [{"count": c, "emoji": e} for c, e in reactions]}, ensure_ascii=False,
+            ),
+            record.media_type,
+        ))
+        self._mentions.extend((ext_id, h) for h in handles)
+        if record.from_name or record.from_id not in self._senders:
+            self._senders[record.from_id] = record.from_name
+
+    def write_participants(self, participants: list[dict]) -> None:
+        """Upsert the participant list (synchronously, before messages)."""
+        rows = [
+            (
+                f"user{p['user_id']}",
+                p.get("username"),
+                p.get("display_name") or p.get("first_name") or p.get("username"),
+                p.get("scam"), p.get("fake"), p.get("verified"), p.get("premium"),
+                p.get("lang_code"),
+            )
+            for p in participants
+        ]
+        self._wait()
+        self._pool.submit(self._load, rows, [], []).result()
+
+    def flush(self) -> None:
+        """Hand the buffered batch to the loader thread (waits for the previous one)."""
+        self._wait()
+        if not self._messages:
+            return
+        users = [(ext, None, name, None, None, None, None, None) for ext, name in self._senders.items()]
+        self._pending = self._pool.submit(self._load, users, self._messages, self._mentions)
+        self._messages, self._mentions, self._senders = [], [], {}
+
+    def _wait(self) -> None:
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()  # re-raises a failed batch
+
+    def close(self) -> None:
+        if self._conn.closed:
+            return
+        try:
+            self.flush()
+            self._wait()
+            with self._conn.cursor() as cur:
+                cur.execute(_MEMBERSHIPS, {"group_id": self.group_id})
+                cur.execute(_GROUP_RANGE, {"group_id": self.group_id})
+                self.index["count"], _, _ = cur.fetchone()
+            self._conn.commit()
+        finally:
+            self._pool.shutdown()
+            self._conn.close()
+
+    # ── Loading (worker thread) ─────────────────────────
+
+    def _load(self, users: list[tuple], messages: list[tuple], mentions: list[tuple]) -> None:
+        params = {"group_id": self.group_id}
+        try:
+            with self._conn.cursor() as cur:
+                with cur.copy(
+                    "COPY staging_users (external_id, handle, display_name, is_scam, is_fake, "
+                    "is_verified, is_premium, lang_code) FROM STDIN"
+                ) as copy:
+                    for row in users:
+                        copy.write_row(row)
+                cur.execute(_UPSERT_USERS)
+                if messages:
+                    with cur.copy(
+                        "COPY staging_messages (external_message_id, from_id, sent_at, text, text_len, "
+                        "reply_to_external_message_id, has_links, has_mentions, views, forwards, "
+                        "reply_count, reaction_count, reactions, media_type) FROM STDIN"
+                    ) as copy:
+                        for row in messages:
+                            copy.write_row(row)
+                    cur.execute(_UPSERT_MESSAGES, params)
+                if mentions:
+                    with cur.copy("COPY staging_mentions (external_message_id, mentioned_handle) FROM STDIN") as copy:
+                        for row in mentions:
+                            copy.write_row(row)
+                    cur.execute(_INSERT_MENTIONS, params)
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+        # Messages arrive oldest-first, so a committed batch moves the high-water mark
+        if messages:
+            ids = [int(row[0]) for row in messages]
+            idx = self.index
+            idx["count"] += len(ids)
+            idx["max_id"] = max(ids) if idx["max_id"] is None else max(idx["max_id"], max(ids))
+            idx["min_id"] = min(ids) if idx["min_id"] is None else min(idx["min_id"], min(ids))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Plan a scheduled collection: keep only the groups with new messages.
+
+Reads a collect_batch.py manifest, compares each group's newest message id
+(the top message of its dialog, from the local dialog index) with the
+high-water mark of its export (the *.index.json sidecar, or the database
+for --sink postgres entries), and writes a manifest containing only the
+groups that have something new, largest backlog first. Quiet groups are
+left out, so a quiet night needs no collector run at all.
+
+A group is always scheduled when its export has an unfinished checkpoint
+journal, has never been collected, or cannot be found in the dialog index
+(the collector then reports it). The backlog of a channel or supergroup is
+the id distance between the top message and the high-water mark; basic
+groups share the account's message id sequence, so their unread count is
+used instead.
+
+Usage:
+    python tools/telethon_collector/plan_collection.py \
+        --manifest data/exports/groups.manifest.json \
+        --out data/exports/tonight.manifest.json --max-groups 20
+    python tools/telethon_collector/collect_batch.py --manifest data/exports/tonight.manifest.json
+
+The output keeps the input's "defaults" and adds a "plan" section (ignored
+by collect_batch.py) with the decision for every group. The exit code is
+0 when groups were scheduled and 3 when there is nothing to collect.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from telethon import TelegramClient
+
+from collect_group_export import (
+    API_HASH,
+    API_ID,
+    SESSION_PATH,
+    _checkpoint_path,
+    _read_index,
+    _write_json_atomic,
+)
+from collect_batch import load_manifest
+from dialog_index import DialogIndex, default_path
+from rate_limiter import RateLimiter
+
+EXIT_NOTHING_TO_DO = 3
+
+# Ids of these dialogs are per-chat, so id distance approximates the backlog
+_CHANNEL_TYPES = {"supergroup", "channel"}
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Write a collect_batch.py manifest with only the groups that have new messages.",
+    )
+    p.add_argument("--manifest", required=True, help="Manifest listing every group the job may collect.")
+    p.add_argument(
+        "--out",
+        default=None,
+        help="Planned manifest path (default: stdout).",
+    )
+    p.add_argument(
+        "--max-groups",
+        type=int,
+        default=None,
+        help="Schedule at most this many groups (largest backlog first).",
+    )
+    p.add_argument(
+        "--min-backlog",
+        type=int,
+        default=1,
+        help="Skip groups with fewer new messages than this (default: 1).",
+    )
+    p.add_argument(
+        "--dialog-index",
+        default=None,
+        help="Dialog index file (default: TG_DIALOG_INDEX_PATH or "
+             "data/.state/telethon_dialogs.<session>.sqlite).",
+    )
+    p.add_argument(
+        "--max-age",
+        type=float,
+        default=0,
+        help="Reuse the dialog index without connecting if refreshed within this many seconds.",
+    )
+    p.add_argument("--offline", action="store_true", help="Plan from the dialog index as stored, without connecting.")
+    args = p.parse_args()
+    if args.max_groups is not None and args.max_groups < 1:
+        p.error("--max-groups must be >= 1")
+    return args
+
+
+# ── Dialog state ────────────────────────────────────────
+
+async def load_dialogs(args: argparse.Namespace) -> DialogIndex:
+    """Open the dialog index, refreshing it unless --offline / recent enough."""
+    index = DialogIndex(args.dialog_index or default_path(SESSION_PATH))
+    synced_at = index.synced_at
+    if args.offline or (synced_at is not None and time.time() - synced_at <= args.max_age):
+        if not len(index):
+            raise SystemExit("❌  Dialog index is empty; run once without --offline")
+        print(f"📇 Using dialog index as of {datetime.fromtimestamp(synced_at, timezone.utc):%Y-%m-%d %H:%M} UTC",
+              file=sys.stderr)
+        return index
+
+    if not API_ID or not API_HASH:
+        raise SystemExit("❌  TG_API_ID and TG_API_HASH must be set in .env")
+    client = TelegramClient(SESSION_PATH, int(API_ID), API_HASH)
+    await client.start()
+    try:
+        scanned, changed = await index.refresh(client, RateLimiter())
+    finally:
+        await client.disconnect()
+    print(f"📇 Dialog index refreshed: {scanned:,} scanned, {changed:,} changed", file=sys.stderr)
+    return index
+
+
+# ── Planning ────────────────────────────────────────────
+
+def high_water_marks(specs: list[argparse.Namespace], dialogs: list) -> list[dict]:
+    """Stored max id and checkpoint state per manifest entry."""
+    marks = []
+    pg_ids = {}
+    for spec, dialog in zip(specs, dialogs):
+        if spec.sink == "postgres":
+            marks.append({"max_id": None, "resume": False})
+            if dialog is not None:
+                pg_ids[len(marks) - 1] = dialog.entity_id
+            continue
+        out_path = Path(spec.out)
+        index = _read_index(out_path)
+        marks.append({
+            "max_id": index["max_id"] if index else None,
+            "resume": _checkpoint_path(out_path).exists(),
+        })
+    if pg_ids:
+        from pg_sink import stored_max_ids
+
+        stored = stored_max_ids(os.environ["DATABASE_URL"], list(pg_ids.values()))
+        for i, entity_id in pg_ids.items():
+            marks[i]["max_id"] = stored.get(entity_id)
+    return marks
+
+
+def decide(spec: argparse.Namespace, dialog, mark: dict, min_backlog: int) -> dict:
+    """One plan row: whether to collect ``spec`` and its estimated backlog."""
+    row = {
+        "group": spec.group,
+        "out": spec.out,
+        "type": dialog.type if dialog else None,
+        "max_id": mark["max_id"],
+        "top_message_id": dialog.top_message_id if dialog else None,
+        "backlog": None,
+    }
+    if dialog is None:
+        return {**row, "schedule": True, "reason": "not in dialog index"}
+    top, max_id = dialog.top_message_id, mark["max_id"]
+    if mark["resume"]:
+        backlog = (top or 0) - (max_id or 0)
+        return {**row, "backlog": max(backlog, 0), "schedule": True, "reason": "unfinished checkpoint"}
+    if max_id is None:
+        return {**row, "backlog": top or 0, "schedule": bool(top), "reason": "never collected" if top else "empty chat"}
+    if top is None or top <= max_id:
+        return {**row, "backlog": 0, "schedule": False, "reason": "up to date"}
+    backlog = top - max_id if dialog.type in _CHANNEL_TYPES else max(dialog.unread_count or 0, 1)
+    if backlog < min_backlog:
+        return {**row, "backlog": backlog, "schedule": False, "reason": f"backlog below {min_backlog}"}
+    return {**row, "backlog": backlog, "schedule": True, "reason": "new messages"}
+
+
+def plan(raw: dict, specs: list[argparse.Namespace], index: DialogIndex, args: argparse.Namespace) -> dict:
+    dialogs = []
+    for spec in specs:
+        hits = index.exact(spec.group)
+        dialogs.append(hits[0] if hits else None)
+    marks = high_water_marks(specs, dialogs)
+    rows = [decide(s, d, m, args.min_backlog) for s, d, m in zip(specs, dialogs, marks)]
+
+    # Largest backlog first; unknown backlogs (unresolved groups) last
+    order = sorted(
+        (i for i, r in enumerate(rows) if r["schedule"]),
+        key=lambda i: -1 if rows[i]["backlog"] is None else rows[i]["backlog"],
+        reverse=True,
+    )
+    if args.max_groups is not None:
+        for i in order[args.max_groups:]:
+            rows[i].update(schedule=False, reason="over --max-groups")
+        order = order[:args.max_groups]
+
+    return {
+        "defaults": raw.get("defaults", {}),
+        "groups": [raw["groups"][i] for i in order],
+        "plan": {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "dialogs_synced_at": datetime.fromtimestamp(index.synced_at, timezone.utc).isoformat(),
+            "scheduled": len(order),
+            "skipped": len(rows) - len(order),
+            "backlog": sum(rows[i]["backlog"] or 0 for i in order),
+            "groups": [rows[i] for i in order] + [r for r in rows if not r["schedule"]],
+        },
+    }
+
+
+# ── Main ────────────────────────────────────────────────
+
+async def main() -> int:
+    args = parse_args()
+    manifest_path = Path(args.manifest)
+    raw = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if isinstance(raw, list):
+        raw = {"groups": raw}
+    specs = load_manifest(manifest_path)
+
+    index = await load_dialogs(args)
+    try:
+        result = plan(raw, specs, index, args)
+    finally:
+        index.close()
+
+    summary = result["plan"]
+    print(f"\n🗓️  {summary['scheduled']} of {len(specs)} groups scheduled "
+          f"(~{summary['backlog']:,} new messages):", file=sys.stderr)
+    for row in summary["groups"]:
+        mark = "▶" if row["schedule"] else "·"
+        backlog = "?" if row["backlog"] is None else f"{row['backlog']:,}"
+        print(f"   {mark} {row['group']:<32} {backlog:>9}  {row['reason']}", file=sys.stderr)
+
+    if args.out:
+        _write_json_atomic(Path(args.out), result)
+        print(f"\n💾 Wrote {args.out}", file=sys.stderr)
+    else:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    return 0 if summary["scheduled"] else EXIT_NOTHING_TO_DO
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,188 @@
+"""
+FloodWait-aware async rate limiting shared by the Telethon collectors.
+
+A RateLimiter keeps one token bucket per API method family ("messages",
+"participants", "entities", "dialogs", ...). Every request takes a token
+first. A FloodWaitError pauses *every* caller of the limiter for the
+requested seconds (Telegram floods are per account, not per request),
+halves the offending bucket's rate, and the rate creeps back towards its
+default after each successful request.
+
+All waiting is done with asyncio.sleep, so the event loop keeps serving
+other groups, workers and update handlers while a wait is in progress.
+
+Usage:
+    limiter = RateLimiter()
+    me = await limiter.call("entities", client.get_me)
+    async for msg in limiter.iterate("messages", lambda last: client.iter_messages(
+            entity, offset_id=last.id if last else 0)):
+        ...
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from telethon.errors import FloodWaitError
+
+# Sustained requests per second per method family. Telegram does not
+# publish its limits; these stay under the thresholds seen in practice.
+DEFAULT_RATES = {
+    "messages": 3.0,
+    "participants": 1.0,
+    "entities": 5.0,
+    "dialogs": 1.0,
+    "media": 1.0,   # File downloads started (each then streams its own chunks)
+}
+_FALLBACK_RATE = 2.0
+_MIN_RATE_FACTOR = 1 / 16   # A bucket never slows below 1/16 of its default
+_RECOVERY = 0.02            # Fraction of the gap to the default rate regained per success
+
+
+class FloodBudgetExceeded(Exception):
+    """Raised instead of sleeping once the limiter's flood budget is spent."""
+
+
+class TokenBucket:
+    """Token bucket with an adjustable refill rate (tokens per second)."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.default_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def penalize(self) -> None:
+        """Halve the rate and drain the bucket (multiplicative decrease)."""
+        self.rate = max(self.default_rate * _MIN_RATE_FACTOR, self.rate / 2)
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    def reward(self) -> None:
+        """Move the rate a small step back towards its default."""
+        self.rate += (self.default_rate - self.rate) * _RECOVERY
+
+
+class RateLimiter:
+    """Per-method token buckets behind one account-wide FloodWait pause.
+
+    ``budget`` (seconds) caps the total FloodWait pause: once reached,
+    ``exhausted`` is true and ``call``/``iterate`` raise FloodBudgetExceeded
+    instead of waiting again. ``max_retries`` bounds consecutive FloodWait
+    retries of one call, or of an iteration that makes no progress.
+    """
+
+    def __init__(
+        self,
+        rates: dict[str, float] | None = None,
+        budget: float | None = None,
+        max_retries: int = 3,
+    ):
+        self._rates = {**DEFAULT_RATES, **(rates or {})}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._resume_at = 0.0
+        self.budget = budget
+        self.max_retries = max_retries
+        self.total_wait = 0.0
+        self.floods: dict[str, int] = {}
+
+    @property
+    def exhausted(self) -> bool:
+        return self.budget is not None and self.total_wait >= self.budget
+
+    def bucket(self, method: str) -> TokenBucket:
+        b = self._buckets.get(method)
+        if b is None:
+            b = self._buckets[method] = TokenBucket(self._rates.get(method, _FALLBACK_RATE))
+        return b
+
+    async def wait(self) -> None:
+        """Sleep out any FloodWait pause currently in effect."""
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def acquire(self, method: str) -> None:
+        await self.wait()
+        await self.bucket(method).take()
+
+    def note_flood(self, method: str | None, seconds: float) -> None:
+        """Record a FloodWait: pause all callers and slow ``method`` down."""
+        now = time.monotonic()
+        resume_at = now + seconds
+        if resume_at > self._resume_at:
+            self.total_wait += resume_at - max(self._resume_at, now)
+            self._resume_at = resume_at
+        if method is not None:
+            self.bucket(method).penalize()
+            self.floods[method] = self.floods.get(method, 0) + 1
+
+    def _on_flood(self, method: str, e: FloodWaitError, retries: int) -> None:
+        self.note_flood(method, e.seconds)
+        if retries > self.max_retries:
+            raise e
+        if self.exhausted:
+            raise FloodBudgetExceeded(
+                f"flood budget of {self.budget:.0f}s spent ({self.total_wait:.0f}s waited)"
+            ) from e
+        print(f"   ⏳ FloodWait on {method}: pausing {e.seconds}s (retry {retries}/{self.max_retries})...")
+
+    async def call(self, method: str, fn: Callable[..., Awaitable], *args, **kwargs):
+        """Await ``fn(*args, **kwargs)`` under the limiter, retrying on FloodWait."""
+        retries = 0
+        while True:
+            await self.acquire(method)
+            try:
+                result = await fn(*args, **kwargs)
+            except FloodWaitError as e:
+                retries += 1
+                self._on_flood(method, e, retries)
+                continue
+            self.bucket(method).reward()
+            return result
+
+    async def iterate(
+        self,
+        method: str,
+        make_iter: Callable[[object], AsyncIterator],
+        per_request: int = 100,
+    ) -> AsyncIterator:
+        """Yield from ``make_iter(last)``, resuming after FloodWait.
+
+        ``make_iter`` receives the last item already yielded (None at the
+        start) and must return an iterator that continues *after* it, so a
+        FloodWait mid-iteration costs one request rather than a restart.
+        One token is taken per ``per_request`` items (Telethon's page size).
+        """
+        last = None
+        retries = 0
+        while True:
+            await self.acquire(method)
+            n = 0
+            try:
+                async for item in make_iter(last):
+                    last = item
+                    yield item
+                    n += 1
+                    if n % per_request == 0:
+                        self.bucket(method).reward()
+                        await self.acquire(method)
+                return
+            except FloodWaitError as e:
+                # Retries only accumulate while no progress is being made
+                retries = retries + 1 if n == 0 else 1
+                self._on_flood(method, e, retries)
@@ -0,0 +1,278 @@
+"""
+Reply-graph sidecar for collector exports (<out>.replies/).
+
+With ``--reply-graph`` the collector feeds every exported message's
+(id, reply_to, sender) into a ReplyGraph and appends the new rows to a
+sidecar directory next to the export. The sidecar is append-only, so an
+incremental run costs O(new messages), not O(history):
+
+    ids.i64         message id per row (little-endian int64)
+    reply_to.i64    id the message replies to, 0 if none; kept even when the
+                    parent is outside the export
+    sender.i32      index into users.txt, -1 if unknown
+    users.txt       one sender ("user123") per line
+    deleted.i64     ids removed by a rewind refresh
+    meta.json       committed row counts and max_id; rows past them (a run
+                    that died mid-write) are ignored and overwritten
+
+Thread structure is derived on demand by ``build()``, which sorts the rows
+by id (the last copy of an id wins) and returns parallel arrays:
+
+    ids[i], reply_to[i]       message id of node i and the id it replies to
+    sender[i]                 index into ``users``, -1 if unknown
+    parent[i]                 node replied to; -1 for thread roots and for
+                              replies to messages outside the export (their
+                              reply_to still names the parent id)
+    child_offsets, children   CSR adjacency: the replies to node i are
+                              children[child_offsets[i]:child_offsets[i + 1]]
+    root[i], depth[i]         thread root node and distance from it
+    size[i], height[i]        subtree size (including i) and height below i;
+                              a thread's size and depth are size[root[i]] and
+                              height[root[i]]
+    partners                  {"from", "to", "count"} user indices: how often
+                              one user replied to another, most frequent first
+
+Usage:
+    graph = ReplyGraph.open(path)               # committed state, rows not loaded
+    graph.add(msg_id, reply_to, "user123")      # for each new message
+    graph.commit()                              # append the new rows
+
+    threads = ReplyGraph.load(path).build()     # readers: full graph
+"""
+
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+VERSION = 2
+_COLUMNS = (("ids", "q", "ids.i64"), ("reply_to", "q", "reply_to.i64"), ("sender", "i", "sender.i32"))
+_DELETED = "deleted.i64"
+_USERS = "users.txt"
+_META = "meta.json"
+
+
+def _read_column(path: Path, code: str, count: int) -> array:
+    col = array(code)
+    if count:
+        with path.open("rb") as f:
+            col.fromfile(f, count)
+        if sys.byteorder != "little":
+            col.byteswap()
+    return col
+
+
+def _append_column(path: Path, col: array, committed: int) -> None:
+    """Write ``col`` after the first ``committed`` items, dropping any uncommitted tail."""
+    if sys.byteorder != "little":
+        col = array(col.typecode, col)
+        col.byteswap()
+    mode = "r+b" if path.exists() else "wb"
+    with path.open(mode) as f:
+        f.truncate(committed * col.itemsize)
+        f.seek(committed * col.itemsize)
+        col.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ReplyGraph:
+    """Append-only (id, reply_to, sender) columns, turned into CSR on build."""
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path is not None else None
+        self._committed = {"rows": 0, "deleted": 0, "users": 0, "users_bytes": 0}
+        self._old = {name: array(code) for name, code, _ in _COLUMNS}  # Loaded rows (load() only)
+        self._old_deleted = array("q")
+        self._new = {name: array(code) for name, code, _ in _COLUMNS}
+        self._deleted = array("q")
+        self._users: list[str] = []
+        self._user_index: dict[str, int] = {}
+        self.max_id: int | None = None
+        self._loaded = path is None  # Committed rows are in memory
+
+    def __len__(self) -> int:
+        return self._committed["rows"] + len(self._new["ids"])
+
+    @property
+    def added(self) -> int:
+        """Rows added since the graph was opened."""
+        return len(self._new["ids"])
+
+    @classmethod
+    def open(cls, path: Path) -> "ReplyGraph":
+        """Open the sidecar for appending; reads only the metadata and users.
+
+        A missing or unreadable sidecar (including the old JSON one) starts
+        an empty graph.
+        """
+        graph = cls(path)
+        try:
+            meta = json.loads((graph.path / _META).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return graph
+        if meta.get("version") != VERSION:
+            return graph
+        graph._committed = {k: meta[k] for k in ("rows", "deleted", "users", "users_bytes")}
+        graph.max_id = meta.get("max_id")
+        with (graph.path / _USERS).open("r", encoding="utf-8") as f:
+            for line in f:
+                if len(graph._users) == graph._committed["users"]:
+                    break
+                graph._user(line.rstrip("\n"))
+        return graph
+
+    @classmethod
+    def load(cls, path: Path) -> "ReplyGraph":
+        """Open the sidecar and read every committed row (for ``build``)."""
+        graph = cls.open(path)
+        graph._loaded = True
+        rows = graph._committed["rows"]
+        if rows:
+            for name, code, file in _COLUMNS:
+                graph._old[name] = _read_column(graph.path / file, code, rows)
+        if graph._committed["deleted"]:
+            graph._old_deleted = _read_column(graph.path / _DELETED, "q", graph._committed["deleted"])
+        return graph
+
+    def _user(self, from_id: str | None) -> int:
+        if from_id is None:
+            return -1
+        idx = self._user_index.get(from_id)
+        if idx is None:
+            idx = self._user_index[from_id] = len(self._users)
+            self._users.append(from_id)
+        return idx
+
+    def add(self, msg_id: int, reply_to: int | None, from_id: str | None) -> None:
+        self._new["ids"].append(msg_id)
+        self._new["reply_to"].append(reply_to or 0)
+        self._new["sender"].append(self._user(from_id))
+        if self.max_id is None or msg_id > self.max_id:
+            self.max_id = msg_id
+
+    def discard(self, msg_ids) -> None:
+        """Drop deleted messages; their replies become roots."""
+        self._deleted.extend(msg_ids)
+
+    def commit(self) -> int:
+        """Append rows added since ``open`` and commit them; returns how many."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        c = self._committed
+        for name, _, file in _COLUMNS:
+            _append_column(self.path / file, self._new[name], c["rows"])
+        _append_column(self.path / _DELETED, self._deleted, c["deleted"])
+        users = self.path / _USERS
+        new_users = "".join(u + "\n" for u in self._users[c["users"]:]).encode("utf-8")
+        with users.open("r+b" if users.exists() else "wb") as f:
+            # Keep exactly the committed users; later lines are an unfinished commit
+            f.truncate(c["users_bytes"])
+            f.seek(c["users_bytes"])
+            f.write(new_users)
+            f.flush()
+            os.fsync(f.fileno())
+        added = len(self._new["ids"])
+        committed = {
+            "version": VERSION,
+            "max_id": self.max_id,
+            "rows": c["rows"] + added,
+            "deleted": c["deleted"] + len(self._deleted),
+            "users": len(self._users),
+            "users_bytes": c["users_bytes"] + len(new_users),
+        }
+        tmp = self.path / (_META + ".tmp")
+        tmp.write_text(json.dumps(committed), encoding="utf-8")
+        os.replace(tmp, self.path / _META)
+        self._committed = {k: committed[k] for k in ("rows", "deleted", "users", "users_bytes")}
+        for name, code, _ in _COLUMNS:
+            if self._loaded:
+                self._old[name].extend(self._new[name])
+            self._new[name] = array(code)
+        if self._loaded:
+            self._old_deleted.extend(self._deleted)
+        self._deleted = array("q")
+        return added
+
+    def build(self) -> dict:
+        """Thread arrays over every committed and added row (see module docstring)."""
+        if not self._loaded:
+            raise ValueError("ReplyGraph.open() does not read the rows; use load() to build")
+        src = {name: self._old[name] + self._new[name] for name, _, _ in _COLUMNS}
+        src_ids = src["ids"]
+        dropped = set(self._old_deleted) | set(self._deleted)
+        # Sort by id; a stable sort keeps insertion order among duplicates,
+        # and the last copy of an id wins
+        order = sorted(range(len(src_ids)), key=src_ids.__getitem__)
+        ids, reply, sender = array("q"), array("q"), array("i")
+        for k, raw in enumerate(order):
+            mid = src_ids[raw]
+            if mid in dropped:
+                continue
+            if k + 1 < len(order) and src_ids[order[k + 1]] == mid:
+                continue
+            ids.append(mid)
+            reply.append(src["reply_to"][raw])
+            sender.append(src["sender"][raw])
+        n = len(ids)
+
+        # Replies always point at older messages, so parents precede children
+        parent = array("l", [-1]) * n
+        counts = array("l", [0]) * (n + 1)
+        for i in range(n):
+            r = reply[i]
+            if r:
+                j = bisect_left(ids, r, 0, i)
+                if j < i and ids[j] == r:
+                    parent[i] = j
+                    counts[j + 1] += 1
+        offsets = counts
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        children = array("l", [0]) * offsets[n]
+        fill = array("l", offsets[:n])
+        root, depth = array("l", range(n)), array("l", [0]) * n
+        for i in range(n):
+            p = parent[i]
+            if p >= 0:
+                children[fill[p]] = i
+                fill[p] += 1
+                root[i] = root[p]
+                depth[i] = depth[p] + 1
+        size, height = array("l", [1]) * n, array("l", [0]) * n
+        for i in range(n - 1, -1, -1):
+            p = parent[i]
+            if p >= 0:
+                size[p] += size[i]
+                if height[i] + 1 > height[p]:
+                    height[p] = height[i] + 1
+
+        pairs = Counter(
+            (sender[i], sender[parent[i]])
+            for i in range(n)
+            if parent[i] >= 0 and sender[i] >= 0 and sender[parent[i]] >= 0
+            and sender[i] != sender[parent[i]]
+        )
+        ranked = pairs.most_common()
+        return {
+            "max_id": self.max_id,
+            "count": n,
+            "users": self._users,
+            "ids": ids,
+            "reply_to": reply,
+            "sender": sender,
+            "parent": parent,
+            "child_offsets": offsets,
+            "children": children,
+            "root": root,
+            "depth": depth,
+            "size": size,
+            "height": height,
+            "partners": {
+                "from": [a for (a, _), _ in ranked],
+                "to": [b for (_, b), _ in ranked],
+                "count": [c for _, c in ranked],
+            },
+        }
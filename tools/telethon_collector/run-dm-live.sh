@@ -5,17 +5,28 @@ ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
 PID_DIR="$ROOT_DIR/data/.pids"
 LISTENER_PID_FILE="$PID_DIR/tg-listen-dm.pid"
 SUPERVISOR_PID_FILE="$PID_DIR/tg-live-supervisor.pid"
+RESPONDER_PID_FILE="$PID_DIR/tg-dm-responder.pid"
 LOG_DIR="$ROOT_DIR/data/logs"
 # Global lock prevents "build drift": even if someone runs the pipeline from a second checkout,
 # they must contend on the same lock file.
 LOCK_FILE="${TG_DM_GLOBAL_LOCK_FILE:-/tmp/openclaw-tg-dm-live.lock}"
-JSONL_FILE="${1:-data/exports/telethon_dms_live.jsonl}"
+# Segmented DM log directory (dm_log.py); a *.jsonl path keeps the single-file layout
+JSONL_FILE="${1:-data/exports/telethon_dms_live}"
 INTERVAL="${2:-30}"
 MODE="${3:-profile}"  # profile|ingest
 RESPONSE_ENABLED="${RESPONSE_ENABLED:-1}"
+# Push delivery: the listener stays up, stores DMs in dm_messages itself and
+# (with RESPONSE_ENABLED) runs the responder in-process, woken by NOTIFY.
+# Cycles then only ingest the JSONL fallback and reconcile.
+DM_PUSH="${DM_PUSH:-0}"
+# Resident responder (respond-dm-pending.py --daemon) instead of one process per
+# cycle. It stays connected while the listener runs, so it needs its own
+# authorized session (DM_RESPONDER_SESSION_PATH); ignored with DM_PUSH=1.
+DM_RESPONDER_DAEMON="${DM_RESPONDER_DAEMON:-0}"
 STATE_FILE="${4:-$ROOT_DIR/data/.state/dm-live.state.json}"
 SESSION_PATH="${5:-$ROOT_DIR/tools/telethon_collector/telethon_openclaw.session}"
 SNAPSHOT_STATE_FILE="${SNAPSHOT_STATE_FILE:-$ROOT_DIR/data/.state/dm-live-catchup.state.json}"
+RESPONDER_SESSION_PATH="${DM_RESPONDER_SESSION_PATH:-$SESSION_PATH}"
 
 if [ -f "$ROOT_DIR/.env" ]; then
   set -a
@@ -131,6 +142,19 @@ cleanup_listener_pidfile() {
 }
 
 
+# First start on a segmented log: move the old single-file log in as its first
+# segment, with the ingest position taken from the existing state file.
+adopt_legacy_log() {
+  local legacy="${JSONL_PATH}.jsonl"
+  if [ -f "$legacy" ] && [ ! -f "$JSONL_PATH/manifest.json" ]; then
+    log "adopting legacy DM log $legacy into $JSONL_PATH"
+    (
+      cd "$ROOT_DIR/tools/telethon_collector"
+      .venv/bin/python3 dm_log.py adopt "$JSONL_PATH" --from "$legacy" --state-file "$STATE_FILE"
+    ) >> "$LOG_DIR/dm-ingest.log" 2>&1 || log_err "legacy DM log adoption failed"
+  fi
+}
+
 run_snapshot_cycle() {
   if [ ! -x "$ROOT_DIR/tools/telethon_collector/.venv/bin/python" ]; then
     return 0
@@ -200,12 +224,78 @@ PY
   return 1
 }
 
+push_enabled() {
+  [ "$DM_PUSH" = "1" ] || [ "$DM_PUSH" = "true" ]
+}
+
+response_enabled() {
+  [ "$RESPONSE_ENABLED" = "1" ] || [ "$RESPONSE_ENABLED" = "true" ]
+}
+
+# Run "${@:2}" in place of the calling (sub)shell with the responder env and
+# session $1, so a backgrounded responder's pid is the responder itself.
+responder_env() {
+  DM_SESSION_PATH="$1" \
+  DM_RESPONSE_LIMIT="${DM_RESPONSE_LIMIT:-20}" \
+  DM_MAX_RETRIES="${DM_MAX_RETRIES:-3}" \
+  DM_RESPONSE_MODE="${DM_RESPONSE_MODE:-conversational}" \
+  DM_PERSONA_NAME="${DM_PERSONA_NAME:-Lobster Llama}" \
+  DM_RESPONSE_TEMPLATE="${DM_RESPONSE_TEMPLATE:-Thanks for reaching out — I captured this and will use it to improve your profile dataset. To help it, share: your current role/company, 2-3 priorities, and how you prefer to communicate.}" \
+  exec "${@:2}"
+}
+
+# Start the resident responder unless it is already running. Returns 1 when
+# it cannot be used, so the cycle falls back to a one-shot responder run.
+ensure_responder_daemon() {
+  if [ "$DM_RESPONDER_DAEMON" != "1" ] && [ "$DM_RESPONDER_DAEMON" != "true" ]; then
+    return 1
+  fi
+  if is_running "$RESPONDER_PID_FILE"; then
+    return 0
+  fi
+  if [ "$RESPONDER_SESSION_PATH" = "$SESSION_PATH" ]; then
+    log_err "DM_RESPONDER_DAEMON needs DM_RESPONDER_SESSION_PATH (a session other than the listener's); using per-cycle responder runs"
+    return 1
+  fi
+  (
+    cd "$ROOT_DIR"
+    DM_RESPONSE_DAEMON=1 responder_env "$RESPONDER_SESSION_PATH" bash tools/telethon_collector/run-dm-response.sh
+  ) >> "$LOG_DIR/dm-respond.log" 2>&1 &
+  echo "$!" > "$RESPONDER_PID_FILE"
+  log "Started responder daemon (pid=$!, session=$RESPONDER_SESSION_PATH)."
+  return 0
+}
+
+stop_responder_daemon() {
+  cleanup_listener_pidfile "$RESPONDER_PID_FILE"
+  if [ -f "$RESPONDER_PID_FILE" ]; then
+    kill "$(cat "$RESPONDER_PID_FILE" 2>/dev/null)" 2>/dev/null || true
+    rm -f "$RESPONDER_PID_FILE"
+  fi
+}
+
 start_listener() {
   cleanup_listener_pidfile "$LISTENER_PID_FILE"
   cleanup_stale_listener "$JSONL_PATH"
 
+  local push_args=()
+  if push_enabled; then
+    # The listener is the only client on the session while it runs, so
+    # catch up on what arrived while it was down before starting it
+    run_snapshot_cycle || true
+    push_args+=(--db-write)
+    if response_enabled && has_response_status_column; then
+      push_args+=(--respond)
+    fi
+  fi
+
   mkdir -p "$(dirname "$JSONL_PATH")"
-  : >> "$JSONL_PATH"
+  if [[ "$JSONL_PATH" = *.jsonl ]]; then
+    : >> "$JSONL_PATH"
+  else
+    adopt_legacy_log
+    mkdir -p "$JSONL_PATH"
+  fi
 
   if [ ! -f "$SESSION_PATH" ]; then
     log_err "Cannot start listener: session not found ($SESSION_PATH)"
@@ -218,7 +308,7 @@ start_listener() {
     DM_AUTO_ACK="${DM_AUTO_ACK:-0}" \
     DM_AUTO_ACK_TEXT="${DM_AUTO_ACK_TEXT:-Got it — I captured this message and will process it now.}" \
     TG_SESSION_PATH="$SESSION_PATH" \
-    .venv/bin/python3 -u listen-dms.py --out "$JSONL_PATH"
+    .venv/bin/python3 -u listen-dms.py --out "$JSONL_PATH" ${push_args[@]+"${push_args[@]}"}
   ) >> "$LOG_DIR/dm-listener.log" 2>&1 &
   listener_pid=$!
   echo "$listener_pid" > "$LISTENER_PID_FILE"
@@ -278,14 +368,18 @@ run_ingest_cycle() {
   local ok=0
   local listener_was_running=0
 
-  if listener_is_running; then
-    listener_was_running=1
-    stop_listener
-    cleanup_stale_listener "$JSONL_PATH"
-    sleep 1
-  fi
+  # With push delivery the listener keeps running (and responding); only the
+  # fallback ingest + reconcile run here
+  if ! push_enabled; then
+    if listener_is_running; then
+      listener_was_running=1
+      stop_listener
+      cleanup_stale_listener "$JSONL_PATH"
+      sleep 1
+    fi
 
-  run_snapshot_cycle || true
+    run_snapshot_cycle || true
+  fi
 
   local ingest_cmd=(npm run ingest-dm-jsonl -- --file "$JSONL_FILE" --state-file "$STATE_FILE")
 
@@ -317,17 +411,13 @@ run_ingest_cycle() {
       return 1
     fi
 
-    if [ "$RESPONSE_ENABLED" = "1" ] || [ "$RESPONSE_ENABLED" = "true" ]; then
-      if has_response_status_column; then
+    if response_enabled && ! push_enabled; then
+      if has_response_status_column && ensure_responder_daemon; then
+        : # resident responder answers on its own
+      elif has_response_status_column; then
         (
           cd "$ROOT_DIR"
-          DM_SESSION_PATH="$SESSION_PATH" \
-          DM_RESPONSE_LIMIT="${DM_RESPONSE_LIMIT:-20}" \
-          DM_MAX_RETRIES="${DM_MAX_RETRIES:-3}" \
-          DM_RESPONSE_MODE="${DM_RESPONSE_MODE:-conversational}" \
-          DM_PERSONA_NAME="${DM_PERSONA_NAME:-Lobster Llama}" \
-          DM_RESPONSE_TEMPLATE="${DM_RESPONSE_TEMPLATE:-Thanks for reaching out — I captured this and will use it to improve your profile dataset. To help it, share: your current role/company, 2-3 priorities, and how you prefer to communicate.}" \
-          bash tools/telethon_collector/run-dm-response.sh
+          responder_env "$SESSION_PATH" bash tools/telethon_collector/run-dm-response.sh
         ) >> "$LOG_DIR/dm-respond.log" 2>&1
         local respond_status=$?
         if [ "$respond_status" -ne 0 ]; then
@@ -373,6 +463,7 @@ acquire_lock() {
 cleanup() {
   log "Received stop signal, cleaning up..."
   stop_listener
+  stop_responder_daemon
   rm -f "$SUPERVISOR_PID_FILE"
   exec 9>&-
   exit 0
@@ -385,7 +476,7 @@ if ! check_requirements; then
 fi
 
 BUILD_SHA="$(cd "$ROOT_DIR" && git rev-parse --short HEAD 2>/dev/null || echo unknown)"
-log "tg-dm-live start root=$ROOT_DIR build=$BUILD_SHA pid=$$ lock=$LOCK_FILE file=$JSONL_PATH interval=$INTERVAL mode=$MODE response_enabled=$RESPONSE_ENABLED"
+log "tg-dm-live start root=$ROOT_DIR build=$BUILD_SHA pid=$$ lock=$LOCK_FILE file=$JSONL_PATH interval=$INTERVAL mode=$MODE response_enabled=$RESPONSE_ENABLED push=$DM_PUSH"
 
 if [ "$INTERVAL" -le 0 ]; then
   log "INTERVAL must be > 0"
@@ -15,6 +15,8 @@ MODE="${DM_RESPONSE_MODE:-conversational}"
 PERSONA_NAME="${DM_PERSONA_NAME:-Lobster Llama}"
 TEMPLATE="${DM_RESPONSE_TEMPLATE:-"Thanks for reaching out — I captured this and will use it to improve your profile dataset. To help it, share: your current role/company, 2-3 priorities, and how you prefer to communicate."}"
 DRY_RUN="${DM_RESPONSE_DRY_RUN:-0}"
+# 1 = stay resident (respond-dm-pending.py --daemon) instead of answering one batch
+DAEMON="${DM_RESPONSE_DAEMON:-0}"
 
 if [ -f "$ROOT_DIR/.env" ]; then
   set -a
@@ -35,7 +37,7 @@ fi
 mkdir -p "$(dirname "$LOCK_FILE")"
 
 BUILD_SHA="$(cd "$ROOT_DIR" && git rev-parse --short HEAD 2>/dev/null || echo unknown)"
-echo "[$(date -Is)] dm-responder start root=$ROOT_DIR build=$BUILD_SHA pid=$$ lock=$LOCK_FILE session=$SESSION_PATH limit=$LIMIT mode=$MODE"
+echo "[$(date -Is)] dm-responder start root=$ROOT_DIR build=$BUILD_SHA pid=$$ lock=$LOCK_FILE session=$SESSION_PATH limit=$LIMIT mode=$MODE daemon=$DAEMON"
 
 exec 9>"$LOCK_FILE"
 if ! flock -n 9; then
@@ -48,25 +50,23 @@ if [ ! -f "$SESSION_PATH" ]; then
   exit 1
 fi
 
-(
-  cd "$ROOT_DIR/tools/telethon_collector"
-  . .venv/bin/activate
-  if [ "$DRY_RUN" = "1" ] || [ "$DRY_RUN" = "true" ]; then
-    TG_ALLOW_INTERACTIVE=0 python3 respond-dm-pending.py \
-      --session-path "$SESSION_PATH" \
-      --limit "$LIMIT" \
-      --max-retries "$MAX_RETRIES" \
-      --mode "$MODE" \
-      --persona-name "$PERSONA_NAME" \
-      --template "$TEMPLATE" \
-      --dry-run
-  else
-    TG_ALLOW_INTERACTIVE=0 python3 respond-dm-pending.py \
-      --session-path "$SESSION_PATH" \
-      --limit "$LIMIT" \
-      --max-retries "$MAX_RETRIES" \
-      --mode "$MODE" \
-      --persona-name "$PERSONA_NAME" \
-      --template "$TEMPLATE"
-  fi
-)
+EXTRA_ARGS=()
+if [ "$DRY_RUN" = "1" ] || [ "$DRY_RUN" = "true" ]; then
+  EXTRA_ARGS+=(--dry-run)
+fi
+if [ "$DAEMON" = "1" ] || [ "$DAEMON" = "true" ]; then
+  # Holds the lock (fd 9) for its whole lifetime
+  EXTRA_ARGS+=(--daemon)
+fi
+
+cd "$ROOT_DIR/tools/telethon_collector"
+. .venv/bin/activate
+# exec: the responder replaces this shell (a daemon's pid is the responder's)
+TG_ALLOW_INTERACTIVE=0 exec python3 respond-dm-pending.py \
+  --session-path "$SESSION_PATH" \
+  --limit "$LIMIT" \
+  --max-retries "$MAX_RETRIES" \
+  --mode "$MODE" \
+  --persona-name "$PERSONA_NAME" \
+  --template "$TEMPLATE" \
+  ${EXTRA_ARGS[@]+"${EXTRA_ARGS[@]}"}
@@ -4,7 +4,8 @@ Fallback catch-up pass for private DMs.
 
 Fetches recent private messages from all private dialogs and appends any messages
 newer than the last-seen id per peer into the same JSONL schema used by
-`listen-dms.py`.
+`listen-dms.py`. `--out` may be a single JSONL file or a segmented DM log
+directory (see dm_log.py).
 """
 
 import argparse
@@ -17,13 +18,17 @@ from dotenv import load_dotenv
 from telethon import TelegramClient
 from telethon.tl.types import User
 
+from dm_log import open_log
+from entity_cache import EntityCache
+from rate_limiter import RateLimiter
+
 _SCRIPT_DIR = Path(__file__).resolve().parent
 
 load_dotenv(_SCRIPT_DIR / ".env")
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Catch up private Telegram DMs into JSONL.")
-    p.add_argument("--out", default="data/exports/telethon_dms_live.jsonl")
+    p.add_argument("--out", default="data/exports/telethon_dms_live")
     p.add_argument("--state-file", default="data/.state/dm-live-catchup.state.json")
     p.add_argument("--session-path", default=None)
     p.add_argument("--limit", type=int, default=30)
@@ -122,12 +127,6 @@ def save_state(path: Path, state: dict[str, Any]) -> None:
     path.write_text(json.dumps(state, indent=2), encoding="utf-8")
 
 
-def append_line(out_path: Path, row: dict[str, Any]) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=False) + "\n")
-
-
 async def main() -> None:
     args = parse_args()
     api_id = int(__import__("os").getenv("TG_API_ID", "0"))
@@ -158,7 +157,14 @@ async def main() -> None:
 
     account_id = f"user{me.id}"
 
-    dialogs = await client.get_dialogs(limit=120)
+    # Paces the per-peer history requests and sleeps out FloodWaits without
+    # blocking the loop; a peer that still fails is retried on the next pass
+    limiter = RateLimiter()
+    log = open_log(out_path)
+    dialogs = await limiter.call("dialogs", client.get_dialogs, limit=120)
+    # Dialogs already carry full peer users; share them with the other scripts
+    with EntityCache() as entity_cache:
+        entity_cache.put_many(d.entity for d in dialogs if isinstance(d.entity, User))
     for d in dialogs:
         peer = d.entity
         if not isinstance(peer, User):
@@ -170,7 +176,7 @@ async def main() -> None:
 
         key = str(peer.id)
         seen = int(last_seen.get(key, 0) or 0)
-        msgs = await client.get_messages(peer, limit=max(1, args.limit))
+        msgs = await limiter.call("messages", client.get_messages, peer, limit=max(1, args.limit))
         max_seen = seen
         for m in reversed(msgs):
             if not looks_like_message(m):
@@ -181,7 +187,7 @@ async def main() -> None:
 
             direction = "outbound" if m.out else "inbound"
             row = serialize_message(m, me=me, peer=peer, account_id=account_id, direction=direction)
-            append_line(out_path, row)
+            log.append((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
 
             if int(m.id) > max_seen:
                 max_seen = int(m.id)
@@ -190,6 +196,9 @@ async def main() -> None:
             last_seen[key] = max_seen
 
     await client.disconnect()
+    # Rows must be durable before the state says they were captured
+    log.sync()
+    log.close()
     save_state(state_path, state)
 
 
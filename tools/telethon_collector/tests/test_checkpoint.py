@@ -0,0 +1,123 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import collect_group_export as cge
+from collect_group_export import CheckpointJournal, MessageRecord, SenderCache
+from rate_limiter import RateLimiter
+
+
+def _msg(msg_id, sender_id=1):
+    return SimpleNamespace(
+        id=msg_id,
+        date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        message=f"m{msg_id}",
+        reply_to=None, views=0, forwards=0, replies=None, reactions=None,
+        media=None, file=None, action=None,
+        sender_id=sender_id, sender=None,
+    )
+
+
+class FakeClient:
+    """Serves ``iter_messages`` from an in-memory history, like Telethon's arguments."""
+
+    def __init__(self, ids, fail_after=None):
+        self.history = [_msg(i) for i in sorted(ids)]
+        self.fail_after = fail_after  # Raise once this many messages were yielded
+        self.yielded = 0
+
+    async def iter_messages(self, entity, limit=None, reverse=False, min_id=0, offset_id=0, max_id=0):
+        msgs = [m for m in self.history if m.id > min_id and (not max_id or m.id < max_id)]
+        if offset_id:
+            msgs = [m for m in msgs if (m.id > offset_id if reverse else m.id < offset_id)]
+        if not reverse:
+            msgs.reverse()
+        for m in msgs[:limit]:
+            if self.fail_after is not None and self.yielded >= self.fail_after:
+                raise ConnectionError("interrupted")
+            self.yielded += 1
+            yield m
+
+
+def _collect(client, journal, **kw):
+    cache = SenderCache(client, RateLimiter())
+    cache._cache[1] = {"display_name": "A"}
+    return asyncio.run(cge.collect_messages(client, "chat", cache, since=None, journal=journal, **kw))
+
+
+def _journal(tmp_path):
+    out = tmp_path / "g.json"
+    return out, CheckpointJournal(cge._checkpoint_path(out), {"name": "G", "id": 7})
+
+
+def _ids(out, ordered=True):
+    return [mid for mid, _ in cge._iter_journal_messages(cge._checkpoint_path(out), ordered)]
+
+
+def test_journal_replays_after_torn_line(tmp_path):
+    out, journal = _journal(tmp_path)
+    for i in (30, 20):
+        journal.write(MessageRecord(_msg(i), "A", "user1"))
+    journal.close()
+    with cge._checkpoint_path(out).open("ab") as f:
+        f.write(b'{"id":10,"type":"mess')  # killed mid-write
+
+    count, max_id, min_id, meta, ordered = cge._load_checkpoint(out)
+    assert (count, max_id, min_id, ordered) == (2, 30, 20, True)
+    assert meta == {"name": "G", "id": 7, "checkpoint": True}
+
+    # Appending after the torn line starts a fresh line; replay skips the fragment
+    _, journal = _journal(tmp_path)
+    journal.write(MessageRecord(_msg(10), "A", "user1"))
+    journal.close()
+    assert cge._load_checkpoint(out)[:3] == (3, 30, 10)
+    assert _ids(out) == [30, 20, 10]
+    lines = list(cge._iter_journal_messages(cge._checkpoint_path(out), True))
+    assert json.loads(lines[-1][1])["text"] == "m10"
+
+
+def test_unordered_journal_is_sorted_and_later_lines_win(tmp_path):
+    out, journal = _journal(tmp_path)
+    for i, text in ((5, "first"), (9, "x"), (5, "second")):
+        journal.write({"id": i, "text": text})
+    journal.close()
+
+    assert cge._load_checkpoint(out)[4] is False
+    lines = dict(cge._iter_journal_messages(cge._checkpoint_path(out), False))
+    assert list(lines) == [9, 5]
+    assert json.loads(lines[5])["text"] == "second"
+
+
+def test_interrupted_walk_resumes_below_the_journal(tmp_path):
+    out, journal = _journal(tmp_path)
+    client = FakeClient(range(1, 11), fail_after=4)
+    try:
+        _collect(client, journal, limit=None)
+    except ConnectionError:
+        pass
+    assert _ids(out) == [10, 9, 8, 7]  # committed on the way out
+
+    count, _, cp_min_id, _, _ = cge._load_checkpoint(out)
+    client.fail_after = None
+    _, journal = _journal(tmp_path)
+    _collect(client, journal, limit=None, offset_id=cp_min_id)
+    assert _ids(out) == list(range(10, 0, -1))
+    assert journal.written == 6
+
+
+def test_resumed_limit_counts_journaled_messages(tmp_path):
+    out, journal = _journal(tmp_path)
+    client = FakeClient(range(1, 21), fail_after=3)
+    try:
+        _collect(client, journal, limit=8)
+    except ConnectionError:
+        pass
+    count, _, cp_min_id, _, _ = cge._load_checkpoint(out)
+    assert count == 3
+
+    # collect_group passes the rest of --limit when it resumes a checkpoint
+    client.fail_after = None
+    _, journal = _journal(tmp_path)
+    _collect(client, journal, limit=8 - count, offset_id=cp_min_id)
+    assert _ids(out) == list(range(20, 12, -1))
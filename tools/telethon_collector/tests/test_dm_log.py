@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import dm_log
+from dm_log import SegmentedLog, compact, load_manifest, manifest_lock, save_manifest
+
+
+def _rows(path):
+    raw = gzip.open(path).read() if path.suffix == ".gz" else path.read_bytes()
+    return [json.loads(line) for line in raw.splitlines() if line.strip()]
+
+
+def test_rotation_seals_segment_at_size_limit(tmp_path):
+    log = SegmentedLog(tmp_path, max_bytes=20)
+    for i in range(3):
+        log.append(b'{"m":%d}\n' % i)
+    log.close()
+
+    segments = load_manifest(tmp_path)["segments"]
+    assert [(s["seq"], s["sealed_at"] is not None) for s in segments] == [(1, True), (2, False)]
+    assert segments[0]["bytes"] == (tmp_path / "00000001.jsonl").stat().st_size
+    assert _rows(tmp_path / "00000001.jsonl") + _rows(tmp_path / "00000002.jsonl") == [{"m": i} for i in range(3)]
+
+
+def test_rotation_terminates_torn_line(tmp_path):
+    log = SegmentedLog(tmp_path, max_bytes=30)
+    log.append(b'{"m":1}\n')
+    with (tmp_path / "00000001.jsonl").open("ab") as f:
+        f.write(b'{"m":')  # a writer crashed mid-append
+    log.append(b'{"m":2}\n' * 3)  # does not fit: rotate first
+    log.close()
+
+    sealed = (tmp_path / "00000001.jsonl").read_bytes()
+    assert sealed.endswith(b"\n")
+    assert load_manifest(tmp_path)["segments"][0]["bytes"] == len(sealed)
+
+
+def test_reopen_terminates_torn_line_of_active_segment(tmp_path):
+    SegmentedLog(tmp_path).close()
+    (tmp_path / "00000001.jsonl").write_bytes(b'{"m":1}\n{"m"')
+    log = SegmentedLog(tmp_path)
+    log.append(b'{"m":2}\n')
+    log.close()
+    assert (tmp_path / "00000001.jsonl").read_bytes() == b'{"m":1}\n{"m"\n{"m":2}\n'
+
+
+def test_second_writer_follows_rotation(tmp_path):
+    a = SegmentedLog(tmp_path, max_bytes=20)
+    b = SegmentedLog(tmp_path, max_bytes=20)
+    a.append(b'{"m":1}\n')
+    a.append(b'{"m":2}\n')
+    a.append(b'{"m":3}\n')  # a rotates to segment 2
+    b.append(b'{"m":4}\n')
+    a.close()
+    b.close()
+    assert _rows(tmp_path / "00000002.jsonl") == [{"m": 3}, {"m": 4}]
+
+
+def test_append_copies_rows_when_sealed_during_write(tmp_path, monkeypatch):
+    a = SegmentedLog(tmp_path)
+    b = SegmentedLog(tmp_path)
+    real_write = a._write
+
+    def write_then_rotate(data):
+        real_write(data)
+        if a._seq == 1:
+            b._rotate()  # b seals segment 1 while a's append is in flight
+
+    monkeypatch.setattr(a, "_write", write_then_rotate)
+    a.append(b'{"m":1}\n')
+    a.close()
+    b.close()
+    assert _rows(tmp_path / "00000002.jsonl") == [{"m": 1}]
+
+
+def test_compact_gzips_consumed_segments(tmp_path):
+    log = SegmentedLog(tmp_path, max_bytes=20)
+    for i in range(3):
+        log.append(b'{"m":%d}\n' % i)
+    log.close()
+    manifest = load_manifest(tmp_path)
+    manifest["consumers"]["ingest"] = {"seq": 2, "offset": 0, "updated_at": ""}
+    save_manifest(tmp_path, manifest)
+
+    assert compact(tmp_path) == 1
+    assert not (tmp_path / "00000001.jsonl").exists()
+    assert _rows(tmp_path / "00000001.jsonl.gz") == [{"m": 0}, {"m": 1}]
+    assert load_manifest(tmp_path)["segments"][0]["compressed"] is True
+
+
+def test_compact_keeps_segment_that_grew_during_compression(tmp_path, monkeypatch):
+    log = SegmentedLog(tmp_path, max_bytes=20)
+    for i in range(3):
+        log.append(b'{"m":%d}\n' % i)
+    log.close()
+    manifest = load_manifest(tmp_path)
+    manifest["consumers"]["ingest"] = {"seq": 2, "offset": 0, "updated_at": ""}
+    save_manifest(tmp_path, manifest)
+
+    real_copy = dm_log.shutil.copyfileobj
+
+    def copy_then_append(src, dst, length):
+        real_copy(src, dst, length)
+        with (tmp_path / "00000001.jsonl").open("ab") as f:
+            f.write(b'{"m":"late"}\n')  # a writer that missed the rotation
+
+    monkeypatch.setattr(dm_log.shutil, "copyfileobj", copy_then_append)
+    assert compact(tmp_path) == 0
+    assert {"m": "late"} in _rows(tmp_path / "00000001.jsonl")
+    assert not (tmp_path / "00000001.jsonl.gz").exists()
+
+
+def test_lock_of_dead_process_is_broken(tmp_path):
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    (tmp_path / dm_log.LOCK).write_text(dead.stdout.strip())
+    with manifest_lock(tmp_path):
+        assert (tmp_path / dm_log.LOCK).read_text() == str(os.getpid())
+
+
+def test_lock_of_live_process_is_not_broken(tmp_path, monkeypatch):
+    monkeypatch.setattr(dm_log, "_LOCK_STALE", 0.0)  # age alone must not break it
+    (tmp_path / dm_log.LOCK).write_text(str(os.getppid()))
+    acquired = threading.Event()
+
+    def take():
+        with manifest_lock(tmp_path):
+            acquired.set()
+
+    t = threading.Thread(target=take, daemon=True)
+    t.start()
+    assert not acquired.wait(0.3)
+    (tmp_path / dm_log.LOCK).unlink()
+    assert acquired.wait(2)
+    t.join()
@@ -0,0 +1,170 @@
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from telethon.tl.types import (
+    MessageMediaPhoto,
+    ReactionCount,
+    ReactionCustomEmoji,
+    ReactionEmoji,
+)
+
+import collect_group_export as cge
+from collect_group_export import MessageRecord
+
+
+class MessageMediaPoll:
+    """Stand-in for a media type that carries no file."""
+
+
+def _msg(msg_id, text="hi", **kw):
+    fields = dict(
+        id=msg_id,
+        date=datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        message=text,
+        reply_to=None,
+        views=None,
+        forwards=None,
+        replies=None,
+        reactions=None,
+        media=None,
+        file=None,
+    )
+    fields.update(kw)
+    return SimpleNamespace(**fields)
+
+
+def _old_line(record: MessageRecord) -> bytes:
+    """The journal / NDJSON line as written before MessageRecord.json_line."""
+    return (json.dumps(record.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+@pytest.mark.parametrize("msg, from_name, from_id", [
+    (_msg(1), "Alice", "user1"),
+    (_msg(2, text=""), None, None),
+    (_msg(3, text='quotes " and \\ slashes\nnew line\ttab \u0001'), 'Bob "B"', "user2"),
+    (_msg(4, text="ünïcødé 👍   中文"), "Zoë", "user3"),
+    (_msg(5, reply_to=SimpleNamespace(reply_to_msg_id=4), views=10, forwards=2,
+          replies=SimpleNamespace(replies=3)), "A", "user1"),
+    (_msg(6, reactions=SimpleNamespace(results=[
+        ReactionCount(reaction=ReactionEmoji(emoticon="👍"), count=3),
+        ReactionCount(reaction=ReactionCustomEmoji(document_id=42), count=1),
+    ])), "A", "user1"),
+    (_msg(7, reactions=SimpleNamespace(results=[])), "A", "user1"),
+    (_msg(8, media=MessageMediaPoll()), "A", "user1"),
+    (_msg(9, media=MessageMediaPhoto(), file=SimpleNamespace(
+        media=SimpleNamespace(id=99), size=1234, mime_type="image/jpeg",
+        name='ph"oto.jpg', duration=None, width=640, height=480,
+    )), "A", "user1"),
+    (_msg(10, media=MessageMediaPhoto(), file=None), "A", "user1"),
+])
+def test_json_line_matches_json_dumps(msg, from_name, from_id):
+    record = MessageRecord(msg, from_name, from_id)
+    assert record.json_line() == _old_line(record)
+    assert json.loads(record.json_line()) == record.to_dict()
+
+
+def _line(msg_id, text="m"):
+    return MessageRecord(_msg(msg_id, text=text), "A", "user1").json_line()[:-1]
+
+
+def _header():
+    return {"name": "G", "type": "public_supergroup", "id": 7, "limits": {"since": None, "limit": None}}
+
+
+def _expected(header, messages):
+    doc = {}
+    for key, value in header.items():
+        if key == "limits":
+            doc["messages_count"] = len(messages)
+        doc[key] = value
+    doc["messages"] = messages
+    return json.dumps(doc, indent=2, ensure_ascii=False)
+
+
+def _write(out, *sources, skip=frozenset()):
+    stats = cge._write_json_export(out, _header(), *sources, skip=skip)
+    cge._commit_index(out, {
+        **cge._empty_index(), **stats,
+        "bytes": out.stat().st_size, "messages_order": cge._MESSAGES_ORDER,
+    })
+    return stats
+
+
+def test_merge_writes_pretty_layout_newest_first(tmp_path):
+    out = tmp_path / "g.json"
+    journal = [(i, _line(i)) for i in (9, 7, 5)]
+    patched = [(6, _line(6, "edited"))]
+    older = [(i, _line(i, "old")) for i in (8, 6, 4)]
+    stats = _write(out, iter(journal), iter(patched), iter(older), skip={4})
+
+    assert stats == {"max_id": 9, "min_id": 5, "count": 5}
+    data = json.loads(out.read_text(encoding="utf-8"))
+    assert [m["id"] for m in data["messages"]] == [9, 8, 7, 6, 5]
+    assert data["messages"][3]["text"] == "edited"  # earlier source wins on equal ids
+    assert out.read_text(encoding="utf-8") == _expected(_header(), data["messages"])
+    assert not (tmp_path / "g.json.messages.tmp").exists()
+
+
+def test_merge_of_nothing_is_an_empty_export(tmp_path):
+    out = tmp_path / "g.json"
+    assert _write(out, iter([])) == {"max_id": None, "min_id": None, "count": 0}
+    assert out.read_text(encoding="utf-8") == _expected(_header(), [])
+
+
+def test_stored_export_streams_back_and_rewrites_byte_identical(tmp_path):
+    out = tmp_path / "g.json"
+    _write(out, iter([(i, _line(i, f"t{i} ✓")) for i in (30, 20, 10)]))
+    before = out.read_bytes()
+
+    assert cge._export_is_ordered(out)
+    blocks = list(cge._iter_export_messages(out))
+    assert [mid for mid, _ in blocks] == [30, 20, 10]
+    assert all(block.startswith(b"    {\n") and block.endswith(b"    }") for _, block in blocks)
+
+    # Copying the blocks through untouched reproduces the file
+    _write(out, iter(blocks))
+    assert out.read_bytes() == before
+
+    # New journal lines interleave with the stored blocks
+    _write(out, iter([(25, _line(25)), (5, _line(5))]), cge._iter_export_messages(out))
+    assert [m["id"] for m in json.loads(out.read_text())["messages"]] == [30, 25, 20, 10, 5]
+
+
+def test_unindexed_export_is_loaded_and_sorted(tmp_path):
+    out = tmp_path / "g.json"
+    messages = [json.loads(_line(i)) for i in (1, 3, 2)]
+    out.write_text(json.dumps({**_header(), "messages": messages}, indent=2), encoding="utf-8")
+
+    assert not cge._export_is_ordered(out)
+    assert [mid for mid, _ in cge._iter_export_messages(out)] == [3, 2, 1]
+
+
+def test_recover_json_index(tmp_path, monkeypatch):
+    out = tmp_path / "g.json"
+    assert cge._recover_json_index(out) == cge._empty_index()
+
+    _write(out, iter([(i, _line(i)) for i in (12, 11, 10)]))
+    committed = cge._read_index(out)
+
+    # A current index is returned without parsing the export
+    def no_scan(path):
+        raise AssertionError("export was parsed")
+    monkeypatch.setattr(cge, "_load_existing", no_scan)
+    assert cge._recover_json_index(out) == committed
+    monkeypatch.undo()
+
+    # An edited export (size and tail changed) is rescanned
+    data = json.loads(out.read_text())
+    data["messages"].append(json.loads(_line(3)))
+    out.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    index = cge._recover_json_index(out)
+    assert (index["max_id"], index["min_id"], index["count"]) == (12, 3, 4)
+    assert index["bytes"] == out.stat().st_size
+    assert "messages_order" not in index  # no longer known to be sorted
+    assert cge._read_index(out) == index
+
+    # A corrupt index file is treated as missing
+    cge._index_path(out).write_text("{not json", encoding="utf-8")
+    assert cge._recover_json_index(out)["count"] == 4
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+
+import dm_log
+import jsonl_writer
+from dm_log import manifest_lock
+from jsonl_writer import JsonlWriter, JsonlWriterError
+
+
+def _rows(log_dir):
+    rows = []
+    for seg in dm_log.load_manifest(log_dir)["segments"]:
+        rows += [json.loads(l) for l in (log_dir / seg["file"]).read_bytes().splitlines() if l.strip()]
+    return rows
+
+
+def test_batches_rows_and_drains_on_close(tmp_path):
+    async def run():
+        writer = JsonlWriter(tmp_path, flush_interval=0.01)
+        writer.start()
+        for i in range(500):
+            writer.write({"i": i})
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert _rows(tmp_path) == [{"i": i} for i in range(500)]
+    assert writer.lines == 500
+    assert writer.batches < 500
+
+
+def test_loop_stays_responsive_while_rotation_waits_for_lock(tmp_path):
+    """A held manifest lock stalls the writer thread, not the event loop; SIGTERM loses nothing."""
+
+    async def run():
+        # Every batch overflows the 64-byte segment, so each append rotates under the lock
+        writer = JsonlWriter(tmp_path, flush_interval=0.001, segment_bytes=64)
+        writer.start()
+        writer.write({"i": -1, "pad": "x" * 60})
+        await asyncio.sleep(0.05)
+
+        release = threading.Event()
+        locked = threading.Event()
+
+        def hold_lock():
+            with manifest_lock(tmp_path):
+                locked.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait(2)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        try:
+            for i in range(200):
+                writer.write({"i": i, "pad": "x" * 60})
+
+            # Ticks keep coming while the writer is blocked on the lock
+            ticks, t0 = 0, time.monotonic()
+            while time.monotonic() - t0 < 0.3:
+                await asyncio.sleep(0.01)
+                ticks += 1
+            assert ticks >= 15
+
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(stop.wait(), 2)
+            closing = asyncio.create_task(writer.close())
+            await asyncio.sleep(0.05)
+            assert not closing.done()  # still waiting on the lock
+            release.set()
+            await asyncio.wait_for(closing, 5)
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            release.set()
+            holder.join()
+
+    asyncio.run(run())
+    assert [r["i"] for r in _rows(tmp_path)] == list(range(-1, 200))
+
+
+def test_failed_writes_surface_after_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonl_writer, "_RETRY_DELAY", 0.001)
+
+    class FullDisk:
+        def append(self, data):
+            raise OSError(28, "No space left on device")
+
+        def sync(self):
+            pass
+
+        def close(self):
+            pass
+
+    class Writer(JsonlWriter):
+        def _open(self):
+            return FullDisk()
+
+    async def run():
+        writer = Writer(tmp_path / "dms.jsonl", flush_interval=0.001)
+        writer.start()
+        writer.write({"i": 1})
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if writer._error is not None:
+                break
+        try:
+            writer.write({"i": 2})
+        except JsonlWriterError:
+            pass
+        else:
+            raise AssertionError("write() after a failed batch must raise")
+        try:
+            await writer.close()
+        except JsonlWriterError:
+            return True
+        return False
+
+    assert asyncio.run(run())
@@ -0,0 +1,82 @@
+from reply_graph import ReplyGraph
+
+
+def _commit(path, rows, deleted=()):
+    graph = ReplyGraph.open(path)
+    for row in rows:
+        graph.add(*row)
+    graph.discard(deleted)
+    return graph.commit()
+
+
+def test_build_csr_threads(tmp_path):
+    _commit(tmp_path / "r", [
+        (1, None, "user1"),
+        (2, 1, "user2"),
+        (3, 1, "user3"),
+        (4, 2, "user1"),
+        (5, None, None),
+    ])
+    g = ReplyGraph.load(tmp_path / "r").build()
+
+    assert list(g["ids"]) == [1, 2, 3, 4, 5]
+    assert list(g["parent"]) == [-1, 0, 0, 1, -1]
+    kids = lambda i: list(g["children"][g["child_offsets"][i]:g["child_offsets"][i + 1]])
+    assert kids(0) == [1, 2] and kids(1) == [3] and kids(4) == []
+    assert list(g["root"]) == [0, 0, 0, 0, 4]
+    assert list(g["depth"]) == [0, 1, 1, 2, 0]
+    assert g["size"][0] == 4 and g["height"][0] == 2
+    assert g["sender"][4] == -1
+
+
+def test_incremental_commits_append_only_new_rows(tmp_path):
+    path = tmp_path / "r"
+    assert _commit(path, [(1, None, "user1"), (2, 1, "user2")]) == 2
+    size = (path / "ids.i64").stat().st_size
+
+    graph = ReplyGraph.open(path)
+    assert graph.max_id == 2 and len(graph) == 2 and graph.added == 0
+    graph.add(3, 2, "user1")
+    assert graph.commit() == 1
+    assert (path / "ids.i64").stat().st_size == size + 8
+
+    g = ReplyGraph.load(path).build()
+    assert list(g["ids"]) == [1, 2, 3]
+    assert list(g["parent"]) == [-1, 0, 1]
+    assert g["users"] == ["user1", "user2"]
+
+
+def test_out_of_export_parent_survives_reload(tmp_path):
+    _commit(tmp_path / "r", [(10, 7, "user1"), (11, 10, "user2")])
+    g = ReplyGraph.load(tmp_path / "r").build()
+    assert list(g["reply_to"]) == [7, 10]
+    assert list(g["parent"]) == [-1, 0]
+
+
+def test_deleted_and_duplicate_ids(tmp_path):
+    path = tmp_path / "r"
+    _commit(path, [(1, None, "user1"), (2, 1, "user2"), (3, 2, "user3")])
+    _commit(path, [(3, 1, "user3")], deleted=[2])  # re-added row wins; 2 was deleted
+    g = ReplyGraph.load(path).build()
+    assert list(g["ids"]) == [1, 3]
+    assert list(g["parent"]) == [-1, 0]
+
+
+def test_uncommitted_tail_is_overwritten(tmp_path):
+    path = tmp_path / "r"
+    _commit(path, [(1, None, "user1")])
+    with (path / "ids.i64").open("ab") as f:
+        f.write(b"\xff" * 12)  # a run that died mid-commit
+    _commit(path, [(2, 1, "user2")])
+    assert list(ReplyGraph.load(path).build()["ids"]) == [1, 2]
+    assert (path / "ids.i64").stat().st_size == 16
+
+
+def test_partners_count_cross_user_replies(tmp_path):
+    _commit(tmp_path / "r", [
+        (1, None, "user1"), (2, 1, "user2"), (3, 1, "user2"), (4, 2, "user1"), (5, 4, "user1"),
+    ])
+    g = ReplyGraph.load(tmp_path / "r").build()
+    users = g["users"]
+    pairs = [(users[a], users[b], c) for a, b, c in zip(*g["partners"].values())]
+    assert pairs == [("user2", "user1", 2), ("user1", "user2", 1)]
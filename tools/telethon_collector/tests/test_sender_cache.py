@@ -0,0 +1,74 @@
+import asyncio
+
+from telethon.errors import RPCError
+from telethon.tl.types import InputPeerChannel, User
+
+from collect_group_export import SenderCache
+from rate_limiter import RateLimiter
+
+
+class FakeClient:
+    """Answers GetUsersRequest; fails a whole batch if it holds a bad id."""
+
+    def __init__(self, rejected=(), unreachable=(), missing=()):
+        self.rejected = set(rejected)        # RPCError, e.g. USER_ID_INVALID
+        self.unreachable = set(unreachable)  # Network error
+        self.missing = set(missing)          # Silently left out of the reply
+        self.batches = []
+
+    async def get_input_entity(self, chat):
+        return InputPeerChannel(channel_id=7, access_hash=0)
+
+    async def __call__(self, request):
+        ids = [u.user_id for u in request.id]
+        self.batches.append(ids)
+        if self.rejected & set(ids):
+            raise RPCError(request, "USER_ID_INVALID", 400)
+        if self.unreachable & set(ids):
+            raise ConnectionError("reset")
+        return [User(id=i, first_name=f"u{i}") for i in ids if i not in self.missing]
+
+
+def _resolve(client, ids):
+    cache = SenderCache(client, RateLimiter())
+    for i in ids:
+        cache._queued[i] = 1000 + i
+    asyncio.run(cache.resolve_pending("chat"))
+    return cache
+
+
+def test_one_batch_when_every_sender_resolves():
+    client = FakeClient()
+    cache = _resolve(client, range(1, 9))
+    assert client.batches == [list(range(1, 9))]
+    assert [cache.name(i) for i in range(1, 9)] == [f"u{i}" for i in range(1, 9)]
+    assert cache.pending == 0
+
+
+def test_failed_batch_is_bisected_down_to_the_bad_sender():
+    client = FakeClient(rejected={6})
+    cache = _resolve(client, range(1, 9))
+    assert client.batches == [
+        [1, 2, 3, 4, 5, 6, 7, 8],
+        [1, 2, 3, 4],
+        [5, 6, 7, 8],
+        [5, 6], [5], [6],
+        [7, 8],
+    ]
+    assert [cache.name(i) for i in (1, 5, 7, 8)] == ["u1", "u5", "u7", "u8"]
+    assert 6 in cache._cache and cache._cache[6] is None  # Rejected: cached as unknown
+
+
+def test_network_failure_leaves_the_sender_uncached():
+    client = FakeClient(unreachable={3})
+    cache = _resolve(client, [1, 2, 3, 4])
+    assert cache.name(4) == "u4"
+    assert 3 not in cache._cache  # Re-queued by the next message it sent
+    assert cache.pending == 0
+
+
+def test_sender_left_out_of_the_reply_is_cached_as_unknown():
+    client = FakeClient(missing={2})
+    cache = _resolve(client, [1, 2])
+    assert client.batches == [[1, 2]]
+    assert cache._cache[2] is None and cache.name(1) == "u1"